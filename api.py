@@ -0,0 +1,34 @@
+import argparse
+
+from aiohttp import web
+
+from gpt import DEADLINE_S, MAX_RETRIES, LLMPolicy
+from main import PriceManager
+from services.http_api import create_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP/JSON API поиска по прайсам")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=8, help="потоков для локального поиска и разбора файлов")
+    parser.add_argument("--network-workers", type=int, default=32, help="потоков, ждущих ответа LLM и геокодера")
+    parser.add_argument("--llm-deadline", type=float, default=DEADLINE_S,
+                        help="бюджет времени на ответ LLM в одном поиске, с; дальше — локальный поиск")
+    parser.add_argument("--llm-retries", type=int, default=MAX_RETRIES)
+    parser.add_argument("--llm-hedge-after", type=float, default=None,
+                        help="через сколько секунд без ответа LLM отправить дублирующий запрос")
+    args = parser.parse_args()
+
+    manager = PriceManager()
+    manager.llm_policy = LLMPolicy(args.llm_deadline, args.llm_retries, hedge_after_s=args.llm_hedge_after)
+    manager.catalog.refresh()
+    try:
+        web.run_app(create_app(manager, args.workers, args.network_workers), host=args.host, port=args.port)
+    finally:
+        manager.catalog.save_snapshot()
+        manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Запуск из корня проекта: python -m benchmarks.bench_basket [--items 10] [--companies 300] [--products 30000]
+"""Список покупок одним вызовом search_basket против N последовательных search_products.
+
+Groq заменен заглушкой с задержкой: видно и время, и число запросов к LLM.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks import synthetic
+from benchmarks.stubs import ChatCompletionsStub, use_stub_llm
+from benchmarks.suite import build_manager
+
+
+def measure(stub: ChatCompletionsStub, manager, operation, runs: int):
+    """(медиана с, запросов к LLM за прогон)"""
+    timings, requests = [], []
+    for _ in range(runs):
+        manager.llm_cache.clear()
+        before = stub.requests
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+        requests.append(stub.requests - before)
+    return statistics.median(timings), statistics.median(requests)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск по списку покупок против поиска по одному товару")
+    parser.add_argument('--companies', type=int, default=300)
+    parser.add_argument('--products', type=int, default=30000)
+    parser.add_argument('--items', type=int, nargs='+', default=[3, 10, 16])
+    parser.add_argument('--max-stores', type=int, default=2)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--llm-latency', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    companies, products = synthetic.generate_catalog(args.companies, args.products, args.seed)
+    rng = random.Random(args.seed)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, \
+            ChatCompletionsStub(latency=args.llm_latency, jitter=args.llm_latency / 5, seed=args.seed) as stub:
+        os.chdir(workdir)
+        try:
+            use_stub_llm(stub.base_url)
+            manager = build_manager(workdir, companies, products)
+            manager.user.set_location(*next(iter(synthetic.CITIES.items())))
+            print(f"{'пунктов':>8s} {'способ':>22s} {'с':>8s} {'LLM-запросов':>13s}")
+            for count in args.items:
+                shopping_list = rng.sample(synthetic.QUERIES, min(count, len(synthetic.QUERIES)))
+                for label, operation in (
+                        ("последовательно", lambda: [manager.search_products(q) for q in shopping_list]),
+                        ("search_basket[llm]", lambda: manager.search_basket(shopping_list, max_stores=args.max_stores)),
+                        ("search_basket[local]", lambda: manager.search_basket(shopping_list, mode='local',
+                                                                               max_stores=args.max_stores))):
+                    seconds, requests = measure(stub, manager, operation, args.runs)
+                    print(f"{len(shopping_list):>8d} {label:>22s} {seconds:>8.3f} {requests:>13g}")
+            best = manager.search_basket(shopping_list, max_stores=args.max_stores)
+            for basket in best['baskets']:
+                print(f"  до {basket['max_stores']} магазинов: {basket['store_count']} магазин(а), "
+                      f"товары {basket['items_price']:.2f} + дорога {basket['distance_cost']:.2f} = "
+                      f"{basket['total_score']:.2f}, не найдено {len(basket['missing'])}")
+            manager.close()
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# Запуск из корня проекта: python -m benchmarks.bench_columnar [товаров ...]
+"""Загрузка товаров при старте: json.load (список dict) против колоночного снимка, с которым работает Catalog"""
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from services.columnar_store import ColumnarProducts
+
+WORDS = ["молоко", "хлеб", "сыр", "кефир", "масло", "сумка", "бутылка", "чехол", "ключи", "йогурт",
+         "творог", "сметана", "батон", "кофе", "чай", "сахар", "соль", "рис", "гречка", "макароны"]
+
+
+def generate_products(count: int, companies: int = 1000, seed: int = 1):
+    rng = random.Random(seed)
+    return [{"id": i, "name": f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 500)}",
+             "price": round(rng.uniform(10, 5000), 2), "company_id": rng.randint(1, companies)}
+            for i in range(1, count + 1)]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, current
+
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes:
+            products = generate_products(count)
+            json_path = os.path.join(tmp, "products.json")
+            snapshot_path = os.path.join(tmp, "products.snapshot")
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(products, f, ensure_ascii=False, indent=2)
+            ColumnarProducts.from_products(products).save(snapshot_path)
+            del products
+
+            print(f"{count} товаров: JSON {os.path.getsize(json_path) / 2 ** 20:.1f} МБ, "
+                  f"снимок {os.path.getsize(snapshot_path) / 2 ** 20:.1f} МБ")
+            _, elapsed, memory = measure(lambda: load_json(json_path))
+            print(f"  json.load (список dict) {elapsed:7.3f} с, в памяти {memory / 2 ** 20:8.1f} МБ")
+            # Так товары загружает Catalog: числовые колонки остаются в файле, декодируются только названия
+            store, elapsed, memory = measure(lambda: ColumnarProducts.load(snapshot_path))
+            print(f"  mmap снимка             {elapsed:7.3f} с, в памяти {memory / 2 ** 20:8.1f} МБ "
+                  f"(колонки {store.nbytes() / 2 ** 20:.1f} МБ отображены из файла)")
+            del store
+            # Без снимка Catalog строит те же колонки из записей хранилища
+            products = load_json(json_path)
+            _, elapsed, memory = measure(lambda: ColumnarProducts.from_products(products))
+            print(f"  список dict -> колонки  {elapsed:7.3f} с, в памяти {memory / 2 ** 20:8.1f} МБ")
+            del products
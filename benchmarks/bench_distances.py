@@ -0,0 +1,55 @@
+# Запуск из корня проекта: python -m benchmarks.bench_distances
+import random
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+from benchmarks.checks import Checks
+from services.geocoding import GeocodingService
+
+ORIGIN = (55.7558, 37.6173)
+# Допустимое расхождение с geopy: Vincenty — до метра, сфера — до 0.5%
+MAX_ABS_ERROR_KM = {'ellipsoidal': 0.001}
+MAX_REL_ERROR = {'ellipsoidal': 1e-6, 'haversine': 5e-3}
+
+
+def random_points(n: int, seed: int = 42):
+    rng = random.Random(seed)
+    return [(rng.uniform(-80, 80), rng.uniform(-180, 180)) for _ in range(n)]
+
+
+def check_accuracy(check: Checks, n: int = 2000):
+    """Сравнение с geopy.geodesic: максимальная абсолютная и относительная ошибка"""
+    points = random_points(n)
+    reference = np.array([geodesic(ORIGIN, p).km for p in points])
+    for mode in ('ellipsoidal', 'haversine'):
+        values = GeocodingService.calculate_distances(ORIGIN, points, mode=mode)
+        abs_err = np.abs(values - reference)
+        rel_err = abs_err / np.maximum(reference, 1e-9)
+        check(abs_err.max() <= MAX_ABS_ERROR_KM.get(mode, float('inf')) and rel_err.max() <= MAX_REL_ERROR[mode],
+              f"{mode:12s} max abs error: {abs_err.max() * 1000:10.3f} m, max rel error: {rel_err.max():.2e}")
+
+
+def bench_throughput(sizes=(100, 1000, 10000, 100000)):
+    for n in sizes:
+        points = random_points(n)
+        timings = {}
+        if n <= 10000:
+            start = time.perf_counter()
+            for p in points:
+                geodesic(ORIGIN, p).km
+            timings['geopy per pair'] = time.perf_counter() - start
+        for mode in ('ellipsoidal', 'haversine'):
+            start = time.perf_counter()
+            GeocodingService.calculate_distances(ORIGIN, points, mode=mode)
+            timings[mode] = time.perf_counter() - start
+        line = ", ".join(f"{name}: {n / t:,.0f} pts/s" for name, t in timings.items())
+        print(f"n={n:>7}: {line}")
+
+
+if __name__ == "__main__":
+    checks = Checks()
+    check_accuracy(checks)
+    bench_throughput()
+    checks.exit()
@@ -0,0 +1,59 @@
+# Запуск из корня проекта: python -m benchmarks.bench_excel_parser [строк ...]
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import openpyxl
+
+from services.file_parser import FileParser, ParseStats
+
+
+def generate_price_list(path: str, rows: int):
+    """Генерирует .xlsx в write-only режиме, не держа весь лист в памяти"""
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Наименование", "Цена, руб."])
+    for i in range(rows):
+        ws.append([f"Товар {i}", round(10 + (i * 7919) % 5000 / 3, 2)])
+    wb.save(path)
+
+
+def parse_in_memory(path: str) -> int:
+    """Прежний подход: обычный режим openpyxl и список всех строк"""
+    wb = openpyxl.load_workbook(path)
+    rows = list(wb.active.iter_rows(values_only=True))
+    count = sum(1 for row in rows[1:] if row and row[0] and row[1])
+    wb.close()
+    return count
+
+
+def parse_streaming(path: str) -> int:
+    stats = ParseStats()
+    for _ in FileParser.iter_excel_file(path, stats):
+        pass
+    return stats.valid
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 50000, 200000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"prices_{rows}.xlsx")
+            generate_price_list(path, rows)
+            size_mb = os.path.getsize(path) / 2 ** 20
+            print(f"{rows} строк ({size_mb:.1f} МБ):")
+            for name, func in (("in-memory", parse_in_memory), ("streaming", parse_streaming)):
+                count, elapsed, peak = measure(func, path)
+                print(f"  {name:10s} {count:>8} записей, {elapsed:6.2f} с, пик памяти {peak / 2 ** 20:8.1f} МБ")
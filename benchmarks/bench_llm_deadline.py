@@ -0,0 +1,178 @@
+# Запуск из корня проекта: python -m benchmarks.bench_llm_deadline [--searches 100] [--slow-share 0.1] [--malformed-share 0.1]
+"""Хвосты задержки поиска через LLM при медленных и испорченных ответах модели.
+
+Заглушка Groq задерживает часть ответов и портит часть JSON. Сравниваются политики:
+без бюджета и повторов, с бюджетом и повторами, с бюджетом и дублирующим запросом.
+Для каждой — перцентили задержки и чем получены результаты (LLM или локальный запасной путь).
+
+Проверки: поиск укладывается в бюджет с допуском, дубль уходит через hedge_after_s,
+повторов не больше retries, недоступная модель дает локальное ранжирование.
+При ошибке код выхода ненулевой.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.bench_sharded_llm import generate_candidates
+from benchmarks.checks import Checks
+from benchmarks.stubs import ChatCompletionsStub, use_stub_llm
+from benchmarks.suite import build_manager
+
+# Сверх бюджета: локальные кандидаты и ранжирование после отказа модели
+DEADLINE_TOLERANCE_S = 0.5
+# Расхождение момента дублирующего запроса с hedge_after_s
+HEDGE_TOLERANCE_S = 0.1
+
+
+class ArrivalsStub(ChatCompletionsStub):
+    """Запоминает моменты прихода запросов (time.perf_counter)"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.arrivals = []
+
+    def _handle(self, handler, method: str):
+        with self._lock:
+            self.arrivals.append(time.perf_counter())
+        super()._handle(handler, method)
+
+
+def run_policy(manager, stub: ChatCompletionsStub, policy, queries, args):
+    manager.llm_policy = policy
+    latencies, sources = [], Counter()
+    cities = list(synthetic.CITIES.items())
+    requests_before = stub.requests
+    for i, query in enumerate(queries):
+        # Новая точка — новые кандидаты, поэтому кэш LLM не срабатывает
+        manager.user.set_location(*cities[i % len(cities)])
+        manager.llm_cache.clear()
+        start = time.perf_counter()
+        items = manager.search_products(query, mode='llm')
+        latencies.append(time.perf_counter() - start)
+        sources[items[0]['ranked_by'] if items else 'пусто'] += 1
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'max': max(latencies) * 1000, 'sources': sources,
+            'requests': stub.requests - requests_before}
+
+
+def check_policy(check: Checks):
+    """Поведение LLMPolicy на одном запросе gpt.smart_product_search"""
+    import gpt
+
+    candidates = generate_candidates(20)
+
+    def search(policy):
+        start = time.perf_counter()
+        try:
+            gpt.smart_product_search(candidates, "молоко", policy=policy)
+            error = None
+        except Exception as e:
+            error = e
+        return error, time.perf_counter() - start
+
+    hedge_after = 0.15
+    with ArrivalsStub(latency=0.6, seed=1) as stub:
+        use_stub_llm(stub.base_url)
+        error, _ = search(gpt.LLMPolicy(deadline_s=2, retries=0, hedge_after_s=hedge_after))
+    gap = stub.arrivals[1] - stub.arrivals[0] if len(stub.arrivals) == 2 else float('inf')
+    check(error is None and abs(gap - hedge_after) <= HEDGE_TOLERANCE_S,
+          f"дубль отправлен через {gap:.2f} с при hedge_after_s={hedge_after:g}")
+
+    with ArrivalsStub(latency=0.02, seed=1) as stub:
+        use_stub_llm(stub.base_url)
+        error, _ = search(gpt.LLMPolicy(deadline_s=2, retries=0, hedge_after_s=0.3))
+    check(error is None and len(stub.arrivals) == 1, "быстрый ответ без дубля")
+
+    policy = gpt.LLMPolicy(deadline_s=5, retries=2, retry_delay_s=0.05)
+    with ChatCompletionsStub(latency=0.01, seed=1, malformed_share=1.0) as stub:
+        use_stub_llm(stub.base_url)
+        error, _ = search(policy)
+    check(isinstance(error, gpt.LLMUnavailable) and stub.requests == policy.retries + 1,
+          f"непригодные ответы: {stub.requests} запроса при retries={policy.retries}, затем LLMUnavailable")
+
+    policy = gpt.LLMPolicy(deadline_s=0.5, retries=2, retry_delay_s=0.05)
+    with ChatCompletionsStub(latency=3, seed=1) as stub:
+        use_stub_llm(stub.base_url)
+        error, elapsed = search(policy)
+    check(isinstance(error, gpt.LLMUnavailable) and elapsed <= policy.deadline_s + DEADLINE_TOLERANCE_S,
+          f"медленная модель: LLMUnavailable через {elapsed:.2f} с при бюджете {policy.deadline_s:g} с")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хвосты задержки LLM: бюджет, повторы, дублирование")
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--searches', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.1, help="обычная задержка ответа, с")
+    parser.add_argument('--slow-share', type=float, default=0.1)
+    parser.add_argument('--slow-latency', type=float, default=3.0, help="дополнительная задержка медленных ответов")
+    parser.add_argument('--malformed-share', type=float, default=0.1)
+    parser.add_argument('--deadline', type=float, default=1.0)
+    parser.add_argument('--hedge-after', type=float, default=0.3)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    from gpt import LLMPolicy
+
+    check = Checks()
+    check_policy(check)
+    print()
+
+    policies = [
+        ("без бюджета и повторов", LLMPolicy(deadline_s=600, retries=0)),
+        (f"бюджет {args.deadline:g} с, повторы", LLMPolicy(deadline_s=args.deadline, retries=2, retry_delay_s=0.05)),
+        (f"+ дубль через {args.hedge_after:g} с", LLMPolicy(deadline_s=args.deadline, retries=2, retry_delay_s=0.05,
+                                                           hedge_after_s=args.hedge_after)),
+    ]
+    companies, products = synthetic.generate_catalog(args.companies, args.products, args.seed)
+    rng = random.Random(args.seed)
+    queries = [rng.choice(synthetic.QUERIES) for _ in range(args.searches)]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            manager, results = None, []
+            print(f"{'политика':28s} {'p50 мс':>8s} {'p95 мс':>8s} {'p99 мс':>8s} {'макс мс':>8s} "
+                  f"{'запросов':>9s}  источник результатов")
+            for label, policy in policies:
+                # Одинаковая последовательность сбоев для всех политик
+                with ChatCompletionsStub(latency=args.latency, jitter=args.latency / 5, seed=args.seed,
+                                         slow_share=args.slow_share, slow_latency=args.slow_latency,
+                                         malformed_share=args.malformed_share) as stub:
+                    use_stub_llm(stub.base_url)
+                    if manager is None:
+                        manager = build_manager(workdir, companies, products)
+                    r = run_policy(manager, stub, policy, queries, args)
+                sources = ", ".join(f"{name} {count}" for name, count in r['sources'].most_common())
+                print(f"{label:28s} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['max']:>8.1f} "
+                      f"{r['requests']:>9d}  {sources}")
+                results.append((policy, r))
+
+            # Модель всегда отвечает непригодно: каждый поиск должен уйти на локальное ранжирование
+            with ChatCompletionsStub(latency=args.latency, seed=args.seed, malformed_share=1.0) as stub:
+                use_stub_llm(stub.base_url)
+                broken = run_policy(manager, stub, policies[1][1], queries[:10], args)
+            manager.close()
+        finally:
+            os.chdir(cwd)
+
+    print()
+    for policy, r in results:
+        if policy.deadline_s < 600:
+            limit = (policy.deadline_s + DEADLINE_TOLERANCE_S) * 1000
+            check(r['max'] <= limit, f"бюджет {policy.deadline_s:g} с: самый долгий поиск {r['max']:.0f} мс "
+                                     f"<= {limit:.0f} мс")
+    # Запросы без кандидатов до модели не доходят
+    check(broken['sources']['fallback'] and set(broken['sources']) <= {'fallback', 'пусто'},
+          f"LLMUnavailable -> локальное ранжирование: {dict(broken['sources'])}")
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
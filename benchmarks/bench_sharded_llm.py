@@ -0,0 +1,118 @@
+# Запуск из корня проекта: python -m benchmarks.bench_sharded_llm [задержка_с] [кандидатов ...]
+"""Ранжирование шардами: время при разной параллельности и проверки слияния.
+
+Проверки: слитый результат содержит те же id, что и один запрос без шардов, порядок внутри
+каждого шарда сохраняется, сбой одного шарда повторяется или приводит к LLMUnavailable.
+При ошибке код выхода ненулевой.
+"""
+import random
+import sys
+import time
+
+from benchmarks.checks import Checks
+from benchmarks.stubs import ChatCompletionsStub, use_stub_llm
+
+WORDS = ["молоко", "хлеб", "сыр", "кефир", "масло", "сумка", "бутылка", "чехол", "ключи", "йогурт"]
+SHARD_TOKENS = 3000
+CHECK_CANDIDATES = 1000
+
+
+class FailingShardStub(ChatCompletionsStub):
+    """Непригодный ответ на промпты, содержащие marker: первые failures раз, None — всегда"""
+
+    def __init__(self, marker: str, failures=None, **kwargs):
+        super().__init__(**kwargs)
+        self.marker = marker
+        self.failures = failures
+        self.failed = 0
+
+    def answer(self, prompt: str) -> str:
+        if self.marker in prompt:
+            with self._lock:
+                fail = self.failures is None or self.failed < self.failures
+                self.failed += fail
+            if fail:
+                return self.MALFORMED_ANSWERS[0]
+        return super().answer(prompt)
+
+
+def generate_candidates(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    # Расстояние — свойство магазина: в промпте оно одно на строку магазина
+    distances = [rng.uniform(0.1, 30) for _ in range(50)]
+    return [{'product': {'id': i, 'name': f"{rng.choice(WORDS)} {i}", 'price': round(rng.uniform(10, 500), 2)},
+             'company': {'id': i % 50, 'name': f"Магазин {i % 50}"},
+             'distance': distances[i % 50], 'total_score': 0.0}
+            for i in range(count)]
+
+
+def bench(latency: float, sizes):
+    with ChatCompletionsStub(latency=latency, jitter=latency / 5, seed=1) as stub:
+        gpt = use_stub_llm(stub.base_url)
+        for count in sizes:
+            candidates = generate_candidates(count)
+            shards = gpt.shard_products(candidates, "молоко", SHARD_TOKENS)
+            print(f"{count} кандидатов, {len(shards)} шардов по <= {SHARD_TOKENS} токенов")
+            for concurrency in (1, 4, 8):
+                stub.max_in_flight = 0
+                start = time.perf_counter()
+                result = gpt.smart_product_search_sharded(candidates, "молоко", SHARD_TOKENS, concurrency)
+                elapsed = time.perf_counter() - start
+                print(f"  параллельно {concurrency}: {elapsed:6.2f} с, результатов {len(result)}, "
+                      f"одновременно у API {stub.max_in_flight}")
+
+
+def check_merge(check: Checks):
+    candidates = generate_candidates(CHECK_CANDIDATES)
+    with ChatCompletionsStub(latency=0.01, seed=1) as stub:
+        gpt = use_stub_llm(stub.base_url)
+        shards = gpt.shard_products(candidates, "молоко", SHARD_TOKENS)
+        check(len(shards) > 1, f"{CHECK_CANDIDATES} кандидатов делятся на шарды: {len(shards)}")
+        # Заглушка упорядочивает по цене и расстоянию — без шардов это эталон
+        single = gpt.smart_product_search(candidates, "молоко", max_prompt_tokens=10 ** 9)
+        merged = gpt.smart_product_search_sharded(candidates, "молоко", SHARD_TOKENS, 4)
+    check(len(merged) == len(set(merged)) and set(merged) == set(single),
+          "слитый результат содержит те же id, что и один запрос, без повторов")
+    for index, shard in enumerate(shards):
+        ids = {item['product']['id'] for item in shard}
+        check([i for i in merged if i in ids] == [i for i in single if i in ids],
+              f"порядок внутри шарда {index + 1} сохранен")
+
+
+def check_failed_shard(check: Checks):
+    candidates = generate_candidates(CHECK_CANDIDATES)
+    import gpt
+    shards = gpt.shard_products(candidates, "молоко", SHARD_TOKENS)
+    # Название встречается только в промпте второго шарда
+    marker = f"|{shards[1][0]['product']['name']}|"
+    policy = gpt.LLMPolicy(deadline_s=5, retries=2, retry_delay_s=0.05)
+
+    with FailingShardStub(marker, failures=1, latency=0.01, seed=1) as stub:
+        use_stub_llm(stub.base_url)
+        result = gpt.smart_product_search_sharded(candidates, "молоко", SHARD_TOKENS, 4, policy)
+    check(stub.failed == 1 and len(result) == CHECK_CANDIDATES,
+          "разовый сбой шарда повторяется, результат полный")
+
+    with FailingShardStub(marker, latency=0.01, seed=1) as stub:
+        use_stub_llm(stub.base_url)
+        start = time.perf_counter()
+        try:
+            gpt.smart_product_search_sharded(candidates, "молоко", SHARD_TOKENS, 4, policy)
+            error = None
+        except Exception as e:
+            error = e
+        elapsed = time.perf_counter() - start
+    check(isinstance(error, gpt.LLMUnavailable) and stub.failed == policy.retries + 1,
+          f"постоянный сбой шарда — LLMUnavailable после {stub.failed} попыток, а не частичный результат")
+    check(elapsed < policy.deadline_s, f"сбой шарда не ждет весь бюджет: {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    sizes = [int(arg) for arg in sys.argv[2:]] or [100, 500, 1000]
+    bench(latency, sizes)
+    print()
+    checks = Checks()
+    check_merge(checks)
+    check_failed_shard(checks)
+    checks.exit()
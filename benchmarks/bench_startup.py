@@ -0,0 +1,95 @@
+# Запуск из корня проекта: python -m benchmarks.bench_startup [--runs 5] [--workdir папка_с_данными]
+"""Время запуска GUI: импорт модулей и время до первой отрисовки главного окна.
+
+Каждый замер — отдельный процесс, чтобы модули не были уже загружены.
+Без дисплея вместо окна измеряется создание PriceManager.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Модули, которые не должны загружаться до первого обращения к ним
+HEAVY_MODULES = ('groq', 'conf', 'geopy', 'openpyxl', 'requests', 'document', 'aiohttp', 'numpy', 'tkinter')
+
+CHILD = r'''
+import json, os, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {root!r})
+os.chdir({workdir!r})
+result = {{}}
+try:
+    import tkinter as tk
+    from gui import PriceManagerGUI
+    result['import_ms'] = (time.perf_counter() - start) * 1000
+    root = tk.Tk()
+    app = PriceManagerGUI(root)
+    root.update()
+    result['window_ms'] = (time.perf_counter() - start) * 1000
+except tk.TclError as e:
+    result['window_error'] = str(e)
+    from main import PriceManager
+    result['import_ms'] = (time.perf_counter() - start) * 1000
+    PriceManager()
+    result['manager_ms'] = (time.perf_counter() - start) * 1000
+result['loaded'] = [name for name in {heavy!r}
+                    if type(sys.modules.get(name)).__name__ == 'module']
+print(json.dumps(result))
+sys.stdout.flush()
+# Фоновые задачи окна (каталог, геокодирование) не ждем
+os._exit(0)
+'''
+
+
+def run_child(workdir: str) -> dict:
+    code = CHILD.format(root=PROJECT_ROOT, workdir=workdir, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    result['process_ms'] = (time.perf_counter() - start) * 1000
+    return result
+
+
+def import_profile(module: str = 'gui') -> dict:
+    """Накопленное время импорта (мс) по данным python -X importtime"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=PROJECT_ROOT,
+                            capture_output=True, text=True).stderr
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = [p.strip() for p in line[len('import time:'):].split('|')]
+        if parts[1].isdigit():
+            cumulative[parts[2]] = int(parts[1]) / 1000
+    return cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время запуска приложения")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--workdir', default=os.getcwd(), help="папка с данными приложения")
+    args = parser.parse_args()
+
+    profile = import_profile()
+    print(f"import gui: {profile.get('gui', float('nan')):.1f} мс")
+    for name in HEAVY_MODULES:
+        if name in profile:
+            print(f"  {name:10s} {profile[name]:8.1f} мс")
+
+    runs = [run_child(os.path.abspath(args.workdir)) for _ in range(args.runs)]
+    for key, label in (('import_ms', "импорт до окна"), ('window_ms', "первое окно"),
+                       ('manager_ms', "PriceManager() (без дисплея)"), ('process_ms', "процесс целиком")):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            print(f"{label:30s} медиана {statistics.median(values):8.1f} мс, мин {min(values):8.1f} мс")
+    if 'window_error' in runs[0]:
+        print(f"Окно не создано: {runs[0]['window_error']}")
+    print(f"Загружены к этому моменту: {', '.join(runs[0]['loaded']) or 'ничего из тяжелых'}")
+
+
+if __name__ == "__main__":
+    main()
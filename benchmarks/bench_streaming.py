@@ -0,0 +1,37 @@
+# Запуск из корня проекта: python -m benchmarks.bench_streaming [задержка_первого_токена_с] [пауза_между_токенами_с]
+"""Обычный и потоковый режим LLM: время до первого результата и до полного ответа."""
+import statistics
+import sys
+import time
+
+from benchmarks.bench_sharded_llm import generate_candidates
+from benchmarks.stubs import ChatCompletionsStub, use_stub_llm
+
+SIZES = [20, 50, 200]
+RUNS = 5
+
+
+def measure(search, candidates):
+    """(мс до первого id, мс до последнего, число id)"""
+    start = time.perf_counter()
+    first, count = None, 0
+    for _ in search(candidates, "молоко"):
+        if first is None:
+            first = time.perf_counter() - start
+        count += 1
+    total = time.perf_counter() - start
+    return (first if first is not None else total) * 1000, total * 1000, count
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.3
+    token_delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.01
+    with ChatCompletionsStub(latency=latency, token_delay=token_delay, seed=1) as stub:
+        gpt = use_stub_llm(stub.base_url)
+        print(f"{'кандидатов':>10s} {'режим':>8s} {'первый мс':>10s} {'весь мс':>10s} {'id':>5s}")
+        for count in SIZES:
+            candidates = generate_candidates(count)
+            for label, search in (('обычный', gpt.smart_product_search), ('поток', gpt.smart_product_search_stream)):
+                runs = [measure(search, candidates) for _ in range(RUNS)]
+                print(f"{count:>10d} {label:>8s} {statistics.median(r[0] for r in runs):>10.1f} "
+                      f"{statistics.median(r[1] for r in runs):>10.1f} {runs[0][2]:>5d}")
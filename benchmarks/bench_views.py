@@ -0,0 +1,121 @@
+# Запуск из корня проекта: python -m benchmarks.bench_views [--rows 1000 10000 100000]
+"""Отрисовка выдачи и списка предприятий: все строки сразу против виртуальной таблицы со страницами.
+
+Окна: ScrolledText по пять строк на товар и Treeview со всеми предприятиями против VirtualTable,
+в которой существуют только видимые строки. Без дисплея окна пропускаются.
+Страницы: search_page с разными порядками и get_companies_page против get_all_companies
+на каталогах разного размера.
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks import synthetic
+from benchmarks.suite import build_manager
+
+
+def timed(operation, runs: int = 5) -> float:
+    """Медиана времени operation(), мс"""
+    values = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        operation()
+        values.append((time.perf_counter() - start) * 1000)
+    return statistics.median(values)
+
+
+def fake_results(count: int):
+    return [{'name': f"Молоко {i}", 'company': f"Магазин {i % 500}", 'price': 50 + i % 90,
+             'distance': i % 40 / 3, 'total_score': 50 + i % 90 + i % 40} for i in range(count)]
+
+
+def bench_widgets(rows_list):
+    import tkinter as tk
+    from tkinter import scrolledtext, ttk
+
+    from gui import PAGE_SIZE, VirtualTable
+
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"Окна пропущены: {e}")
+        return
+    root.geometry("600x500")
+    print(f"{'строк':>8s} {'текст мс':>10s} {'Treeview мс':>12s} {'виртуальная мс':>15s} {'страница мс':>12s}")
+    for count in rows_list:
+        items = fake_results(count)
+
+        def text_all():
+            text = scrolledtext.ScrolledText(root)
+            text.pack()
+            for i, item in enumerate(items, 1):
+                text.insert(tk.END, f"{i}. {item['name']} - {item['price']} руб.\n")
+                text.insert(tk.END, f"   Магазин: {item['company']}\n")
+                text.insert(tk.END, f"   Расстояние: {item['distance']:.2f} км\n")
+                text.insert(tk.END, f"   Общий балл: {item['total_score']:.2f}\n")
+                text.insert(tk.END, "-" * 50 + "\n\n")
+            root.update()
+            text.destroy()
+
+        def tree_all():
+            tree = ttk.Treeview(root, columns=("name", "company", "price"), show="headings")
+            tree.pack()
+            for item in items:
+                tree.insert("", "end", values=(item['name'], item['company'], item['price']))
+            root.update()
+            tree.destroy()
+
+        def virtual(page_size=None):
+            table = VirtualTable(root, [("name", "", 200, None), ("company", "", 150, None),
+                                        ("price", "", 80, 'price')], numbered=True)
+            table.pack()
+            # Порциями по странице, как их отдает PriceManager
+            step = page_size or count
+            for start in range(0, count, step):
+                table.append((item['name'], item['company'], item['price']) for item in items[start:start + step])
+            table.scroll(count // 2)
+            root.update()
+            table.frame.destroy()
+
+        runs = 1 if count > 10000 else 3
+        print(f"{count:>8d} {timed(text_all, runs):>10.1f} {timed(tree_all, runs):>12.1f} "
+              f"{timed(virtual, runs):>15.1f} {timed(lambda: virtual(PAGE_SIZE), runs):>12.1f}")
+    root.destroy()
+
+
+def bench_pages(sizes, seed: int):
+    print(f"\n{'предпр.:товаров':>16s} {'страница по баллу':>18s} {'по цене':>9s} {'по расст.':>10s} "
+          f"{'все предпр.':>12s} {'стр. предпр.':>13s}")
+    cwd = os.getcwd()
+    for text in sizes:
+        company_count, product_count = map(int, text.split(':'))
+        companies, products = synthetic.generate_catalog(company_count, product_count, seed)
+        with tempfile.TemporaryDirectory() as workdir:
+            os.chdir(workdir)
+            try:
+                manager = build_manager(workdir, companies, products)
+                pages = [timed(lambda: manager.search_page("молоко", page_size=50, sort=sort))
+                         for sort in ('score', 'price', 'distance')]
+                full = timed(manager.get_all_companies)
+                page = timed(lambda: manager.get_companies_page('name', 50))
+                manager.close()
+            finally:
+                os.chdir(cwd)
+        print(f"{text:>16s} {pages[0]:>18.2f} {pages[1]:>9.2f} {pages[2]:>10.2f} {full:>12.2f} {page:>13.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отрисовка выдачи: все строки против виртуальной таблицы")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--sizes', nargs='+', default=["100:10000", "2000:100000", "20000:200000"],
+                        help="предприятий:товаров")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    bench_widgets(args.rows)
+    bench_pages(args.sizes, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# Запуск из корня проекта: python -m benchmarks.check_bulk_import [строк_в_большом_прайсе]
+"""Проверка массовой загрузки на заглушке Nominatim: время геокодирования по адресам, повторный запуск
+манифеста без дублей, запись по файлам без всего прайса в памяти основного процесса.
+
+При ошибке код выхода ненулевой.
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.checks import Checks
+from benchmarks.stubs import NominatimStub, use_stub_geocoder
+
+GEOCODE_LATENCY = 0.2
+FILES = 8
+ROWS = 50
+LARGE_ROWS = 200000
+
+
+def write_csv(path: str, rows: int, price_shift: float = 0.0, prefix: str = "Товар"):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            f.write(f"{prefix} {i};{10 + i % 500 + price_shift}\n")
+
+
+def write_manifest(path: str, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['company', 'address', 'file'])
+        writer.writerows(rows)
+
+
+def company_prices(manager, company_id: int):
+    return sorted((p['name'], p['price']) for p in manager.catalog.company_products(company_id))
+
+
+def check_rerun(check: Checks, manager, workdir: str):
+    addresses = {f"Москва, Ленина {i}": (55.75 + i / 1000, 37.61) for i in range(FILES)}
+    rows = []
+    for i, address in enumerate(addresses):
+        name = f"shop_{i}.csv"
+        write_csv(os.path.join(workdir, name), ROWS)
+        rows.append([f"Магазин {i}", address, name])
+    write_csv(os.path.join(workdir, 'no_address.csv'), ROWS)
+    rows.append(["Магазин без адреса", "", 'no_address.csv'])
+    manifest = os.path.join(workdir, 'manifest.csv')
+    write_manifest(manifest, rows)
+
+    with NominatimStub(addresses, latency=GEOCODE_LATENCY) as stub:
+        use_stub_geocoder(stub.search_url, os.path.join(workdir, 'geocode_cache.json'))
+        start = time.perf_counter()
+        first = manager.bulk_import(manifest, max_workers=2)
+        elapsed = time.perf_counter() - start
+
+        companies, products = len(manager.catalog.companies), manager.catalog.product_count
+        check(len(first['companies']) == FILES + 1 and all(r['status'] == 'ok' for r in first['files'])
+              and products == (FILES + 1) * ROWS, "первый запуск: все предприятия добавлены")
+        # По 4 адреса параллельно: 8 адресов идут в две волны, у каждого свое время, а не время от старта
+        geocoded = [r['geocode_seconds'] for r in first['files'] if r['company'] != "Магазин без адреса"]
+        check(stub.requests == FILES and max(geocoded) < GEOCODE_LATENCY * 1.8 <= elapsed,
+              f"время геокодирования по адресам ({min(geocoded):.2f}-{max(geocoded):.2f} с), "
+              f"а не накопленное за {elapsed:.2f} с")
+
+        second = manager.bulk_import(manifest, max_workers=2)
+        check(not second['companies'] and len(second['updated']) == FILES + 1
+              and all(r['status'] == 'updated' for r in second['files']), "повторный запуск обновляет, а не добавляет")
+        check(len(manager.catalog.companies) == companies and manager.catalog.product_count == products,
+              "после повторного запуска нет дублей предприятий и товаров")
+        check(all(r['geocode_seconds'] == 0.0 for r in second['files']) and stub.requests == FILES,
+              "при повторном запуске адреса берутся из кэша")
+
+        changed = first['files'][0]['company_id']
+        before = company_prices(manager, changed)
+        write_csv(os.path.join(workdir, 'shop_0.csv'), ROWS, price_shift=1)
+        manager.bulk_import(manifest, max_workers=2)
+        after = company_prices(manager, changed)
+        check(len(after) == ROWS and all(new[1] == old[1] + 1 for old, new in zip(before, after))
+              and manager.catalog.product_count == products, "измененные цены прайса записаны в то же предприятие")
+
+
+def import_overhead(manager, workdir: str, rows: int) -> float:
+    """Пик памяти основного процесса при загрузке сверх того, что остается в каталоге после нее, байт"""
+    name = f"large_{rows}.csv"
+    write_csv(os.path.join(workdir, name), rows, prefix=f"Товар {rows}")
+    manifest = os.path.join(workdir, f"manifest_{rows}.csv")
+    write_manifest(manifest, [[f"Большой магазин {rows}", "", name]])
+
+    tracemalloc.start()
+    report = manager.bulk_import(manifest, max_workers=2)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if report['files'][0]['products'] != rows:
+        raise RuntimeError(f"загружено {report['files'][0]['products']} товаров из {rows}")
+    return peak - retained
+
+
+def records_size(rows: int) -> float:
+    """Сколько заняли бы все товары прайса списком словарей, байт"""
+    tracemalloc.start()
+    records = [{'id': None, 'name': f"Товар {rows} {i}", 'price': 10.0 + i % 500, 'company_id': 1}
+               for i in range(rows)]
+    size = tracemalloc.get_traced_memory()[0]
+    del records
+    tracemalloc.stop()
+    return size
+
+
+def check_memory(check: Checks, manager, workdir: str, rows: int):
+    # Индекс каталога растет с числом товаров, поэтому сравниваем не пик, а память сверх оставшейся в каталоге
+    small, large = rows // 2, rows
+    overhead = {n: import_overhead(manager, workdir, n) for n in (small, large)}
+    growth = records_size(large) - records_size(small)
+    print(f"  сверх каталога при загрузке: {small} строк — {overhead[small] / 2 ** 20:.1f} МБ, "
+          f"{large} строк — {overhead[large] / 2 ** 20:.1f} МБ; "
+          f"еще {large - small} записей списком — {growth / 2 ** 20:.1f} МБ")
+    check(overhead[large] - overhead[small] < growth / 2,
+          "память загрузки почти не растет с размером прайса: весь прайс в основном процессе не хранится")
+
+
+def main():
+    from main import PriceManager
+    from utils.data_storage import create_storage
+
+    large_rows = int(sys.argv[1]) if len(sys.argv) > 1 else LARGE_ROWS
+    check = Checks()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            storage = create_storage('sqlite', 'companies.json', 'products.json', 'catalog.sqlite3')
+            manager = PriceManager(storage=storage, collect_stats=False)
+            check_rerun(check, manager, workdir)
+            check_memory(check, manager, workdir, large_rows)
+            manager.close()
+        finally:
+            os.chdir(cwd)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
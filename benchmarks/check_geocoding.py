@@ -0,0 +1,161 @@
+# Запуск из корня проекта: python -m benchmarks.check_geocoding
+"""Проверка геокодирования на заглушке Nominatim: кэш и его сроки, ошибки сети, лимит 1 запрос/с, повторы.
+
+При ошибке код выхода ненулевой.
+"""
+import json
+import os
+import socket
+import tempfile
+import time
+
+from benchmarks.checks import Checks
+from benchmarks.stubs import NominatimStub, use_stub_geocoder
+from services.geocode_cache import GeocodeCache
+from services.geocoding import GeocodingService
+
+DAY = 24 * 3600
+KNOWN = {f"Москва, Ленина {i}": (55.75 + i / 1000, 37.61) for i in range(1, 41)}
+UNKNOWN = "Нигде, несуществующая 0"
+
+
+def addresses(first: int, count: int):
+    return [f"Москва, Ленина {i}" for i in range(first, first + count)]
+
+
+def closed_port_url() -> str:
+    """Адрес, на котором никто не слушает: запрос к нему — сетевая ошибка"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/search"
+
+
+def check_cache_hits(check: Checks, stub: NominatimStub):
+    address = addresses(1, 1)[0]
+    before = stub.requests
+    first = GeocodingService.geocode_address(address)
+    second = GeocodingService.geocode_address(address.upper() + ' ')
+    check(first == KNOWN[address] and second == first and stub.requests == before + 1,
+          "повторный адрес (в другом написании) берется из кэша")
+
+    before = stub.requests
+    check(GeocodingService.geocode_address(UNKNOWN) is None and GeocodingService.geocode_address(UNKNOWN) is None
+          and stub.requests == before + 1, "отрицательный ответ тоже кэшируется")
+
+
+def check_ttl(check: Checks, workdir: str):
+    path = os.path.join(workdir, 'ttl_cache.json')
+    cache = GeocodeCache(path)
+    ages = {'положительный 29 дней': (29 * DAY, (55.0, 37.0)), 'положительный 31 день': (31 * DAY, (55.0, 37.0)),
+            'отрицательный 23 часа': (23 * 3600, None), 'отрицательный 25 часов': (25 * 3600, None)}
+    for address, (_, location) in ages.items():
+        cache.put(address, location)
+    cache.flush()
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+    for address, (age, _) in ages.items():
+        entries[GeocodeCache.normalize(address)]['ts'] -= age
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+
+    reloaded = GeocodeCache(path)
+    hits = {address: reloaded.get(address)[0] for address in ages}
+    check(hits['положительный 29 дней'] and not hits['положительный 31 день'],
+          "координаты хранятся 30 дней (после перезагрузки кэша из файла)")
+    check(hits['отрицательный 23 часа'] and not hits['отрицательный 25 часов'], "отрицательный ответ хранится сутки")
+
+
+def check_errors(check: Checks, stub: NominatimStub):
+    cache = GeocodingService.get_cache()
+    address = addresses(2, 1)[0]
+    GeocodingService.configure(base_url=closed_port_url())
+    try:
+        result = GeocodingService.geocode_address(address)
+    finally:
+        GeocodingService.configure(base_url=stub.search_url)
+    check(result is None and not cache.get(address)[0], "сетевая ошибка не кэшируется")
+
+    stub.fail_statuses = [500]
+    before = stub.requests
+    failed = GeocodingService.geocode_address(address)
+    found = GeocodingService.geocode_address(address)
+    check(failed is None and found == KNOWN[address] and stub.requests == before + 2,
+          "ответ 500 не кэшируется, следующий запрос находит адрес")
+
+
+def check_retries(check: Checks, stub: NominatimStub):
+    backoff = 0.05
+    address = addresses(3, 1)[0]
+    stub.fail_statuses = [429, 503]
+    first = len(stub.request_times)
+    result = dict(GeocodingService.geocode_many([address], retries=3, backoff=backoff))
+    times = stub.request_times[first:]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    check(result == {address: KNOWN[address]} and len(times) == 3, "после 429 и 503 запрос повторяется и удается")
+    # Пауза backoff * 2^попытка с разбросом от 0.5 до 1.5
+    check(len(gaps) == 2 and gaps[0] >= backoff * 0.5 and gaps[1] >= backoff * 2 * 0.5,
+          f"паузы между повторами не короче половины backoff * 2^попытка: "
+          f"{', '.join(f'{gap * 1000:.0f} мс' for gap in gaps)}")
+
+    address = addresses(4, 1)[0]
+    stub.fail_statuses = [404]
+    before = stub.requests
+    result = dict(GeocodingService.geocode_many([address], retries=3, backoff=backoff))
+    check(result == {address: None} and stub.requests == before + 1
+          and not GeocodingService.get_cache().get(address)[0], "ответ 404 не повторяется и не кэшируется")
+
+
+def check_rate_limit(check: Checks, stub: NominatimStub):
+    GeocodingService.configure(rate=1.0)
+    try:
+        first = len(stub.request_times)
+        result = dict(GeocodingService.geocode_many(addresses(10, 3), max_workers=4))
+    finally:
+        GeocodingService.configure(rate=10000)
+    times = stub.request_times[first:]
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    check(len(result) == 3 and len(times) == 3 and min(gaps) >= 0.9,
+          f"не больше одного запроса в секунду при 4 потоках: {', '.join(f'{gap:.2f} с' for gap in gaps)}")
+
+
+def check_batched_writes(check: Checks, workdir: str):
+    cache = GeocodeCache(os.path.join(workdir, 'batch_cache.json'), flush_every=100, flush_interval=3600)
+    for i in range(250):
+        cache.put(f"адрес {i}", (55.0, 37.0))
+    written = cache.writes
+    cache.flush()
+    with open(cache.filename, encoding='utf-8') as f:
+        saved = json.load(f)
+    check(written == 2 and cache.writes == 3 and len(saved) == 250,
+          "250 записей в кэш — 2 записи файла по счетчику и одна по flush")
+
+    cache = GeocodingService.get_cache()
+    cache.flush()
+    before = cache.writes
+    batch = addresses(20, 20)
+    result = dict(GeocodingService.geocode_many(batch))
+    with open(cache.filename, encoding='utf-8') as f:
+        saved = json.load(f)
+    check(len(result) == 20 and cache.writes - before <= 2,
+          f"20 новых адресов пакета записаны в файл кэша за {cache.writes - before} раз(а)")
+    check(all(GeocodeCache.normalize(address) in saved for address in batch), "после пакета кэш на диске полный")
+
+
+def main():
+    check = Checks()
+    with tempfile.TemporaryDirectory() as workdir, NominatimStub(KNOWN) as stub:
+        use_stub_geocoder(stub.search_url, os.path.join(workdir, 'geocode_cache.json'))
+        check_cache_hits(check, stub)
+        check_ttl(check, workdir)
+        check_errors(check, stub)
+        check_retries(check, stub)
+        start = time.perf_counter()
+        check_rate_limit(check, stub)
+        print(f"  (3 запроса с лимитом 1/с — {time.perf_counter() - start:.2f} с)")
+        check_batched_writes(check, workdir)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# Запуск из корня проекта: python -m benchmarks.check_import_locks [строк] [предел_ожидания_с]
+"""Поиск во время загрузки большого прайса: разбор идет без блокировок, поиск не ждет всю загрузку.
+
+Без сети (адрес не указан). При ошибке код выхода ненулевой.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.checks import Checks
+
+ROWS = 400000
+MAX_WAIT_S = 0.5
+QUERY = "молоко"
+
+
+def write_price_list(path: str, rows: int):
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            f.write(f"{'Молоко' if i % 1000 == 0 else 'Товар'} {i};{10 + i % 500}\n")
+
+
+def main():
+    from main import PriceManager
+    from utils.data_storage import create_storage
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    max_wait = float(sys.argv[2]) if len(sys.argv) > 2 else MAX_WAIT_S
+    check = Checks()
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            path = os.path.join(workdir, 'price.csv')
+            write_price_list(path, rows)
+            storage = create_storage('sqlite', 'companies.json', 'products.json', 'catalog.sqlite3')
+            manager = PriceManager(storage=storage, collect_stats=False)
+            manager.add_company_from_file("Первый магазин", path)
+
+            done = threading.Event()
+            result = {}
+
+            def run_import():
+                start = time.perf_counter()
+                result['message'] = manager.add_company_from_file("Второй магазин", path)
+                result['seconds'] = time.perf_counter() - start
+                done.set()
+
+            worker = threading.Thread(target=run_import)
+            worker.start()
+            waits = []
+            while not done.is_set():
+                start = time.perf_counter()
+                manager.catalog.candidates(QUERY, 20)
+                waits.append(time.perf_counter() - start)
+                time.sleep(0.01)
+            worker.join()
+
+            print(f"{rows} строк: загрузка {result['seconds']:.2f} с, поисков во время загрузки {len(waits)}, "
+                  f"самый долгий {max(waits, default=0) * 1000:.0f} мс")
+            check(result['message'].startswith('✅'), "второй прайс загружен")
+            check(len(waits) > 1, "поиск выполнялся во время загрузки")
+            check(max(waits, default=0) <= max_wait, f"ни один поиск не ждал дольше {max_wait} с")
+            check(manager.catalog.product_count == 2 * rows, "в каталоге товары обоих прайсов")
+            company = manager.find_company("Второй магазин")
+            found = manager.catalog.candidates(QUERY, 1000, [company['id']])
+            check(len(found) == rows // 1000 and all(p['name'].startswith("Молоко") for p in found),
+                  "товары нового предприятия находятся поиском")
+            manager.close()
+        finally:
+            os.chdir(cwd)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
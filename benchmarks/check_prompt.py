@@ -0,0 +1,62 @@
+# Запуск из корня проекта: python -m benchmarks.check_prompt
+"""Проверка компактного промпта с короткими id: ранжирование заглушкой по таблице промпта
+совпадает с ранжированием по исходным ценам и расстояниям, каждый id ответа — товар из кандидатов.
+
+Без сети: модель заменяет заглушка. При ошибке код выхода ненулевой.
+"""
+from benchmarks.bench_sharded_llm import generate_candidates
+from benchmarks.checks import Checks
+from benchmarks.stubs import ChatCompletionsStub, use_stub_llm
+
+# Доля позиций, совпавших с эталоном; расхождения возможны из-за округления расстояния в промпте
+MIN_AGREEMENT = 0.95
+SIZES = [20, 100, 300]
+SEEDS = [1, 2, 3]
+
+
+def agreement(ranking, reference) -> float:
+    return sum(a == b for a, b in zip(ranking, reference)) / len(reference)
+
+
+def check_ranking(check: Checks):
+    with ChatCompletionsStub(seed=1) as stub:
+        gpt = use_stub_llm(stub.base_url)
+        for count in SIZES:
+            for seed in SEEDS:
+                candidates = generate_candidates(count, seed)
+                ids = {item['product']['id'] for item in candidates}
+                # Заглушка упорядочивает по цене и расстоянию из промпта — эталон по исходным значениям
+                reference = [item['product']['id'] for item in
+                             sorted(candidates, key=lambda item: (item['product']['price'], item['distance']))]
+                ranking = gpt.smart_product_search(candidates, "молоко", max_prompt_tokens=10 ** 9)
+                check(set(ranking) <= ids and len(ranking) == len(set(ranking)) == count,
+                      f"{count} кандидатов, seed {seed}: все id ответа — товары кандидатов, без повторов")
+                value = agreement(ranking, reference)
+                check(value >= MIN_AGREEMENT, f"{count} кандидатов, seed {seed}: совпадение с эталоном {value:.2f}")
+
+
+def check_parsing(check: Checks):
+    import gpt
+
+    candidates = generate_candidates(5)
+    validate = gpt._ranking_validator(candidates)
+    product_ids = [item['product']['id'] for item in candidates]
+    answers = {
+        "```json\n[2, 3, 1]\n```": [product_ids[1], product_ids[2], product_ids[0]],
+        'Вот ответ: [{"id": 4}, "5", "#1"]': [product_ids[3], product_ids[4], product_ids[0]],
+        "[3, 99, 0, -1, 3, \"x\", 2]": [product_ids[2], product_ids[1]],
+    }
+    for answer, expected in answers.items():
+        check(validate(answer) == expected, f"ответ {answer!r} -> id товаров {expected}")
+    check(validate("Извините, я не могу помочь") is None, "ответ без JSON отвергается")
+
+
+def main():
+    check = Checks()
+    check_ranking(check)
+    check_parsing(check)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# Запуск из корня проекта: python -m benchmarks.check_reimport
+"""Проверка повторной загрузки прайса как разницы: повторы названий, неизмененный файл.
+
+Без сети (адрес не указан — геокодирование не нужно). При ошибке код выхода ненулевой.
+"""
+import os
+import tempfile
+
+from benchmarks.checks import Checks
+from services.price_diff import diff_price_list
+
+
+def check_diff(check: Checks):
+    existing = [{'id': 1, 'name': "Молоко", 'price': 80}, {'id': 2, 'name': "Молоко", 'price': 95},
+                {'id': 3, 'name': "Хлеб", 'price': 40}]
+    rows = [{'name': "Молоко", 'price': 80}, {'name': "Молоко", 'price': 95}, {'name': "Хлеб", 'price': 40}]
+    check(diff_price_list(existing, rows).is_empty(), "тот же прайс с повтором названия — пустая разница")
+
+    diff = diff_price_list(existing, list(reversed(rows)))
+    check(diff.is_empty() and diff.unchanged == 3, "порядок строк не важен")
+
+    diff = diff_price_list(existing, [{'name': "молоко", 'price': 95}, {'name': "Молоко", 'price': 99},
+                                      {'name': "Хлеб", 'price': 40}])
+    check(diff.price_updates == [(1, 99)] and not diff.deletes and not diff.inserts,
+          "меняется цена только у одного из одноименных товаров")
+
+    diff = diff_price_list(existing, [{'name': "Молоко", 'price': 95}, {'name': "Хлеб", 'price': 40}])
+    check(diff.deletes == [1] and not diff.price_updates, "исчезнувший повтор удаляется один")
+
+    diff = diff_price_list(existing, rows + [{'name': "Молоко", 'price': 70}])
+    check(diff.inserts == [{'name': "Молоко", 'price': 70}] and not diff.deletes, "третий повтор добавляется")
+
+
+def check_manager(check: Checks):
+    from main import PriceManager
+    from utils.data_storage import create_storage
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            path = os.path.join(workdir, 'price.csv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("Молоко;80\nМолоко;95\nХлеб;40\n")
+            storage = create_storage('sqlite', 'companies.json', 'products.json', 'catalog.sqlite3')
+            manager = PriceManager(storage=storage, collect_stats=False)
+            first = manager.add_company_from_file("Магазин", path)
+            check(first.startswith('✅'), "первая загрузка")
+            company = manager.find_company("Магазин")
+            before = sorted((p['id'], p['price']) for p in manager.catalog.company_products(company['id']))
+            message = manager.add_company_from_file("Магазин", path)
+            after = sorted((p['id'], p['price']) for p in manager.catalog.company_products(company['id']))
+            check("Удалено товаров: 0" in message and "Новых товаров: 0" in message and before == after,
+                  "повторная загрузка того же файла ничего не меняет")
+            manager.close()
+        finally:
+            os.chdir(cwd)
+
+
+def main():
+    check = Checks()
+    check_diff(check)
+    check_manager(check)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
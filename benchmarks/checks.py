@@ -0,0 +1,20 @@
+"""Проверки в скриптах бенчмарков: печать результата и ненулевой код выхода при ошибках"""
+import sys
+
+
+class Checks:
+    def __init__(self):
+        self.failures = []
+
+    def __call__(self, condition: bool, message: str) -> bool:
+        print(f"{'✅' if condition else '❌'} {message}")
+        if not condition:
+            self.failures.append(message)
+        return bool(condition)
+
+    def exit(self):
+        """Завершает скрипт: код 1, если хоть одна проверка не прошла"""
+        if self.failures:
+            print(f"\nНе пройдено проверок: {len(self.failures)}")
+            sys.exit(1)
+        print("\nВсе проверки пройдены")
@@ -0,0 +1,197 @@
+# Запуск из корня проекта: python -m benchmarks.load_api [--users 50] [--requests 20] [--llm-share 0.2] [--uploads 5]
+"""Нагрузочный тест HTTP API: общий каталог, у каждого виртуального пользователя свой сеанс и адрес.
+
+Groq и Nominatim заменены локальными заглушками с задержкой. Проверяется, что запросы проходят без ошибок,
+медленные LLM-запросы и загрузка прайсов не задерживают быстрые локальные, а сеансы с разными адресами
+получают разные расстояния. При ошибке код выхода ненулевой.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+
+from benchmarks import synthetic
+from benchmarks.checks import Checks
+from benchmarks.stubs import ChatCompletionsStub, NominatimStub, use_stub_geocoder, use_stub_llm
+from benchmarks.suite import build_manager
+
+# Локальный поиск, начатый при идущем LLM-запросе, так и отмечается в таблице
+LOCAL_DURING_LLM = 'search[local+llm]'
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.uploads = []
+
+
+async def call(session: aiohttp.ClientSession, base_url: str, stats: LoadStats, kind: str, method: str, path: str,
+               also: str = None, **kwargs):
+    """Запрос с замером; статус 400+ и сбой соединения считаются ошибкой. Возвращает (статус, JSON или None)"""
+    start = time.perf_counter()
+    try:
+        async with session.request(method, base_url + path, **kwargs) as response:
+            status = response.status
+            data = await response.json() if response.content_type == 'application/json' else None
+    except aiohttp.ClientError:
+        status, data = None, None
+    elapsed = time.perf_counter() - start
+    for name in filter(None, (kind, also)):
+        stats.latencies[name].append(elapsed)
+        if status is None or status >= 400:
+            stats.errors[name] += 1
+    return status, data
+
+
+async def upload(session: aiohttp.ClientSession, base_url: str, stats: LoadStats, name: str, address: str,
+                 price_path: str):
+    with open(price_path, 'rb') as f:
+        form = aiohttp.FormData()
+        form.add_field('name', name)
+        form.add_field('address', address)
+        form.add_field('file', f, filename=os.path.basename(price_path))
+        status, data = await call(session, base_url, stats, 'upload', 'POST', '/api/companies', data=form)
+    stats.uploads.append(status == 200 and bool(data and data.get('ok')))
+
+
+async def virtual_user(session: aiohttp.ClientSession, base_url: str, address: str, args, rng: random.Random,
+                       stats: LoadStats, llm_stub: ChatCompletionsStub, upload_name: str = None,
+                       price_path: str = None):
+    city, street = address.split(', ', 1)
+    await call(session, base_url, stats, 'location', 'POST', '/api/location', json={'city': city, 'street': street})
+    for i in range(args.requests):
+        if upload_name and i == args.requests // 2:
+            await upload(session, base_url, stats, upload_name, address, price_path)
+        query = rng.choice(synthetic.QUERIES)
+        if rng.random() < args.llm_share:
+            await call(session, base_url, stats, 'search[llm]', 'GET', '/api/search',
+                       params={'q': query, 'mode': 'llm'})
+        else:
+            also = LOCAL_DURING_LLM if llm_stub.in_flight else None
+            await call(session, base_url, stats, 'search[local]', 'GET', '/api/search',
+                       params={'q': query, 'mode': 'local'}, also=also)
+    await call(session, base_url, stats, 'companies', 'GET', '/api/companies', params={'nearest_k': 20})
+
+
+async def session_distances(base_url: str, stats: LoadStats, address: str):
+    """{id предприятия: расстояние} для нового сеанса с данным адресом"""
+    async with aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) as session:
+        city, street = address.split(', ', 1)
+        await call(session, base_url, stats, 'location', 'POST', '/api/location',
+                   json={'city': city, 'street': street})
+        _, data = await call(session, base_url, stats, 'companies', 'GET', '/api/companies',
+                             params={'page_size': 20, 'sort': 'name'})
+    return {row['id']: row['distance'] for row in (data or {}).get('items', [])}
+
+
+async def run_load(manager, args, llm_stub: ChatCompletionsStub, addresses, price_path: str, check: Checks):
+    from services.http_api import create_app
+
+    runner = web.AppRunner(create_app(manager, args.workers, args.network_workers))
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = f"http://{host}:{port}"
+
+    stats = LoadStats()
+    rng = random.Random(args.seed)
+    companies_before = len(manager.catalog.companies)
+    start = time.perf_counter()
+    try:
+        # Отдельный ClientSession — отдельные cookie, то есть отдельный сеанс API;
+        # unsafe=True: иначе aiohttp не хранит cookie для адреса 127.0.0.1
+        sessions = [aiohttp.ClientSession(cookie_jar=aiohttp.CookieJar(unsafe=True)) for _ in range(args.users)]
+        try:
+            await asyncio.gather(*(virtual_user(s, base_url, rng.choice(addresses), args,
+                                                random.Random(rng.random()), stats, llm_stub,
+                                                f"Загруженный магазин {i}" if i < args.uploads else None,
+                                                price_path)
+                                   for i, s in enumerate(sessions)))
+        finally:
+            for s in sessions:
+                await s.close()
+        elapsed = time.perf_counter() - start
+
+        first_city, second_city = (next(a for a in addresses if a.startswith(city))
+                                   for city in ("Москва", "Владивосток"))
+        near, far = await session_distances(base_url, stats, first_city), \
+            await session_distances(base_url, stats, second_city)
+    finally:
+        await runner.cleanup()
+
+    total = sum(len(v) for kind, v in stats.latencies.items() if kind != LOCAL_DURING_LLM)
+    print(f"{args.users} пользователей, {total} запросов за {elapsed:.2f} с ({total / elapsed:.1f} запр/с), "
+          f"одновременно у LLM до {llm_stub.max_in_flight}")
+    print(f"{'запрос':18s} {'число':>7s} {'ошибок':>7s} {'p50 мс':>9s} {'p95 мс':>9s} {'p99 мс':>9s}")
+    p99 = {}
+    for kind, values in sorted(stats.latencies.items()):
+        p50, p95, p99[kind] = np.percentile(np.array(values) * 1000, [50, 95, 99])
+        print(f"{kind:18s} {len(values):>7d} {stats.errors[kind]:>7d} {p50:>9.1f} {p95:>9.1f} {p99[kind]:>9.1f}")
+    print()
+
+    for kind in sorted(stats.latencies):
+        check(stats.errors[kind] == 0, f"{kind}: без ошибок")
+    if args.llm_share > 0:
+        check(len(stats.latencies[LOCAL_DURING_LLM]) > 0, "локальные поиски шли одновременно с LLM-запросами")
+        check(p99.get(LOCAL_DURING_LLM, 0) <= args.max_local_p99 * 1000,
+              f"p99 локального поиска во время LLM-запросов не больше {args.max_local_p99 * 1000:.0f} мс")
+    if args.uploads:
+        check(len(stats.uploads) == args.uploads and all(stats.uploads), "все прайсы во время поиска загружены")
+        check(len(manager.catalog.companies) == companies_before + args.uploads,
+              "загруженные предприятия появились в каталоге")
+    common = set(near) & set(far)
+    check(bool(common) and all(near[cid] != far[cid] for cid in common),
+          "сеансы с разными адресами получают разные расстояния")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест HTTP API на заглушках")
+    parser.add_argument('--companies', type=int, default=500)
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=20, help="поисковых запросов на пользователя")
+    parser.add_argument('--llm-share', type=float, default=0.2, help="доля запросов в режиме llm")
+    parser.add_argument('--llm-latency', type=float, default=2.0)
+    parser.add_argument('--max-local-p99', type=float, default=1.5,
+                        help="предел p99 локального поиска во время LLM-запросов, с")
+    parser.add_argument('--uploads', type=int, default=5, help="сколько пользователей загружают прайс")
+    parser.add_argument('--upload-rows', type=int, default=5000)
+    parser.add_argument('--geocode-latency', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--network-workers', type=int, default=32)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    args.uploads = min(args.uploads, args.users)
+
+    check = Checks()
+    companies, products = synthetic.generate_catalog(args.companies, args.products, args.seed)
+    addresses = [c['address'] for c in companies]
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, \
+            ChatCompletionsStub(latency=args.llm_latency, jitter=args.llm_latency / 5, seed=args.seed) as llm_stub, \
+            NominatimStub(synthetic.address_book(companies), latency=args.geocode_latency) as geo:
+        os.chdir(workdir)
+        try:
+            use_stub_llm(llm_stub.base_url)
+            use_stub_geocoder(geo.search_url, os.path.join(workdir, 'geocode_cache.json'))
+            price_path = os.path.join(workdir, 'upload.xlsx')
+            synthetic.write_price_file(price_path, args.upload_rows, args.seed)
+            manager = build_manager(workdir, companies, products)
+            asyncio.run(run_load(manager, args, llm_stub, addresses, price_path, check))
+            manager.close()
+        finally:
+            os.chdir(cwd)
+    check.exit()
+
+
+if __name__ == "__main__":
+    main()
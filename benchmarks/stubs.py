@@ -0,0 +1,276 @@
+"""Локальные заглушки внешних API для бенчмарков: сеть и ключи не нужны."""
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import GeneratorType
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from services.geocode_cache import GeocodeCache
+
+_STORE_RE = re.compile(r"^(?P<code>m\d+)\|(?P<name>.*)\|(?P<distance>[\d.]+)$", re.MULTILINE)
+_PRODUCT_RE = re.compile(r"^(?P<id>\d+)\|(?P<name>.*)\|(?P<price>[\d.e+]+)\|(?P<code>m\d+)$", re.MULTILINE)
+# Пункты списка покупок идут между заголовком списка и таблицей магазинов
+_BASKET_RE = re.compile(r"^Список покупок.*?$(?P<lines>.*?)^Магазины", re.MULTILINE | re.DOTALL)
+
+
+def parse_prompt_queries(prompt: str) -> List[str]:
+    """Пункты списка покупок из промпта gpt.build_basket_prompt; для обычного промпта — пустой список"""
+    match = _BASKET_RE.search(prompt)
+    if match is None:
+        return []
+    return [line.split('|', 1)[1] for line in match['lines'].strip().splitlines() if '|' in line]
+
+
+def matches_query(name: str, query: str) -> bool:
+    """Грубая замена понимания модели: название содержит начало одного из слов запроса"""
+    name = name.lower()
+    return any(word[:4] in name for word in query.lower().split() if len(word) >= 3)
+
+
+def parse_prompt_items(prompt: str) -> List[Dict]:
+    """Товары из таблицы промпта gpt.build_prompt"""
+    stores = {m['code']: (m['name'], float(m['distance'])) for m in _STORE_RE.finditer(prompt)}
+    items = []
+    for m in _PRODUCT_RE.finditer(prompt):
+        company, distance = stores.get(m['code'], ('', 0.0))
+        items.append({'id': int(m['id']), 'name': m['name'], 'company': company,
+                      'price': float(m['price']), 'distance': distance})
+    return items
+
+
+class StubServer:
+    """HTTP-сервер в фоновом потоке с задержкой ответа latency ± jitter секунд.
+
+    Подклассы реализуют respond(method, path, query, body) -> объект для JSON-ответа
+    или генератор объектов для потокового ответа (server-sent events).
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, port: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        # Моменты прихода запросов (time.monotonic)
+        self.request_times: List[float] = []
+        # Коды ошибок, которыми ответить на следующие запросы, по одному на запрос
+        self.fail_statuses: List[int] = []
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def in_flight(self) -> int:
+        """Сколько запросов заглушка обрабатывает прямо сейчас"""
+        with self._lock:
+            return self._in_flight
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def respond(self, method: str, path: str, query: Dict[str, List[str]], body: Dict):
+        raise NotImplementedError
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str):
+        url = urlsplit(handler.path)
+        length = int(handler.headers.get('Content-Length', 0))
+        body = json.loads(handler.rfile.read(length) or b'{}') if length else {}
+        with self._lock:
+            self.requests += 1
+            self.request_times.append(time.monotonic())
+            status = self.fail_statuses.pop(0) if self.fail_statuses else 200
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+        try:
+            time.sleep(self.delay())
+            payload = self.respond(method, url.path, parse_qs(url.query), body) if status == 200 else {'error': status}
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+        if isinstance(payload, GeneratorType):
+            self._stream(handler, payload)
+            return
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', 'application/json')
+            handler.send_header('Content-Length', str(len(data)))
+            handler.end_headers()
+            handler.wfile.write(data)
+        except ConnectionError:
+            # Клиент не дождался ответа (истек его бюджет времени)
+            pass
+
+    @staticmethod
+    def _stream(handler: BaseHTTPRequestHandler, events):
+        """События по одному в формате SSE; конец ответа — закрытие соединения (HTTP/1.0)"""
+        handler.send_response(200)
+        handler.send_header('Content-Type', 'text/event-stream')
+        handler.send_header('Cache-Control', 'no-cache')
+        handler.end_headers()
+        try:
+            for event in events:
+                handler.wfile.write(b"data: " + json.dumps(event, ensure_ascii=False).encode('utf-8') + b"\n\n")
+                handler.wfile.flush()
+            handler.wfile.write(b"data: [DONE]\n\n")
+            handler.wfile.flush()
+        except ConnectionError:
+            # Клиент прекратил чтение ответа (новый поиск или истек бюджет) — это не ошибка
+            pass
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub._handle(self, 'GET')
+
+            def do_POST(self):
+                stub._handle(self, 'POST')
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class ChatCompletionsStub(StubServer):
+    """Отвечает как /openai/v1/chat/completions.
+
+    Возвращает id товаров из промпта, отсортированные по цене и расстоянию:
+
+        with ChatCompletionsStub(latency=0.5) as stub:
+            client = Groq(api_key='stub', base_url=stub.base_url)
+
+    latency — задержка до первого токена; при stream=True ответ идет фрагментами
+    по chunk_chars символов с паузой token_delay секунд между ними.
+    Для проверки хвостов задержки доля slow_share ответов задерживается еще на slow_latency,
+    а доля malformed_share приходит без пригодного JSON.
+    """
+
+    MALFORMED_ANSWERS = ("Извините, я не могу помочь с этим запросом.", "```json\n[1, 2, 3,", "{\"error\": \"overloaded\"}")
+
+    def __init__(self, token_delay: float = 0.0, chunk_chars: int = 4, slow_share: float = 0.0,
+                 slow_latency: float = 0.0, malformed_share: float = 0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.slow_share = slow_share
+        self.slow_latency = slow_latency
+        self.malformed_share = malformed_share
+        self.slow_responses = 0
+        self.malformed_responses = 0
+
+    def _inject_faults(self, content: str) -> str:
+        with self._lock:
+            slow = self._rng.random() < self.slow_share
+            malformed = self._rng.random() < self.malformed_share
+            self.slow_responses += slow
+            self.malformed_responses += malformed
+            if malformed:
+                content = self._rng.choice(self.MALFORMED_ANSWERS)
+        if slow:
+            time.sleep(self.slow_latency)
+        return content
+
+    def answer(self, prompt: str) -> str:
+        items = parse_prompt_items(prompt)
+        items.sort(key=lambda item: (item['price'], item['distance']))
+        queries = parse_prompt_queries(prompt)
+        if queries:
+            ranking = {str(number): [item['id'] for item in items if matches_query(item['name'], query)]
+                       for number, query in enumerate(queries, 1)}
+            return "```json\n" + json.dumps(ranking) + "\n```"
+        return "```json\n" + json.dumps([item['id'] for item in items]) + "\n```"
+
+    def respond(self, method: str, path: str, query: Dict[str, List[str]], body: Dict):
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        content = self._inject_faults(self.answer(prompt))
+        usage = {'prompt_tokens': len(prompt) // 3, 'completion_tokens': len(content) // 3,
+                 'total_tokens': (len(prompt) + len(content)) // 3}
+        if body.get('stream'):
+            return self._chunks(body, content, usage)
+        # Без потока ответ отдается, когда сгенерирован целиком
+        time.sleep(self.token_delay * (max(1, -(-len(content) // self.chunk_chars)) - 1))
+        return {
+            'id': f"stub-{self.requests}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'stub'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': usage
+        }
+
+    def _chunks(self, body: Dict, content: str, usage: Dict):
+        base = {'id': f"stub-{self.requests}", 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                'model': body.get('model', 'stub')}
+        for start in range(0, len(content), self.chunk_chars):
+            if start and self.token_delay:
+                time.sleep(self.token_delay)
+            yield dict(base, choices=[{'index': 0, 'finish_reason': None,
+                                       'delta': {'content': content[start:start + self.chunk_chars]}}])
+        # Как у Groq: usage приходит в последнем фрагменте, в поле x_groq
+        yield dict(base, choices=[{'index': 0, 'finish_reason': 'stop', 'delta': {}}], x_groq={'usage': usage})
+
+
+class NominatimStub(StubServer):
+    """Отвечает как /search Nominatim: координаты известных адресов, для остальных — пустой список"""
+
+    def __init__(self, locations: Dict[str, Tuple[float, float]], **kwargs):
+        super().__init__(**kwargs)
+        self.locations = {GeocodeCache.normalize(address): point for address, point in locations.items()}
+
+    @property
+    def search_url(self) -> str:
+        return f"{self.base_url}/search"
+
+    def respond(self, method: str, path: str, query: Dict[str, List[str]], body: Dict):
+        point = self.locations.get(GeocodeCache.normalize(query.get('q', [''])[0]))
+        if point is None:
+            return []
+        return [{'lat': str(point[0]), 'lon': str(point[1]), 'display_name': query['q'][0]}]
+
+
+def use_stub_llm(base_url: str):
+    """Направляет gpt.py на заглушку; conf.py с ключом для этого не нужен"""
+    from groq import Groq
+
+    import gpt
+    gpt.client = Groq(api_key='stub', base_url=base_url, max_retries=0)
+    return gpt
+
+
+def use_stub_geocoder(search_url: str, cache_path: str):
+    """Направляет GeocodingService на заглушку с отдельным кэшем и без ограничения скорости"""
+    from services.geocoding import GeocodingService
+
+    GeocodingService.configure(base_url=search_url, cache=GeocodeCache(cache_path), rate=10000)
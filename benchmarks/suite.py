@@ -0,0 +1,221 @@
+# Запуск из корня проекта:
+#   python -m benchmarks.suite --sizes 100:10000 1000:100000 --output bench.json
+#   python -m benchmarks.suite --compare bench_old.json --output bench_new.json
+"""Набор бенчмарков на синтетическом каталоге с заглушками Groq и Nominatim.
+
+Для каждого размера каталога (предприятий:товаров) измеряются поиск (локальный и через LLM),
+список предприятий, разбор прайса и добавление предприятия из файла: перцентили задержки,
+пропускная способность и пик выделенной памяти. Результаты пишутся в JSON для сравнения версий.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks import synthetic
+from benchmarks.stubs import ChatCompletionsStub, NominatimStub, use_stub_geocoder, use_stub_llm
+
+DEFAULT_SIZES = ["100:10000", "1000:100000"]
+# Параметры, без совпадения которых сравнение прогонов некорректно
+COMPARABLE_ARGS = ('parse_rows', 'import_rows', 'llm_latency', 'geocode_latency', 'seed')
+
+
+def run_benchmark(name: str, size: Dict, operation: Callable[[int], object], iterations: int,
+                  setup: Optional[Callable[[int], None]] = None) -> Dict:
+    """Замеряет iterations вызовов operation(i); пик памяти — отдельным вызовом под tracemalloc"""
+    latencies = []
+    for i in range(iterations):
+        if setup:
+            setup(i)
+        start = time.perf_counter()
+        operation(i)
+        latencies.append(time.perf_counter() - start)
+
+    # tracemalloc замедляет выполнение, поэтому память меряем вне замеров времени
+    if setup:
+        setup(iterations)
+    tracemalloc.start()
+    operation(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    values = np.array(latencies) * 1000
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {
+        'benchmark': name,
+        'companies': size['companies'],
+        'products': size['products'],
+        'iterations': iterations,
+        'p50_ms': round(float(p50), 3),
+        'p90_ms': round(float(p90), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(values.mean()), 3),
+        'max_ms': round(float(values.max()), 3),
+        'throughput_per_s': round(iterations / sum(latencies), 2),
+        'peak_alloc_mb': round(peak / 2 ** 20, 3)
+    }
+
+
+def build_manager(workdir: str, companies: List[Dict], products: List[Dict]):
+    from main import PriceManager
+    from utils.data_storage import create_storage
+
+    storage = create_storage('sqlite', os.path.join(workdir, 'companies.json'),
+                             os.path.join(workdir, 'products.json'), os.path.join(workdir, 'catalog.sqlite3'))
+    storage.add_companies(companies, products)
+    manager = PriceManager(storage=storage)
+    manager.catalog.refresh()
+    return manager
+
+
+def bench_size(size: Dict, args) -> List[Dict]:
+    companies, products = synthetic.generate_catalog(size['companies'], size['products'], args.seed)
+    rng = random.Random(args.seed)
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir, \
+            NominatimStub(synthetic.address_book(companies), latency=args.geocode_latency, seed=args.seed) as geo:
+        # Кэши и снимок PriceManager создает в текущей папке
+        os.chdir(workdir)
+        try:
+            use_stub_geocoder(geo.search_url, os.path.join(workdir, 'geocode_cache.json'))
+            manager = build_manager(workdir, companies, products)
+            cities = list(synthetic.CITIES.items())
+            queries = [rng.choice(synthetic.QUERIES) for _ in range(args.iterations + 1)]
+
+            def move_user(i):
+                city, point = cities[i % len(cities)]
+                manager.user.set_location(city, point)
+
+            def search(mode):
+                return lambda i: manager.search_products(queries[i], mode=mode)
+
+            results.append(run_benchmark('search_products[local]', size, search('local'), args.iterations,
+                                         setup=move_user))
+
+            def cold_llm(i):
+                move_user(i)
+                manager.llm_cache.clear()
+
+            results.append(run_benchmark('search_products[llm]', size, search('llm'), args.llm_iterations,
+                                         setup=cold_llm))
+            results.append(run_benchmark('get_all_companies', size, lambda i: manager.get_all_companies(),
+                                         args.iterations, setup=move_user))
+
+            parse_path = os.path.join(workdir, 'parse.xlsx')
+            synthetic.write_price_file(parse_path, args.parse_rows, args.seed)
+            from services.file_parser import FileParser
+            results.append(run_benchmark('parse_excel_file', size, lambda i: FileParser.parse_excel_file(parse_path),
+                                         args.file_iterations))
+
+            import_paths = []
+            for i in range(args.file_iterations + 1):
+                path = os.path.join(workdir, f'import_{i}.xlsx')
+                synthetic.write_price_file(path, args.import_rows, args.seed + i)
+                import_paths.append(path)
+            addresses = [c['address'] for c in rng.sample(companies, min(len(companies), args.file_iterations + 1))]
+
+            def add_company(i):
+                message = manager.add_company_from_file(f"Новый магазин {i}", import_paths[i],
+                                                        addresses[i % len(addresses)])
+                if not message.startswith('✅'):
+                    raise RuntimeError(message)
+
+            results.append(run_benchmark('add_company_from_file', size, add_company, args.file_iterations))
+            manager.close()
+        finally:
+            os.chdir(cwd)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(results: List[Dict]):
+    print(f"{'бенчмарк':24s} {'предпр.':>8s} {'товаров':>9s} {'p50 мс':>9s} {'p90 мс':>9s} {'p99 мс':>9s} "
+          f"{'оп/с':>9s} {'пик МБ':>8s}")
+    for r in results:
+        print(f"{r['benchmark']:24s} {r['companies']:>8d} {r['products']:>9d} {r['p50_ms']:>9.2f} "
+              f"{r['p90_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['throughput_per_s']:>9.1f} {r['peak_alloc_mb']:>8.2f}")
+
+
+def compare(results: List[Dict], baseline_path: str, args):
+    """Изменение p50/p99 относительно сохраненного прогона (+ — медленнее)"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    baseline = {(r['benchmark'], r['companies'], r['products']): r for r in report['results']}
+    print(f"\nСравнение с {baseline_path} (коммит {report['meta'].get('git_commit')}):")
+    old_args = report['meta'].get('args', {})
+    differ = [name for name in COMPARABLE_ARGS if old_args.get(name) != getattr(args, name)]
+    if differ:
+        print(f"  ⚠️ параметры прогонов различаются: {', '.join(differ)}")
+    for r in results:
+        old = baseline.get((r['benchmark'], r['companies'], r['products']))
+        if old is None:
+            continue
+        changes = [f"{metric} {(r[metric] / old[metric] - 1) * 100:+6.1f}%"
+                   for metric in ('p50_ms', 'p99_ms', 'peak_alloc_mb') if old[metric]]
+        print(f"  {r['benchmark']:24s} {r['companies']:>6d}:{r['products']:<8d} " + ", ".join(changes))
+
+
+def parse_size(text: str) -> Dict:
+    companies, products = text.split(':')
+    return {'companies': int(companies), 'products': int(products)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Бенчмарки на синтетическом каталоге")
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help="предприятий:товаров")
+    parser.add_argument('--iterations', type=int, default=200, help="повторов для поиска и списка предприятий")
+    parser.add_argument('--llm-iterations', type=int, default=30)
+    parser.add_argument('--file-iterations', type=int, default=5, help="повторов для разбора и загрузки файлов")
+    parser.add_argument('--parse-rows', type=int, default=20000)
+    parser.add_argument('--import-rows', type=int, default=2000)
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="задержка заглушки Groq, с")
+    parser.add_argument('--geocode-latency', type=float, default=0.02, help="задержка заглушки Nominatim, с")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="куда записать результаты JSON")
+    parser.add_argument('--compare', help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args(argv)
+
+    results = []
+    with ChatCompletionsStub(latency=args.llm_latency, jitter=args.llm_latency / 5, seed=args.seed) as llm_stub:
+        use_stub_llm(llm_stub.base_url)
+        for text in args.sizes:
+            results.extend(bench_size(parse_size(text), args))
+
+    print_results(results)
+    if args.compare:
+        compare(results, args.compare, args)
+    if args.output:
+        report = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'git_commit': git_commit(),
+                'python': sys.version.split()[0],
+                'platform': platform.platform(),
+                'args': vars(args)
+            },
+            'results': results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты записаны в {args.output}")
+
+
+if __name__ == "__main__":
+    main()
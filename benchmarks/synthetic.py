@@ -0,0 +1,101 @@
+"""Детерминированные синтетические данные для бенчмарков: предприятия в реальных городах, товары, прайсы .xlsx."""
+import math
+import random
+from typing import Dict, List, Tuple
+
+import openpyxl
+
+# Город -> координаты центра
+CITIES = {
+    "Москва": (55.7558, 37.6173),
+    "Санкт-Петербург": (59.9343, 30.3351),
+    "Новосибирск": (55.0084, 82.9357),
+    "Екатеринбург": (56.8389, 60.6057),
+    "Казань": (55.7961, 49.1064),
+    "Нижний Новгород": (56.2965, 43.9361),
+    "Челябинск": (55.1644, 61.4368),
+    "Самара": (53.1959, 50.1002),
+    "Омск": (54.9885, 73.3242),
+    "Ростов-на-Дону": (47.2357, 39.7015),
+    "Уфа": (54.7388, 55.9721),
+    "Красноярск": (56.0153, 92.8932),
+    "Воронеж": (51.6720, 39.1843),
+    "Пермь": (58.0105, 56.2502),
+    "Волгоград": (48.7080, 44.5133),
+    "Владивосток": (43.1155, 131.8855),
+}
+
+# Москва и Петербург чаще: так распределены магазины в реальной базе
+CITY_WEIGHTS = [8, 4] + [1] * (len(CITIES) - 2)
+
+WORDS = ["молоко", "хлеб", "сыр", "кефир", "масло", "сумка", "бутылка", "чехол", "ключи", "йогурт",
+         "творог", "сметана", "батон", "кофе", "чай", "сахар", "соль", "рис", "гречка", "макароны"]
+BRANDS = ["Домик", "Простоквашино", "Вкусно", "Эконом", "Северное", "Лето", "Мираторг", "Фермер"]
+STREETS = ["Ленина", "Мира", "Гагарина", "Советская", "Садовая", "Лесная", "Школьная", "Победы"]
+# Радиус разброса магазинов вокруг центра города, км
+CITY_RADIUS_KM = 15
+
+# Запросы с опечатками и без
+QUERIES = ["молоко", "солоко", "хлеб", "сыр", "кефир", "масло сливочное", "сумка", "бутылка воды",
+           "чехол", "ключи", "йогурт", "творог", "смитана", "кофе", "чай зеленый", "гречка"]
+
+
+def _scatter(rng: random.Random, center: Tuple[float, float]) -> Tuple[float, float]:
+    distance = CITY_RADIUS_KM * math.sqrt(rng.random())
+    angle = rng.uniform(0, 2 * math.pi)
+    lat = center[0] + distance * math.cos(angle) / 111.2
+    lon = center[1] + distance * math.sin(angle) / (111.2 * math.cos(math.radians(center[0])))
+    return round(lat, 6), round(lon, 6)
+
+
+def product_name(rng: random.Random) -> str:
+    return f"{rng.choice(WORDS).capitalize()} {rng.choice(BRANDS)} {rng.randint(1, 999)}"
+
+
+def generate_companies(count: int, seed: int = 1) -> List[Dict]:
+    rng = random.Random(seed)
+    cities = list(CITIES)
+    companies = []
+    for company_id in range(1, count + 1):
+        city = rng.choices(cities, weights=CITY_WEIGHTS)[0]
+        companies.append({
+            "id": company_id,
+            "name": f"Магазин {company_id}",
+            "address": f"{city}, ул. {rng.choice(STREETS)}, {rng.randint(1, 150)}",
+            "location": list(_scatter(rng, CITIES[city]))
+        })
+    return companies
+
+
+def generate_products(count: int, companies: List[Dict], seed: int = 2) -> List[Dict]:
+    rng = random.Random(seed)
+    company_ids = [c["id"] for c in companies]
+    return [{"id": product_id, "name": product_name(rng), "price": round(rng.uniform(10, 5000), 2),
+             "company_id": rng.choice(company_ids)}
+            for product_id in range(1, count + 1)]
+
+
+def generate_catalog(companies: int, products: int, seed: int = 1) -> Tuple[List[Dict], List[Dict]]:
+    company_list = generate_companies(companies, seed)
+    return company_list, generate_products(products, company_list, seed + 1)
+
+
+def address_book(companies: List[Dict]) -> Dict[str, Tuple[float, float]]:
+    """Адрес -> координаты для заглушки геокодера; центры городов тоже находятся"""
+    book = {city: point for city, point in CITIES.items()}
+    book.update({c["address"]: tuple(c["location"]) for c in companies})
+    return book
+
+
+def write_price_file(path: str, rows: int, seed: int = 3, bad_rows: float = 0.02):
+    """Прайс .xlsx с заголовком и долей некорректных строк; пишется в write-only режиме"""
+    rng = random.Random(seed)
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet()
+    ws.append(["Наименование", "Цена, руб."])
+    for _ in range(rows):
+        if rng.random() < bad_rows:
+            ws.append([product_name(rng), "по запросу"])
+        else:
+            ws.append([product_name(rng), round(rng.uniform(10, 5000), 2)])
+    wb.save(path)
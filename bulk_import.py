@@ -0,0 +1,28 @@
+import argparse
+
+from main import PriceManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Массовая загрузка прайсов предприятий")
+    parser.add_argument("source", help="папка с .xlsx (и необязательным manifest.csv/manifest.json) или путь к манифесту")
+    parser.add_argument("--workers", type=int, default=None, help="число процессов для разбора файлов")
+    args = parser.parse_args()
+
+    manager = PriceManager()
+    try:
+        report = manager.bulk_import(args.source, args.workers)
+    finally:
+        manager.close()
+    for item in report['files']:
+        status = {'ok': "✅", 'updated': "🔄"}.get(item['status'], "❌")
+        print(f"{status} {item['file']} ({item['company']}): товаров {item['products']}, "
+              f"отклонено строк {item['rejected']}, разбор {item['parse_seconds']:.2f} с, "
+              f"геокодирование {item['geocode_seconds']:.2f} с"
+              + (f" — {item['error']}" if item['error'] else ""))
+    print(f"Добавлено предприятий: {len(report['companies'])}, обновлено: {len(report['updated'])}, "
+          f"запись {report['commit_seconds']:.2f} с, всего {report['total_seconds']:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
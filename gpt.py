@@ -1,47 +1,671 @@
+import asyncio
 import json
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterator, Optional
 
+from utils.metrics import Metrics
 
-from conf import client
-import re
+MODEL = "llama-3.3-70b-versatile"
+# Бюджет входных токенов на один запрос (с запасом от окна контекста модели)
+MAX_PROMPT_TOKENS = 24000
+# Сколько шардов одновременно отправлять в API
+MAX_CONCURRENT_SHARDS = 4
+
+# Бюджет времени на ответ модели в одном поиске, с; после него — локальное ранжирование
+DEADLINE_S = 20.0
+# Повторы после таймаута, ошибки API или непригодного ответа; пауза растет вдвое, со случайным разбросом
+MAX_RETRIES = 2
+RETRY_DELAY_S = 0.5
+
+# Клиент Groq из conf.py; создается при первом запросе, чтобы не замедлять запуск приложения
+client = None
+_client_lock = threading.Lock()
+# Потоки для запросов с ограничением по времени: опоздавший запрос дорабатывает в фоне
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+class LLMUnavailable(Exception):
+    """Модель не дала пригодного ответа в пределах бюджета времени"""
+
+
+class MalformedResponse(ValueError):
+    """В ответе модели нет ожидаемого JSON"""
+
+
+class LLMPolicy:
+    """Бюджет времени одного поиска, повторы и дублирующий запрос (hedging).
+
+    hedge_after_s — если ответа нет столько секунд, отправляется второй такой же запрос
+    и берется первый пригодный ответ; None — без дублирования.
+    """
+
+    def __init__(self, deadline_s: float = DEADLINE_S, retries: int = MAX_RETRIES,
+                 retry_delay_s: float = RETRY_DELAY_S, hedge_after_s: Optional[float] = None):
+        self.deadline_s = deadline_s
+        self.retries = retries
+        self.retry_delay_s = retry_delay_s
+        self.hedge_after_s = hedge_after_s
+        self.deadline: Optional[float] = None
+
+    def started(self) -> 'LLMPolicy':
+        """Копия с отсчетом бюджета от текущего момента; уже запущенная политика возвращается как есть"""
+        if self.deadline is not None:
+            return self
+        policy = LLMPolicy(self.deadline_s, self.retries, self.retry_delay_s, self.hedge_after_s)
+        policy.deadline = time.monotonic() + self.deadline_s
+        return policy
+
+    def remaining(self) -> float:
+        return self.deadline - time.monotonic()
 
-def extract_json_from_response(response):
-    # Находит блок внутри ``````
-    match = re.search(r"``````", response, re.DOTALL)
+    def retry_delay(self, attempt: int) -> float:
+        return self.retry_delay_s * 2 ** attempt * random.uniform(0.5, 1.5)
+
+# Блок ```json ... ``` в ответе модели
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def extract_json_from_response(response, opening: str = '['):
+    """Текст первого корректного JSON-массива (opening='{' — объекта) в ответе, внутри ``` или без них, иначе ''"""
+    match = _FENCE_RE.search(response)
+    text = match.group(1) if match else response
+    decoder = json.JSONDecoder()
+    start = text.find(opening)
+    while start != -1:
+        try:
+            _, end = decoder.raw_decode(text, start)
+            return text[start:end]
+        except ValueError:
+            start = text.find(opening, start + 1)
     if match:
-        json_text = match.group(1)
-    else:
-        # Фолбэк — находит первый [ ... ]
-        match = re.search(r"(\[.*?\])", response, re.DOTALL)
-        json_text = match.group(1) if match else ''
-    return json_text
-
-
-def smart_product_search(product_list: list, search_query: str) -> list:
-    print("привет")
-    prompt = "Ты — помощник покупателя, который понимает опечатки и ищет максимально выгодные товары.\n"
-    prompt += f"Пользователь ищет: {search_query}\n"
-    prompt += "Вот список товаров:\n"
-
-    for idx, item in enumerate(product_list, 1):
-        prompt += (f"{idx}) Название: {item['product']['name']}\n"
-                   f"   Компания: {item['company']['name']}\n"
-                   f"   Цена: {item['product']['price']} руб.\n"
-                   f"   Расстояние: {item['distance']:.2f} км\n")
-
-    prompt += ("\n Отсортируй подходящие товары от самого выгодного и близкого до самого не выгодного. Учитывай опечатки, похожие слова (напр. солоко = молоко), также покажи подходящие по смыслу или из той же категории(например молочные продукты) с низким приоритетом.\n"
-               "Верни результат в формате JSON, как список объектов с полями name, company, price, distance.\n")
-
-    chat_completion = client.chat.completions.create(
+        # В блоке массива не оказалось — ищем во всем ответе
+        return extract_json_from_response(response[:match.start()] + response[match.end():], opening)
+    return ''
+
+
+def parse_ranking(response: str, size: int, strict: bool = False) -> Optional[list]:
+    """Короткие id товаров (1..size) из ответа модели, без повторов, в порядке ответа.
+
+    Понимает числа, строки с числами и объекты с полем id.
+    Если JSON-массива в ответе нет: strict — None, иначе пустой список.
+    """
+    json_text = extract_json_from_response(response)
+    if not json_text:
+        return None if strict else []
+    try:
+        items = json.loads(json_text)
+    except ValueError as e:
+        print("JSON parse error:", e)
+        Metrics.count('llm.parse_errors')
+        return None if strict else []
+
+    ranking, seen = [], set()
+    for item in items:
+        short_id = _short_id(item, size)
+        if short_id is not None and short_id not in seen:
+            seen.add(short_id)
+            ranking.append(short_id)
+    return ranking
+
+
+def _short_id(item, size: int):
+    """Короткий id из элемента ответа (число, строка или объект с полем id) или None"""
+    if isinstance(item, dict):
+        item = item.get('id')
+    try:
+        short_id = int(str(item).strip().lstrip('#'))
+    except ValueError:
+        return None
+    return short_id if 1 <= short_id <= size else None
+
+
+class JsonArrayStream:
+    """Разбирает JSON-массив по мере поступления текста: feed() возвращает завершенные элементы.
+
+    Текст до первой '[' (например, ```json) пропускается, вложенные объекты и строки учитываются.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._element_start: Optional[int] = None
+
+    def feed(self, text: str) -> list:
+        if self.done or not text:
+            return []
+        self._buffer += text
+        elements = []
+        buffer = self._buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0:
+                if ch == '[':
+                    self._depth = 1
+                    self._element_start = i + 1
+                continue
+            if ch == '"':
+                self._in_string = True
+            elif ch in '[{':
+                self._depth += 1
+            elif ch in ']}':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit(buffer[self._element_start:i], elements)
+                    self.done = True
+                    break
+            elif ch == ',' and self._depth == 1:
+                self._emit(buffer[self._element_start:i], elements)
+                self._element_start = i + 1
+        else:
+            # Разобранное начало буфера больше не нужно
+            if self._element_start is not None:
+                self._buffer = buffer[self._element_start:]
+                self._pos = len(self._buffer)
+                self._element_start = 0
+            else:
+                self._buffer, self._pos = '', 0
+        return elements
+
+    @staticmethod
+    def _emit(text: str, elements: list):
+        text = text.strip()
+        if not text:
+            return
+        try:
+            elements.append(json.loads(text))
+        except ValueError:
+            Metrics.count('llm.parse_errors')
+
+
+def estimate_tokens(text: str) -> int:
+    """Грубая оценка числа токенов: для русского текста около трех символов на токен"""
+    return len(text) // 3 + 1
+
+
+def _prompt_header(search_query: str) -> str:
+    return ("Ты — помощник покупателя, который понимает опечатки и ищет максимально выгодные товары.\n"
+            f"Пользователь ищет: {search_query}")
+
+
+PROMPT_FOOTER = ("Отсортируй подходящие товары от самого выгодного и близкого до самого не выгодного. Учитывай опечатки, похожие слова (напр. солоко = молоко), также покажи подходящие по смыслу или из той же категории(например молочные продукты) с низким приоритетом.\n"
+                 "Верни только JSON-массив id товаров, например [3, 1, 7].")
+STORES_HEADER = "Магазины (код|название|км):"
+PRODUCTS_HEADER = "Товары (id|название|цена|магазин):"
+
+
+def _store_line(code: str, item: dict) -> str:
+    return f"{code}|{item['company']['name']}|{item['distance']:.1f}"
+
+
+def _product_line(short_id: int, item: dict, code: str) -> str:
+    return f"{short_id}|{item['product']['name']}|{item['product']['price']:g}|{code}"
+
+
+def _table_lines(product_list: list) -> list:
+    """Компактная таблица: магазин описывается один раз, товар ссылается на него кодом.
+
+    id товара в промпте — его номер в product_list, начиная с 1.
+    """
+    store_codes, store_lines, product_lines = {}, [], []
+    for short_id, item in enumerate(product_list, 1):
+        company_id = item['company']['id']
+        code = store_codes.get(company_id)
+        if code is None:
+            code = store_codes[company_id] = f"m{len(store_codes) + 1}"
+            store_lines.append(_store_line(code, item))
+        product_lines.append(_product_line(short_id, item, code))
+    return [STORES_HEADER, *store_lines, PRODUCTS_HEADER, *product_lines]
+
+
+def build_prompt(product_list: list, search_query: str) -> str:
+    return "\n".join([_prompt_header(search_query), *_table_lines(product_list), "", PROMPT_FOOTER])
+
+
+def shard_products(product_list: list, search_query: str, max_prompt_tokens: int = MAX_PROMPT_TOKENS) -> list:
+    """Делит кандидатов на части, каждая из которых помещается в бюджет токенов одного запроса"""
+    overhead = estimate_tokens("\n".join([_prompt_header(search_query), STORES_HEADER,
+                                          PRODUCTS_HEADER, "", PROMPT_FOOTER]))
+    shards, current, used, stores = [], [], overhead, {}
+
+    def cost(item):
+        # Строка товара плюс строка магазина, если он в шарде еще не встречался
+        company_id = item['company']['id']
+        code = stores.get(company_id) or f"m{len(stores) + 1}"
+        tokens = estimate_tokens(_product_line(len(current) + 1, item, code))
+        if company_id not in stores:
+            tokens += estimate_tokens(_store_line(code, item))
+        return code, tokens
+
+    for item in product_list:
+        code, tokens = cost(item)
+        if current and used + tokens > max_prompt_tokens:
+            shards.append(current)
+            current, used, stores = [], overhead, {}
+            code, tokens = cost(item)
+        stores.setdefault(item['company']['id'], code)
+        current.append(item)
+        used += tokens
+    if current:
+        shards.append(current)
+    return shards
+
+
+def max_response_tokens(count: int) -> int:
+    """Ответ — список коротких id: несколько токенов на товар"""
+    return 16 + 4 * count
+
+
+def _record_usage(chat_completion):
+    """Токены из поля usage ответа API"""
+    usage = getattr(chat_completion, 'usage', None)
+    if usage is not None:
+        Metrics.count('llm.prompt_tokens', usage.prompt_tokens or 0)
+        Metrics.count('llm.completion_tokens', usage.completion_tokens or 0)
+
+
+def _ranking_validator(product_list: list) -> Callable[[str], Optional[list]]:
+    """Ответ -> id товаров из product_list или None, если ответ непригоден"""
+    def validate(response: str) -> Optional[list]:
+        ranking = parse_ranking(response, len(product_list), strict=True)
+        if ranking is None:
+            return None
+        return [product_list[short_id - 1]['product']['id'] for short_id in ranking]
+    return validate
+
+
+def merge_rankings(rankings: list) -> list:
+    """Объединяет ранжирования шардов (списки id): позиция нормируется на длину списка, дубли отбрасываются"""
+    positioned = []
+    for shard_index, ranking in enumerate(rankings):
+        for position, item in enumerate(ranking):
+            positioned.append(((position + 1) / len(ranking), shard_index, position, item))
+    positioned.sort(key=lambda entry: entry[:3])
+
+    merged, seen = [], set()
+    for _, _, _, item in positioned:
+        if item not in seen:
+            seen.add(item)
+            merged.append(item)
+    return merged
+
+
+def get_client():
+    global client
+    with _client_lock:
+        if client is None:
+            from conf import client as conf_client
+            client = conf_client
+        return client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _client_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='llm')
+        return _executor
+
+
+def _request(chat_client, prompt: str, max_tokens: int, validate: Callable[[str], Optional[list]]):
+    """Один запрос без повторов; непригодный ответ — исключение MalformedResponse"""
+    chat_completion = chat_client.chat.completions.create(
         messages=[{"role": "user", "content": prompt}],
-        model="llama-3.3-70b-versatile"
+        model=MODEL,
+        max_tokens=max_tokens
     )
-    response = chat_completion.choices[0].message.content
-    print("RAW LLM:", response)
+    Metrics.count('llm.requests')
+    _record_usage(chat_completion)
+    response = chat_completion.choices[0].message.content or ''
+    with Metrics.span('llm.parse', response_chars=len(response)):
+        value = validate(response)
+    if value is None:
+        Metrics.count('llm.malformed')
+        raise MalformedResponse(f"Непригодный ответ модели: {response[:200]!r}")
+    return value
 
-    json_text = extract_json_from_response(response)
+
+def _hedged_request(prompt: str, max_tokens: int, validate: Callable[[str], Optional[list]], policy: LLMPolicy):
+    """Запрос, ограниченный остатком бюджета; при долгом ответе — второй такой же, берется первый пригодный"""
+    timeout = policy.remaining()
+    # Собственные повторы SDK выключены: повторами управляет _complete
+    chat_client = get_client().with_options(timeout=timeout, max_retries=0)
+    executor = _get_executor()
+    first = executor.submit(_request, chat_client, prompt, max_tokens, validate)
+    pending = {first}
+    if policy.hedge_after_s is not None and policy.hedge_after_s < timeout:
+        wait(pending, timeout=policy.hedge_after_s)
+        if not first.done():
+            Metrics.count('llm.hedged')
+            pending.add(executor.submit(_request, chat_client, prompt, max_tokens, validate))
+
+    error = None
+    while pending:
+        remaining = policy.remaining()
+        if remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                if future is not first:
+                    Metrics.count('llm.hedge_wins')
+                return future.result()
+            error = future.exception()
+    if pending:
+        Metrics.count('llm.timeouts')
+        raise TimeoutError(f"Модель не ответила за {timeout:.1f} с")
+    raise error
+
+
+def _complete(prompt: str, max_tokens: int, validate: Callable[[str], Optional[list]], policy: LLMPolicy):
+    """Проверенный ответ модели с повторами в пределах бюджета, иначе LLMUnavailable"""
+    error: Optional[BaseException] = None
+    for attempt in range(policy.retries + 1):
+        if attempt:
+            delay = policy.retry_delay(attempt - 1)
+            if delay >= policy.remaining():
+                break
+            Metrics.count('llm.retries')
+            time.sleep(delay)
+        if policy.remaining() <= 0:
+            break
+        try:
+            return _hedged_request(prompt, max_tokens, validate, policy)
+        except Exception as e:
+            # Таймаут, ошибка API или сети, непригодный ответ — повторяем, пока позволяет бюджет
+            error = e
+    raise LLMUnavailable(str(error) if error else "Истек бюджет времени на ответ модели") from error
+
+
+async def _complete_all(requests: list, max_concurrency: int, policy: LLMPolicy) -> list:
+    """Проверенные ответы на [(промпт, max_tokens, validate), ...], не больше max_concurrency запросов одновременно.
+
+    У каждого запроса свои повторы; весь набор ограничен бюджетом policy, без дублирования запросов.
+    """
+    from groq import AsyncGroq
+
+    client = get_client()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(async_client, prompt, max_tokens, validate):
+        for attempt in range(policy.retries + 1):
+            if attempt:
+                Metrics.count('llm.retries')
+                await asyncio.sleep(policy.retry_delay(attempt - 1))
+            try:
+                async with semaphore:
+                    chat_completion = await async_client.chat.completions.create(
+                        messages=[{"role": "user", "content": prompt}],
+                        model=MODEL,
+                        max_tokens=max_tokens,
+                        timeout=max(policy.remaining(), 0.001)
+                    )
+            except Exception as e:
+                error = e
+                continue
+            Metrics.count('llm.requests')
+            _record_usage(chat_completion)
+            value = validate(chat_completion.choices[0].message.content or '')
+            if value is not None:
+                return value
+            Metrics.count('llm.malformed')
+            error = MalformedResponse("Непригодный ответ модели")
+        raise LLMUnavailable(str(error)) from error
+
+    # Асинхронный клиент привязан к циклу событий, поэтому создается на каждый вызов
+    async with AsyncGroq(api_key=client.api_key, base_url=client.base_url, max_retries=0) as async_client:
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(run(async_client, *request) for request in requests)),
+                timeout=max(policy.remaining(), 0))
+        except asyncio.TimeoutError:
+            Metrics.count('llm.timeouts')
+            raise LLMUnavailable("Истек бюджет времени на ответ модели")
+
+
+def smart_product_search_sharded(product_list: list, search_query: str,
+                                 max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+                                 max_concurrency: int = MAX_CONCURRENT_SHARDS,
+                                 policy: Optional[LLMPolicy] = None) -> list:
+    """Кандидаты делятся на шарды по бюджету токенов и ранжируются параллельными запросами"""
+    policy = (policy or LLMPolicy()).started()
+    shards = shard_products(product_list, search_query, max_prompt_tokens)
+    if len(shards) <= 1:
+        return smart_product_search(product_list, search_query, max_prompt_tokens, policy)
+    requests = [(build_prompt(shard, search_query), max_response_tokens(len(shard)), _ranking_validator(shard))
+                for shard in shards]
+    with Metrics.span('llm.shards', shards=len(shards), candidates=len(product_list)):
+        rankings = asyncio.run(_complete_all(requests, max_concurrency, policy))
+    return merge_rankings(rankings)
+
+
+def smart_product_search(product_list: list, search_query: str,
+                         max_prompt_tokens: int = MAX_PROMPT_TOKENS, policy: Optional[LLMPolicy] = None) -> list:
+    """Возвращает id товаров из product_list, лучшие первыми.
+
+    Если пригодного ответа нет в пределах бюджета policy — исключение LLMUnavailable.
+    """
+    policy = (policy or LLMPolicy()).started()
+    with Metrics.span('llm.prompt') as span:
+        prompt = build_prompt(product_list, search_query)
+        span.set('candidates', len(product_list))
+        span.set('prompt_chars', len(prompt))
+    Metrics.count('llm.prompt_chars', len(prompt))
+    # Не помещается в один запрос — переключаемся на параллельные шарды
+    if estimate_tokens(prompt) > max_prompt_tokens and len(product_list) > 1:
+        return smart_product_search_sharded(product_list, search_query, max_prompt_tokens, policy=policy)
+
+    with Metrics.span('llm.request', model=MODEL):
+        return _complete(prompt, max_response_tokens(len(product_list)), _ranking_validator(product_list), policy)
+
+
+def smart_product_search_stream(product_list: list, search_query: str,
+                                max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+                                policy: Optional[LLMPolicy] = None) -> Iterator[int]:
+    """Как smart_product_search, но id товаров выдаются по мере генерации ответа моделью.
+
+    Сбой до первого результата — повтор обычным запросом в пределах бюджета; после — LLMUnavailable.
+    """
+    policy = (policy or LLMPolicy()).started()
+    with Metrics.span('llm.prompt') as span:
+        prompt = build_prompt(product_list, search_query)
+        span.set('candidates', len(product_list))
+        span.set('prompt_chars', len(prompt))
+    Metrics.count('llm.prompt_chars', len(prompt))
+    # Шарды все равно сливаются только после ответа всех запросов — потоковой выдачи там нет
+    if estimate_tokens(prompt) > max_prompt_tokens and len(product_list) > 1:
+        yield from smart_product_search_sharded(product_list, search_query, max_prompt_tokens, policy=policy)
+        return
+
+    start = time.perf_counter()
+    parser = JsonArrayStream()
+    chunks, seen = [], set()
+    stream = None
     try:
-        top_products = json.loads(json_text)
+        with Metrics.span('llm.stream', model=MODEL) as span:
+            stream = get_client().with_options(timeout=policy.remaining(), max_retries=0).chat.completions.create(
+                messages=[{"role": "user", "content": prompt}],
+                model=MODEL,
+                max_tokens=max_response_tokens(len(product_list)),
+                stream=True
+            )
+            Metrics.count('llm.requests')
+            for chunk in stream:
+                if policy.remaining() <= 0:
+                    Metrics.count('llm.timeouts')
+                    raise TimeoutError("Истек бюджет времени на ответ модели")
+                # Groq присылает usage в последнем фрагменте, в поле x_groq
+                _record_usage(chunk if getattr(chunk, 'usage', None) is not None else getattr(chunk, 'x_groq', None))
+                if not chunk.choices:
+                    continue
+                text = chunk.choices[0].delta.content or ''
+                chunks.append(text)
+                for item in parser.feed(text):
+                    short_id = _short_id(item, len(product_list))
+                    if short_id is None or short_id in seen:
+                        continue
+                    if not seen:
+                        ms = (time.perf_counter() - start) * 1000
+                        span.set('first_result_ms', ms)
+                        Metrics.timing('llm.time_to_first_result', ms)
+                    seen.add(short_id)
+                    yield product_list[short_id - 1]['product']['id']
+            span.set('response_chars', sum(len(text) for text in chunks))
+            if seen and not parser.done:
+                Metrics.count('llm.malformed')
+                raise MalformedResponse("Ответ модели оборвался до конца JSON-массива")
     except Exception as e:
-        print("JSON parse error:", e)
-        top_products = []
-    return top_products
\ No newline at end of file
+        if seen:
+            raise LLMUnavailable(str(e)) from e
+        # Ничего еще не показано — можно повторить обычным запросом
+        Metrics.count('llm.retries')
+        yield from smart_product_search(product_list, search_query, max_prompt_tokens, policy)
+        return
+    finally:
+        close = getattr(stream, 'close', None)
+        if close is not None:
+            close()
+
+    # Модель ответила не массивом в начале текста — разбираем ответ целиком, как в обычном режиме
+    if not seen:
+        with Metrics.span('llm.parse'):
+            ranking = parse_ranking(''.join(chunks), len(product_list), strict=True)
+        if ranking is None:
+            Metrics.count('llm.malformed')
+            yield from smart_product_search(product_list, search_query, max_prompt_tokens, policy)
+            return
+        for short_id in ranking:
+            yield product_list[short_id - 1]['product']['id']
+
+
+BASKET_HEADER = ("Ты — помощник покупателя, который понимает опечатки и ищет максимально выгодные товары.\n"
+                 "Список покупок (номер|что нужно):")
+BASKET_FOOTER = ("Для каждого пункта списка отсортируй подходящие ему товары от самого выгодного и близкого до самого не выгодного. Учитывай опечатки и похожие слова (напр. солоко = молоко), товары, не подходящие пункту, не включай.\n"
+                 'Верни только JSON-объект: ключ — номер пункта, значение — массив id товаров, например {"1": [3, 1], "2": [7]}.')
+
+
+def _basket_products(product_lists: list) -> list:
+    """Общая таблица товаров для нескольких пунктов: товар, найденный для двух пунктов, описывается один раз"""
+    merged, seen = [], set()
+    for product_list in product_lists:
+        for item in product_list:
+            product_id = item['product']['id']
+            if product_id not in seen:
+                seen.add(product_id)
+                merged.append(item)
+    return merged
+
+
+def build_basket_prompt(queries: list, product_list: list) -> str:
+    query_lines = [f"{number}|{query}" for number, query in enumerate(queries, 1)]
+    return "\n".join([BASKET_HEADER, *query_lines, *_table_lines(product_list), "", BASKET_FOOTER])
+
+
+def parse_basket_ranking(response: str, count: int, size: int, strict: bool = False) -> Optional[list]:
+    """Для каждого из count пунктов — короткие id товаров (1..size) из JSON-объекта в ответе модели.
+
+    Если JSON-объекта в ответе нет: strict — None, иначе пустые списки.
+    """
+    rankings = [[] for _ in range(count)]
+    json_text = extract_json_from_response(response, '{')
+    if not json_text:
+        return None if strict else rankings
+    try:
+        data = json.loads(json_text)
+    except json.JSONDecodeError as e:
+        print(f"Ошибка парсинга JSON: {e}")
+        Metrics.count('llm.parse_errors')
+        return None if strict else rankings
+    for key, items in data.items():
+        try:
+            number = int(str(key).strip().lstrip('#qQ'))
+        except ValueError:
+            continue
+        if not 1 <= number <= count or not isinstance(items, list):
+            continue
+        ranking, seen = rankings[number - 1], set(rankings[number - 1])
+        for item in items:
+            short_id = _short_id(item, size)
+            if short_id is not None and short_id not in seen:
+                seen.add(short_id)
+                ranking.append(short_id)
+    return rankings
+
+
+def shard_basket(groups: list, max_prompt_tokens: int = MAX_PROMPT_TOKENS) -> list:
+    """Делит пункты списка [(запрос, кандидаты), ...] на группы индексов, каждая — один запрос в бюджете токенов"""
+    batches, current = [], []
+    for index in range(len(groups)):
+        candidate = current + [index]
+        prompt = build_basket_prompt([groups[i][0] for i in candidate],
+                                     _basket_products([groups[i][1] for i in candidate]))
+        if current and estimate_tokens(prompt) > max_prompt_tokens:
+            batches.append(current)
+            current = [index]
+        else:
+            current = candidate
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _basket_validator(count: int, product_list: list) -> Callable[[str], Optional[list]]:
+    """Ответ -> для каждого из count пунктов id товаров из product_list, или None, если ответ непригоден"""
+    def validate(response: str) -> Optional[list]:
+        rankings = parse_basket_ranking(response, count, len(product_list), strict=True)
+        if rankings is None:
+            return None
+        return [[product_list[short_id - 1]['product']['id'] for short_id in ranking] for ranking in rankings]
+    return validate
+
+
+def smart_basket_search(groups: list, max_prompt_tokens: int = MAX_PROMPT_TOKENS,
+                        max_concurrency: int = MAX_CONCURRENT_SHARDS, policy: Optional[LLMPolicy] = None) -> list:
+    """Ранжирование сразу для всего списка покупок.
+
+    groups — [(запрос, кандидаты), ...]; возвращает для каждого пункта список id товаров, лучшие первыми.
+    Весь список уходит одним запросом, а если не помещается в бюджет — несколькими параллельными.
+    """
+    policy = (policy or LLMPolicy()).started()
+    results = [[] for _ in groups]
+    requests, batches = [], []
+    for batch in shard_basket(groups, max_prompt_tokens):
+        product_list = _basket_products([groups[i][1] for i in batch])
+        prompt = build_basket_prompt([groups[i][0] for i in batch], product_list)
+        if len(batch) == 1 and estimate_tokens(prompt) > max_prompt_tokens:
+            # Один пункт с большим числом кандидатов — обычный поиск, он сам разобьет их на шарды
+            index = batch[0]
+            results[index] = smart_product_search(groups[index][1], groups[index][0], max_prompt_tokens, policy)
+            continue
+        batches.append(batch)
+        requests.append((prompt, max_response_tokens(len(product_list)) + 8 * len(batch),
+                         _basket_validator(len(batch), product_list)))
+    if not requests:
+        return results
+
+    Metrics.count('llm.prompt_chars', sum(len(request[0]) for request in requests))
+    with Metrics.span('llm.basket', requests=len(requests), items=len(groups)):
+        if len(requests) == 1:
+            responses = [_complete(*requests[0], policy)]
+        else:
+            responses = asyncio.run(_complete_all(requests, max_concurrency, policy))
+
+    for batch, rankings in zip(batches, responses):
+        for index, ranking in zip(batch, rankings):
+            results[index] = ranking
+    return results
@@ -1,6 +1,9 @@
+import queue
 import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 from main import PriceManager
+from services.ranking import sort_results
 from tkinter import ttk
 
 
@@ -16,6 +19,126 @@ COLORS = {
     'text': '#2C3E50'          # Текст
 }
 
+# Период опроса фоновых задач из главного потока Tk, мс
+POLL_INTERVAL_MS = 50
+# Сколько окно при выходе ждет записи снимка каталога
+SNAPSHOT_SAVE_TIMEOUT_S = 10
+
+# Режимы поиска: подпись в интерфейсе -> режим PriceManager
+SEARCH_MODES = {
+    "LLM": 'llm',
+    "Локально (без сети)": 'local',
+    "Локально + LLM": 'hybrid'
+}
+BASKET_MODES = {
+    "LLM": 'llm',
+    "Локально (без сети)": 'local'
+}
+
+# Строк, запрашиваемых у PriceManager за раз, и видимых строк таблицы по умолчанию
+PAGE_SIZE = 50
+VISIBLE_ROWS = 15
+# Строк прокрутки на один шаг колесика мыши
+WHEEL_ROWS = 3
+
+
+class VirtualTable:
+    """Таблица, в которой Treeview содержит только видимые строки.
+
+    Данные лежат списком кортежей, а при прокрутке те же строки виджета получают другие значения,
+    поэтому отрисовка не зависит от числа результатов. Когда до конца загруженного меньше
+    двух экранов, вызывается on_need_more — пора запросить следующую страницу.
+    """
+
+    def __init__(self, parent, columns, on_sort=None, on_need_more=None, numbered=False):
+        """columns — [(id, заголовок, ширина, порядок сортировки или None)]"""
+        self.numbered = numbered
+        if numbered:
+            columns = [("#", "№", 40, None)] + list(columns)
+        self.on_need_more = on_need_more
+        self.headings = {sort: (column, title) for column, title, _, sort in columns if sort}
+        self.rows = []
+        self.first = 0
+        self.items = []
+
+        self.frame = ttk.Frame(parent)
+        self.tree = ttk.Treeview(self.frame, columns=[c[0] for c in columns], show="headings",
+                                 height=VISIBLE_ROWS, selectmode="none")
+        for column, title, width, sort in columns:
+            command = (lambda s=sort: on_sort(s)) if sort and on_sort else ""
+            self.tree.heading(column, text=title, command=command)
+            self.tree.column(column, width=width, stretch=column != "#")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient="vertical", command=self._on_scrollbar)
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-WHEEL_ROWS if e.delta > 0 else WHEEL_ROWS))
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(WHEEL_ROWS))
+        self._set_visible(VISIBLE_ROWS)
+
+    def pack(self, **kwargs):
+        self.frame.pack(**kwargs)
+
+    def set_rows(self, rows, keep_position=False):
+        """Заменяет данные; без keep_position прокрутка возвращается в начало"""
+        self.rows = list(rows)
+        if not keep_position:
+            self.first = 0
+        self._render()
+
+    def append(self, rows):
+        """Дописывает порцию строк в конец; перерисовка одна на всю порцию"""
+        self.rows.extend(rows)
+        self._render()
+
+    def set_sort(self, sort):
+        """Отмечает в заголовке столбец, по которому отсортировано"""
+        for key, (column, title) in self.headings.items():
+            self.tree.heading(column, text=f"{title} ▲" if key == sort else title)
+
+    def scroll(self, rows):
+        self.first += rows
+        self._render()
+
+    def _set_visible(self, count):
+        while len(self.items) < count:
+            self.items.append(self.tree.insert("", "end"))
+        while len(self.items) > count:
+            self.tree.delete(self.items.pop())
+        self._render()
+
+    def _render(self):
+        visible = len(self.items)
+        self.first = max(0, min(self.first, len(self.rows) - visible))
+        for offset, item in enumerate(self.items):
+            index = self.first + offset
+            if index < len(self.rows):
+                values = ((index + 1,) + tuple(self.rows[index])) if self.numbered else self.rows[index]
+            else:
+                values = ()
+            self.tree.item(item, values=values)
+        total = max(len(self.rows), 1)
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + visible) / total))
+        if self.on_need_more and self.first + 2 * visible >= len(self.rows):
+            self.on_need_more()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.first = int(float(amount) * len(self.rows))
+            self._render()
+        elif action == "scroll":
+            self.scroll(int(amount) * (len(self.items) if unit == "pages" else 1))
+
+    def _on_resize(self, event):
+        # Столько строк виджета, сколько помещается по высоте (плюс строка заголовка)
+        row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        count = max(1, event.height // row_height - 1)
+        if count != len(self.items):
+            self._set_visible(count)
+
+
 class PriceManagerGUI:
     def __init__(self, root):
         self.root = root
@@ -23,8 +146,56 @@ class PriceManagerGUI:
         self.root.geometry("600x500")
 
         self.manager = PriceManager()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+        # Номер последнего поиска: результаты более старых поисков не отображаются
+        self.search_generation = 0
+        self.search_future = None
 
         self.create_main_menu()
+        # Каталог и точные координаты адреса по умолчанию подтягиваем в фоне, окно уже на экране
+        self.run_in_background(self.manager.catalog.refresh, self._on_catalog_loaded)
+        self.run_in_background(self.manager.resolve_default_location, self._on_default_location_resolved)
+
+    def _on_catalog_loaded(self, changed, error):
+        if error:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить каталог: {error}")
+
+    def _on_default_location_resolved(self, updated, error):
+        if updated and self.location_label.winfo_exists():
+            self.location_label.config(text=f"Ваше местоположение:\n{self.manager.get_user_location_info()}")
+
+    def run_in_background(self, func, on_done, *args):
+        """Выполняет func в пуле потоков, on_done(result, error) вызывается в главном потоке"""
+        future = self.executor.submit(func, *args)
+        self.root.after(POLL_INTERVAL_MS, self._poll_future, future, on_done)
+        return future
+
+    def _poll_future(self, future, on_done):
+        if not future.done():
+            self.root.after(POLL_INTERVAL_MS, self._poll_future, future, on_done)
+            return
+        if future.cancelled():
+            return
+        error = future.exception()
+        on_done(None if error else future.result(), error)
+
+    def quit(self):
+        """Выход: снимок каталога пишется в пуле, окно ждет его не дольше SNAPSHOT_SAVE_TIMEOUT_S"""
+        # Идущий поиск больше не нужен: по номеру поколения потоковый поиск остановится сам
+        self.search_generation += 1
+        if self.search_future is not None:
+            self.search_future.cancel()
+        # Следующий запуск поднимет товары из снимка, не читая хранилище построчно.
+        # Снимок ставится в пул до shutdown: после него новые задачи не принимаются
+        save = self.executor.submit(self.manager.catalog.save_snapshot)
+        self.executor.shutdown(wait=False)
+        try:
+            save.result(timeout=SNAPSHOT_SAVE_TIMEOUT_S)
+        except FutureTimeout:
+            print(f"⚠️ Снимок каталога не сохранен за {SNAPSHOT_SAVE_TIMEOUT_S} с")
+        except Exception as e:
+            print(f"❌ Не удалось сохранить снимок каталога: {e}")
+        self.root.quit()
 
     def create_main_menu(self):
         """Создает главное меню"""
@@ -56,14 +227,21 @@ class PriceManagerGUI:
         ttk.Button(buttons_frame, text="Поиск товара",
                    command=self.open_search_window, **button_style).pack(pady=5)
 
+        ttk.Button(buttons_frame, text="Список покупок",
+                   command=self.open_basket_window, **button_style).pack(pady=5)
+
         ttk.Button(buttons_frame, text="Задать мое местоположение",
                    command=self.open_location_window, **button_style).pack(pady=5)
 
         ttk.Button(buttons_frame, text="Показать все предприятия",
                    command=self.open_companies_window, **button_style).pack(pady=5)
 
+        if self.manager.stats is not None:
+            ttk.Button(buttons_frame, text="Статистика производительности",
+                       command=self.open_stats_window, **button_style).pack(pady=5)
+
         ttk.Button(buttons_frame, text="Выход",
-                   command=self.root.quit, **button_style).pack(pady=5)
+                   command=self.quit, **button_style).pack(pady=5)
 
     # В методе open_add_company_window добавляем поле для адреса:
     def open_add_company_window(self):
@@ -117,7 +295,7 @@ class PriceManagerGUI:
 
         # Файл прайса
         ttk.Label(input_frame,
-                  text="Файл прайса (DOCX):",
+                  text="Файл прайса:",
                   font=("Arial", 11),
                   foreground=COLORS['dark']).grid(row=2, column=0, sticky="w", pady=10)
 
@@ -136,35 +314,58 @@ class PriceManagerGUI:
 
         # Подсказка о формате файла
         help_label = ttk.Label(input_frame,
-                               text="Формат файла: каждая строка - 'Название товара, Цена'",
+                               text="Форматы: .xlsx, .csv, .docx — колонки или строки 'Название товара, Цена'",
                                font=("Arial", 9),
                                foreground=COLORS['secondary'],
                                background=COLORS['background'])
         help_label.grid(row=3, column=0, columnspan=3, sticky="w", pady=5)
 
+        # Статистика выбранного файла; этот же разбор используется при загрузке
+        self.file_stats_label = ttk.Label(input_frame, text="", font=("Arial", 9),
+                                          foreground=COLORS['dark'], background=COLORS['background'])
+        self.file_stats_label.grid(row=4, column=0, columnspan=3, sticky="w", pady=5)
+
         # Кнопки действий
         button_frame = ttk.Frame(main_frame, style='TFrame')
         button_frame.pack(pady=30)
 
-        ttk.Button(button_frame,
-                   text="✅ Загрузить",
-                   command=lambda: self.add_company(company_name_var.get(), address_var.get()),
-                   style='Primary.TButton').pack(side="left", padx=15)
+        self.upload_button = ttk.Button(button_frame,
+                                        text="✅ Загрузить",
+                                        command=lambda: self.add_company(company_name_var.get(), address_var.get()),
+                                        style='Primary.TButton')
+        self.upload_button.pack(side="left", padx=15)
 
         ttk.Button(button_frame,
                    text="↩️ Назад",
                    command=self.create_main_menu,
                    style='Secondary.TButton').pack(side="left", padx=15)
 
-    # Обновляем метод select_file для фильтрации DOCX
+        self.upload_progress = ttk.Progressbar(main_frame, mode="indeterminate", length=300)
+
     def select_file(self):
-        """Выбор DOCX файла"""
+        """Выбор файла прайса (.xlsx, .csv, .docx) и его предварительная проверка"""
         file_path = filedialog.askopenfilename(
             title="Выберите файл прайса",
-            filetypes=[("Excel documents", "*.xlxs"), ("All files", "*.*")]
+            filetypes=[("Прайсы", "*.xlsx *.csv *.docx"), ("Excel", "*.xlsx"), ("CSV", "*.csv"),
+                       ("Word", "*.docx"), ("All files", "*.*")]
         )
         if file_path:
             self.file_path_var.set(file_path)
+            self.file_stats_label.config(text="⏳ Проверка файла...")
+            self.run_in_background(self.manager.get_file_stats,
+                                   lambda stats, error: self._on_file_checked(file_path, stats, error), file_path)
+
+    def _on_file_checked(self, file_path, stats, error):
+        # Пока шла проверка, могли выбрать другой файл или закрыть окно
+        if self.file_path_var.get() != file_path or not self.file_stats_label.winfo_exists():
+            return
+        if error or not stats['valid_products']:
+            self.file_stats_label.config(text="❌ В файле не найдено товаров с ценами")
+            return
+        self.file_stats_label.config(
+            text=f"✅ Строк: {stats['total_lines']}, товаров: {stats['valid_products']}, "
+                 f"цены от {stats['min_price']:g} до {stats['max_price']:g} руб. "
+                 f"(в среднем {stats['avg_price']:.2f})")
 
     # Обновляем метод add_company
     def add_company(self, company_name, address):
@@ -181,9 +382,19 @@ class PriceManagerGUI:
         if not address:
             address = "Адрес не указан"
 
-        # Вызываем метод с тремя аргументами
-        result = self.manager.add_company_from_file(company_name, self.file_path_var.get(), address)
-        messagebox.showinfo("Результат", result)
+        # Разбор файла и геокодирование идут в фоне, окно остается отзывчивым
+        self.upload_button.config(state="disabled")
+        self.upload_progress.pack(pady=10)
+        self.upload_progress.start()
+        self.run_in_background(self.manager.add_company_from_file, self._on_company_added,
+                               company_name, self.file_path_var.get(), address)
+
+    def _on_company_added(self, result, error):
+        """Результат фоновой загрузки прайса"""
+        if error:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить прайс: {error}")
+        else:
+            messagebox.showinfo("Результат", result)
         self.create_main_menu()
 
     def open_search_window(self):
@@ -206,6 +417,12 @@ class PriceManagerGUI:
         self.distance_weight_var = tk.DoubleVar(value=10)
         distance_entry = ttk.Entry(search_frame, textvariable=self.distance_weight_var, width=10)
         distance_entry.grid(row=1, column=1, sticky="ew", pady=5, padx=5)
+
+        ttk.Label(search_frame, text="Режим поиска:").grid(row=2, column=0, sticky="w", pady=5, padx=5)
+        self.search_mode_var = tk.StringVar(value=next(iter(SEARCH_MODES)))
+        ttk.Combobox(search_frame, textvariable=self.search_mode_var, values=list(SEARCH_MODES),
+                     state="readonly", width=25).grid(row=2, column=1, sticky="w", pady=5, padx=5)
+
         button_frame = ttk.Frame(self.root)
         button_frame.pack(pady=10)
 
@@ -215,34 +432,257 @@ class PriceManagerGUI:
         ttk.Button(button_frame, text="Назад",
                    command=self.create_main_menu).pack(side="left", padx=10)
 
-        # Область для результатов
-        self.results_text = scrolledtext.ScrolledText(self.root, height=15, width=70)
-        self.results_text.pack(pady=10, padx=20, fill="both", expand=True)
-        self.results_text.config(state="disabled")
-
-    def search_product(self, search_term):
-        """Поиск товара"""
+        self.search_progress = ttk.Progressbar(self.root, mode="indeterminate", length=300)
+        # «Товары не найдены» и пометка о том, что вместо LLM сработал локальный поиск
+        self.results_status = ttk.Label(self.root, text="")
+        self.results_status.pack(padx=20, anchor="w")
+
+        # Следующая страница подгружается при прокрутке к концу, сортировка — щелчком по заголовку
+        self.next_cursor = None
+        self.last_search_mode = None
+        self.result_sort = 'score'
+        self.result_items = []
+        self.results_table = VirtualTable(self.root, [
+            ("name", "Товар", 200, None),
+            ("company", "Магазин", 150, None),
+            ("price", "Цена, руб.", 80, 'price'),
+            ("distance", "Расстояние, км", 100, 'distance'),
+            ("score", "Общий балл", 90, 'score')
+        ], on_sort=self.sort_search_results, on_need_more=self._load_more_results, numbered=True)
+        self.results_table.set_sort(self.result_sort)
+        self.results_table.pack(pady=10, padx=20, fill="both", expand=True)
+
+    def search_product(self, search_term, cursor=None):
+        """Поиск товара; с cursor — дозагрузка следующей страницы"""
         if not search_term:
             messagebox.showerror("Ошибка", "Введите название товара")
             return
+        self.last_search_term = search_term
+        # Дозагрузка продолжает выдачу в том же режиме, даже если переключатель уже изменили
+        if cursor is None:
+            self.last_search_mode = SEARCH_MODES[self.search_mode_var.get()]
+            self.next_cursor = None
+
+        # Новый поиск отменяет предыдущий: если тот уже выполняется, его результат будет проигнорирован
+        self.search_generation += 1
+        generation = self.search_generation
+        if self.search_future is not None:
+            self.search_future.cancel()
+
+        self.search_progress.pack(before=self.results_status, pady=5)
+        self.search_progress.start()
+        if self.last_search_mode == 'llm':
+            # Ответ модели показываем по мере генерации, не дожидаясь конца
+            self._clear_results()
+            results_queue = queue.Queue()
+            self.search_future = self.executor.submit(self._stream_search, search_term, generation, results_queue)
+            self.root.after(POLL_INTERVAL_MS, self._poll_stream, generation, results_queue, self.search_future)
+            return
+        self.search_future = self.run_in_background(
+            self._run_search,
+            lambda page, error: self._on_search_done(generation, page, error, cursor is not None),
+            search_term, self.last_search_mode, cursor, self.result_sort
+        )
 
-        results = self.manager.search_products(search_term)
-        self.results_text.config(state="normal")
-        self.results_text.delete(1.0, tk.END)
-
-        if not results:
-            self.results_text.insert(tk.END, "Товары не найдены.")
+    def sort_search_results(self, sort):
+        """Щелчок по заголовку: выдача LLM сортируется на месте, постраничная запрашивается заново"""
+        self.result_sort = sort
+        self.results_table.set_sort(sort)
+        if self.last_search_mode == 'llm':
+            self.result_items = sort_results(self.result_items, sort)
+            self.results_table.set_rows(map(self._result_row, self.result_items))
+        elif self.last_search_mode is not None:
+            # Порядок задает PriceManager: курсоры прежнего порядка не подходят, начинаем с первой страницы
+            self.search_product(self.last_search_term)
+
+    def _load_more_results(self):
+        """Таблица прокручена к концу загруженного: следующая страница, если она есть и еще не грузится"""
+        if self.next_cursor and self.search_future is None:
+            self.search_product(self.last_search_term, self.next_cursor)
+
+    def _stream_search(self, search_term, generation, results_queue):
+        """Выполняется в фоне: результаты LLM-поиска по одному складываются в очередь"""
+        for item in self.manager.search_stream(search_term):
+            # Начат другой поиск — прекращаем чтение ответа
+            if generation != self.search_generation:
+                break
+            results_queue.put(item)
+
+    def _poll_stream(self, generation, results_queue, future):
+        """Дописывает пришедшие результаты потокового поиска, пока он актуален"""
+        if generation != self.search_generation:
+            return
+        items = []
+        while True:
+            try:
+                items.append(results_queue.get_nowait())
+            except queue.Empty:
+                break
+        if items:
+            self._append_results(items)
+        if not future.done() or not results_queue.empty():
+            self.root.after(POLL_INTERVAL_MS, self._poll_stream, generation, results_queue, future)
+            return
+        self.search_future = None
+        self.search_progress.stop()
+        self.search_progress.pack_forget()
+        error = future.exception()
+        if error:
+            messagebox.showerror("Ошибка", f"Ошибка поиска: {error}")
+        elif not self.result_items:
+            self.results_status.config(text="Товары не найдены.")
+
+    def _run_search(self, search_term, mode, cursor, sort):
+        """Выполняется в фоне; возвращает (результаты, курсор следующей страницы)"""
+        page = self.manager.search_page(search_term, mode=mode, page_size=PAGE_SIZE, cursor=cursor, sort=sort)
+        return page['items'], page['next_cursor']
+
+    def _on_search_done(self, generation, page, error, append=False):
+        """Отрисовка результатов поиска, если он все еще актуален"""
+        if generation != self.search_generation:
+            return
+        self.search_future = None
+        self.search_progress.stop()
+        self.search_progress.pack_forget()
+        if error:
+            messagebox.showerror("Ошибка", f"Ошибка поиска: {error}")
+            return
+        results, next_cursor = page
+        if not append:
+            self._clear_results()
+        # Курсор — после очистки: иначе опустевшая таблица сразу запросила бы следующую страницу
+        self.next_cursor = next_cursor
+        self._append_results(results)
+        if not self.result_items:
+            self.results_status.config(text="Товары не найдены.")
+
+    def _clear_results(self):
+        self.result_items = []
+        self.results_table.set_rows([])
+        self.results_status.config(text="")
+
+    def _append_results(self, results):
+        """Дописывает порцию результатов; в таблице меняются только видимые строки"""
+        if any(item.get('ranked_by') == 'fallback' for item in results):
+            self.results_status.config(text="⚠️ LLM не ответила вовремя — результаты локального поиска")
+        if self.last_search_mode == 'llm':
+            # Выдача LLM ограничена числом кандидатов: держим ее отсортированной целиком,
+            # не сбрасывая прокрутку, пока приходят новые товары
+            self.result_items = sort_results(self.result_items + results, self.result_sort)
+            self.results_table.set_rows(map(self._result_row, self.result_items), keep_position=True)
         else:
+            self.result_items.extend(results)
+            self.results_table.append(map(self._result_row, results))
 
+    @staticmethod
+    def _result_row(item):
+        return (item['name'], item['company'], item['price'],
+                f"{item['distance']:.2f}", f"{item['total_score']:.2f}")
 
-            for i, item in enumerate(results, 1):
-                self.results_text.insert(tk.END, f"{i}. {item['name']} - {item['price']} руб.\n")
-                self.results_text.insert(tk.END, f"   Магазин: {item['company']}\n")
-                self.results_text.insert(tk.END, f"   Расстояние: {item['distance']:.2f} км\n")
-                self.results_text.insert(tk.END, f"   Общий балл: {item['total_score']:.2f}\n")
-                self.results_text.insert(tk.END, "-" * 50 + "\n\n")
+    def open_basket_window(self):
+        """Окно поиска по списку покупок с подбором корзины"""
+        # services.basket тянет numpy — загружаем при открытии окна, а не при запуске
+        from services.basket import MAX_BASKET_STORES
 
-        self.results_text.config(state="disabled")
+        self.clear_window()
+
+        ttk.Label(self.root, text="Список покупок",
+                  font=("Arial", 14, "bold")).pack(pady=10)
+
+        form = ttk.Frame(self.root)
+        form.pack(pady=5, padx=20, fill="x")
+
+        ttk.Label(form, text="Товары (по одному в строке):").grid(row=0, column=0, sticky="nw", pady=5, padx=5)
+        self.basket_items_text = tk.Text(form, height=6, width=40)
+        self.basket_items_text.grid(row=0, column=1, sticky="ew", pady=5, padx=5)
+
+        ttk.Label(form, text="Вес расстояния:").grid(row=1, column=0, sticky="w", pady=5, padx=5)
+        self.basket_weight_var = tk.DoubleVar(value=10)
+        ttk.Entry(form, textvariable=self.basket_weight_var, width=10).grid(row=1, column=1, sticky="w", pady=5, padx=5)
+
+        ttk.Label(form, text="Не больше магазинов:").grid(row=2, column=0, sticky="w", pady=5, padx=5)
+        self.basket_stores_var = tk.IntVar(value=2)
+        ttk.Spinbox(form, from_=1, to=MAX_BASKET_STORES, textvariable=self.basket_stores_var,
+                    width=5, state="readonly").grid(row=2, column=1, sticky="w", pady=5, padx=5)
+
+        ttk.Label(form, text="Режим поиска:").grid(row=3, column=0, sticky="w", pady=5, padx=5)
+        self.basket_mode_var = tk.StringVar(value=next(iter(BASKET_MODES)))
+        ttk.Combobox(form, textvariable=self.basket_mode_var, values=list(BASKET_MODES),
+                     state="readonly", width=25).grid(row=3, column=1, sticky="w", pady=5, padx=5)
+
+        button_frame = ttk.Frame(self.root)
+        button_frame.pack(pady=5)
+        self.basket_button = ttk.Button(button_frame, text="Подобрать корзину", command=self.search_basket)
+        self.basket_button.pack(side="left", padx=10)
+        ttk.Button(button_frame, text="Назад",
+                   command=self.create_main_menu).pack(side="left", padx=10)
+
+        self.basket_progress = ttk.Progressbar(self.root, mode="indeterminate", length=300)
+
+        self.basket_text = scrolledtext.ScrolledText(self.root, height=15, width=70)
+        self.basket_text.pack(pady=10, padx=20, fill="both", expand=True)
+        self.basket_text.config(state="disabled")
+
+    def search_basket(self):
+        items = [line.strip() for line in self.basket_items_text.get(1.0, tk.END).splitlines() if line.strip()]
+        if not items:
+            messagebox.showerror("Ошибка", "Введите хотя бы один товар")
+            return
+        try:
+            distance_weight = self.basket_weight_var.get()
+            max_stores = self.basket_stores_var.get()
+            mode = BASKET_MODES[self.basket_mode_var.get()]
+        except tk.TclError:
+            messagebox.showerror("Ошибка", "Вес расстояния и число магазинов должны быть числами")
+            return
+
+        self.search_generation += 1
+        generation = self.search_generation
+        self.basket_button.config(state="disabled")
+        self.basket_progress.pack(before=self.basket_text, pady=5)
+        self.basket_progress.start()
+        self.run_in_background(
+            lambda: self.manager.search_basket(items, distance_weight, max_stores=max_stores,
+                                               mode=mode),
+            lambda result, error: self._on_basket_done(generation, result, error)
+        )
+
+    def _on_basket_done(self, generation, result, error):
+        # Окно закрыто или начат другой поиск
+        if generation != self.search_generation:
+            return
+        self.basket_button.config(state="normal")
+        self.basket_progress.stop()
+        self.basket_progress.pack_forget()
+        if error:
+            messagebox.showerror("Ошибка", f"Ошибка поиска: {error}")
+            return
+
+        lines = []
+        best = result['best']
+        if not best['stores']:
+            lines.append("Товары не найдены.")
+        else:
+            lines.append(f"Лучшая корзина: {best['store_count']} магазин(а), итого {best['total_score']:.2f} "
+                         f"(товары {best['items_price']:.2f} руб. + дорога {best['distance_cost']:.2f})")
+            for store in best['stores']:
+                lines.append(f"\n🏪 {store['company']} — {store['distance']:.2f} км")
+                for item in store['items']:
+                    lines.append(f"   {item['query']}: {item['name']} - {item['price']} руб.")
+            if best['missing']:
+                lines.append(f"\n⚠️ Не найдено: {', '.join(best['missing'])}")
+
+            lines.append("\n" + "-" * 50)
+            lines.append("Сравнение по числу магазинов:")
+            for basket in result['baskets']:
+                lines.append(f"   до {basket['max_stores']}: итого {basket['total_score']:.2f} "
+                             f"(товары {basket['items_price']:.2f} + дорога {basket['distance_cost']:.2f}), "
+                             f"не найдено {len(basket['missing'])}")
+
+        self.basket_text.config(state="normal")
+        self.basket_text.delete(1.0, tk.END)
+        self.basket_text.insert(tk.END, "\n".join(lines))
+        self.basket_text.config(state="disabled")
 
     def open_location_window(self):
         """Окно установки местоположения"""
@@ -291,40 +731,90 @@ class PriceManagerGUI:
         ttk.Label(self.root, text="Все предприятия",
                   font=("Arial", 14, "bold")).pack(pady=20)
 
-        companies = self.manager.get_all_companies()
+        # Предприятия запрашиваются у PriceManager страницами по мере прокрутки
+        self.company_sort = 'distance'
+        self.companies_cursor = None
+        self.companies_future = None
+        self.companies_table = VirtualTable(self.root, [
+            ("name", "Название", 150, 'name'),
+            ("address", "Адрес", 200, None),
+            ("distance", "Расстояние (км)", 100, 'distance')
+        ], on_sort=self.sort_companies, on_need_more=self._load_more_companies)
+        self.companies_table.set_sort(self.company_sort)
+        self.companies_table.pack(pady=10, padx=20, fill="both", expand=True)
+        self.load_companies()
+
+        # Кнопка назад
+        ttk.Button(self.root, text="Назад",
+                   command=self.create_main_menu).pack(pady=10)
+
+    def load_companies(self, cursor=None):
+        """Страница предприятий в текущем порядке; без cursor — список заново с начала"""
+        # Общий номер с поиском: закрытие окна или смена порядка отменяют ожидаемую страницу
+        self.search_generation += 1
+        generation = self.search_generation
+        self.companies_future = self.run_in_background(
+            self.manager.get_companies_page,
+            lambda page, error: self._on_companies_loaded(generation, page, error, cursor is not None),
+            self.company_sort, PAGE_SIZE, cursor
+        )
 
-        # Создаем Treeview для таблицы
-        tree_frame = ttk.Frame(self.root)
-        tree_frame.pack(pady=10, padx=20, fill="both", expand=True)
+    def sort_companies(self, sort):
+        self.company_sort = sort
+        self.companies_table.set_sort(sort)
+        self.load_companies()
 
-        columns = ("name", "address", "distance")
-        tree = ttk.Treeview(tree_frame, columns=columns, show="headings", height=10)
+    def _load_more_companies(self):
+        if self.companies_cursor and self.companies_future is None:
+            self.load_companies(self.companies_cursor)
 
-        tree.heading("name", text="Название")
-        tree.heading("address", text="Адрес")
-        tree.heading("distance", text="Расстояние (км)")
+    def _on_companies_loaded(self, generation, page, error, append):
+        if generation != self.search_generation:
+            return
+        self.companies_future = None
+        if error:
+            messagebox.showerror("Ошибка", f"Не удалось загрузить предприятия: {error}")
+            return
+        self.companies_cursor = page['next_cursor']
+        rows = [(c['name'], c['address'],
+                 f"{c['distance']:.2f}" if isinstance(c['distance'], float) else c['distance'])
+                for c in page['items']]
+        if append:
+            self.companies_table.append(rows)
+        else:
+            self.companies_table.set_rows(rows)
 
-        tree.column("name", width=150)
-        tree.column("address", width=200)
-        tree.column("distance", width=100)
+    def open_stats_window(self):
+        """Окно со временем этапов поиска и загрузки и счетчиками"""
+        self.clear_window()
 
-        for company in companies:
-            distance = company['distance'] if isinstance(company['distance'], float) else company['distance']
-            tree.insert("", "end", values=(company['name'], company['address'], distance))
+        ttk.Label(self.root, text="Статистика производительности",
+                  font=("Arial", 14, "bold")).pack(pady=20)
 
-        # Добавляем scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=tree.yview)
-        tree.configure(yscrollcommand=scrollbar.set)
+        stats_text = scrolledtext.ScrolledText(self.root, height=20, width=90, font=("Courier", 10))
+        stats_text.pack(pady=10, padx=20, fill="both", expand=True)
 
-        tree.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        def refresh():
+            stats_text.delete(1.0, tk.END)
+            stats_text.insert(tk.END, self.manager.stats.summary())
 
-        # Кнопка назад
-        ttk.Button(self.root, text="Назад",
-                   command=self.create_main_menu).pack(pady=10)
+        def reset():
+            self.manager.stats.reset()
+            refresh()
+
+        refresh()
+
+        button_frame = ttk.Frame(self.root)
+        button_frame.pack(pady=10)
+        ttk.Button(button_frame, text="Обновить", command=refresh).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Сбросить", command=reset).pack(side="left", padx=5)
+        ttk.Button(button_frame, text="Назад",
+                   command=self.create_main_menu).pack(side="left", padx=5)
 
     def clear_window(self):
         """Очищает окно от всех виджетов"""
+        # Результаты незавершенного поиска больше некуда выводить
+        self.search_generation += 1
         for widget in self.root.winfo_children():
             widget.destroy()
 
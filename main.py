@@ -1,151 +1,580 @@
+import heapq
+import itertools
 import os
-from document import Document
-from geopy import location
 import json
+import threading
+import time
 
-from conf import client
-from gpt import smart_product_search
 from models.company import Company
 from models.product import Product
 from models.user import User
+from services.catalog import Catalog
 from services.geocoding import GeocodingService
-from services.file_parser import FileParser
-from utils.data_storage import DataStorage
-from typing import List, Dict
+from services.llm_cache import LLMCache
+from services.file_parser import FileParser, ParsedFile, ParseStats
+from services.price_diff import diff_price_list
+from services.ranking import (COMPANY_SORTS, MIN_MATCH_SCORE, check_sort, fallback_rank, rank_page, sort_results,
+                              to_result)
+from utils.data_storage import StorageBackend, create_storage
+from utils.metrics import Metrics, StatsSink
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+
+# Сколько товаров-кандидатов из локального индекса отправлять в LLM
+DEFAULT_TOP_K = 50
+# Сколько кандидатов ранжировать локально и размер страницы выдачи
+LOCAL_TOP_K = 1000
+DEFAULT_PAGE_SIZE = 20
+# До скольких записей разбор прайса для предпросмотра хранится и переиспользуется при загрузке;
+# большие прайсы загружаются потоково, не занимая память на время открытого окна
+REUSE_PARSE_MAX_RECORDS = 10000
+# Сколько лучших вариантов показывать по каждому пункту списка покупок
+BASKET_OPTIONS = 5
+
+DEFAULT_ADDRESS = "Москва, Красная площадь, 1"
+DEFAULT_LOCATION = (55.7558, 37.6173)
+
+# 'sqlite' — основной режим, 'json' — два JSON-файла для небольших установок
+STORAGE_BACKEND = 'sqlite'
+
 
 class PriceManager:
-    def __init__(self):
+    def __init__(self, storage: Optional[StorageBackend] = None, collect_stats: bool = True):
+        # Статистика этапов для окна в интерфейсе; без получателей метрики почти ничего не стоят
+        self.stats = Metrics.add_sink(StatsSink()) if collect_stats else None
+        Metrics.log_from_env()
         self.companies_file = 'companies.json'
         self.products_file = 'products.json'
-        self.user = User("Москва, Красная площадь, 1", GeocodingService.geocode_address("Москва, Красная площадь, 1") or (55.7558, 37.6173))
+        self.storage = storage or create_storage(STORAGE_BACKEND, self.companies_file, self.products_file)
+        # Каталог читается при первом обращении; GUI и API загружают его заранее в фоне
+        self.catalog = Catalog(self.storage, 'catalog.snapshot')
+        self.llm_cache = LLMCache('llm_cache.sqlite3')
+        # Бюджет времени, повторы и дублирующий запрос к LLM в одном поиске (gpt.LLMPolicy); None — по умолчанию
+        self.llm_policy = None
+        # Последний прайс, разобранный для проверки или статистики: его загрузка не перечитывает файл
+        self._parsed_file: Optional[ParsedFile] = None
+        self._parsed_lock = threading.Lock()
+        # Без обращения к сети: координаты из кэша, иначе приблизительные до resolve_default_location
+        self.user = self.new_user()
+
+    def close(self):
+        """Отключает статистику этого менеджера от общих метрик и закрывает хранилище"""
+        if self.stats is not None:
+            Metrics.remove_sink(self.stats)
+        self.storage.close()
 
-    def add_company_from_file(self, company_name: str, file_path: str, address: str = None) -> str:
-        companies = DataStorage.load_data(self.companies_file)
-        products = DataStorage.load_data(self.products_file)
+    def __del__(self):
+        # Получатели метрик общие для процесса: незакрытый менеджер не должен собирать их вечно
+        stats = getattr(self, 'stats', None)
+        if stats is not None:
+            Metrics.remove_sink(stats)
+
+    def find_company(self, company_name: str, address: str = None) -> Optional[Dict]:
+        self.catalog.refresh()
+        return next((c for c in self.catalog.companies
+                     if c['name'] == company_name and c.get('address') == (address or "Адрес не указан")), None)
+
+    def add_company_from_file(self, company_name: str, file_path: str, address: str = None,
+                              reimport: bool = True) -> str:
+        # Повторная загрузка прайса того же предприятия обновляет его товары, а не создает дубль
+        existing = self.find_company(company_name, address) if reimport else None
+        if existing:
+            return self.reimport_company_file(existing['id'], file_path)
 
         if address:
-            location = GeocodingService.geocode_address(address)
+            with Metrics.span('import.geocode'):
+                location = GeocodingService.geocode_address(address)
             if not location:
                 return f"❌ Не удалось определить координаты для адреса: {address}"
         else:
             address = "Адрес не указан"
-            location = [55.7558, 37.6173]
+            location = list(DEFAULT_LOCATION)
 
-        new_company = Company(len(companies) + 1, company_name, address, list(location))
-        companies.append(new_company.to_dict())
-
-        # Теперь вызываем новый парсер
+        # Потоковый разбор: строки файла не накапливаются, хранилище пишет их пачками
         try:
-            parsed_products = FileParser.parse_excel_file(file_path)
+            stats, records = self._open_price_file(file_path)
+            first = next(records, None)
         except Exception as e:
             return f"❌ Ошибка обработки файла: {str(e)}"
 
-        if not parsed_products:
+        if first is None:
             return "❌ В файле не найдено товаров с ценами"
 
-        added_count = 0
-        for product_data in parsed_products:
-            new_product = Product(len(products) + 1, product_data["name"], product_data["price"], new_company.id)
-            products.append(new_product.to_dict())
-            added_count += 1
+        new_company = Company(self.catalog.allocate_company_ids(), company_name, address, list(location))
+
+        def new_products():
+            # id товаров присваивает хранилище
+            for product_data in itertools.chain([first], records):
+                yield Product(None, product_data["name"], product_data["price"], new_company.id).to_dict()
 
-        DataStorage.save_data(self.companies_file, companies)
-        DataStorage.save_data(self.products_file, products)
+        try:
+            # Разбор и запись идут одним потоком, поэтому измеряются вместе
+            with Metrics.span('import.parse_and_store', file=os.path.basename(file_path)):
+                added_count = self.catalog.add_company(new_company.to_dict(), new_products())
+        except Exception as e:
+            return f"❌ Ошибка обработки файла: {str(e)}"
+        Metrics.count('import.rows', stats.total_rows)
+        Metrics.count('import.products', added_count)
+        Metrics.count('import.rejected', stats.rejected)
+        self.llm_cache.invalidate_companies([new_company.id])
 
         return (f"✅ Предприятие '{company_name}' добавлено успешно!\n"
                 f"📁 Файл: {os.path.basename(file_path)}\n"
-                f"📊 Обработано товаров: {len(parsed_products)}\n"
+                f"📊 Обработано строк: {stats.total_rows}\n"
                 f"✅ Добавлено товаров: {added_count}\n"
+                f"⚠️ Отклонено строк: {stats.rejected}\n"
                 f"📍 Адрес: {address}")
 
+    def reimport_company_file(self, company_id: int, file_path: str,
+                              parsed: Optional[Tuple[ParseStats, Iterable[Dict]]] = None) -> str:
+        """Обновляет товары существующего предприятия по новому прайсу: пишутся только изменения.
+
+        parsed — уже разобранный файл (статистика и записи), например из массовой загрузки.
+        """
+        self.catalog.refresh()
+        company = self.catalog.get_company(company_id)
+        if not company:
+            return f"❌ Предприятие с id {company_id} не найдено"
+
+        try:
+            stats, records = parsed or self._open_price_file(file_path)
+            diff = diff_price_list(self.catalog.company_products(company_id), records)
+        except Exception as e:
+            return f"❌ Ошибка обработки файла: {str(e)}"
+        if not stats.valid:
+            return "❌ В файле не найдено товаров с ценами"
+
+        if not diff.is_empty():
+            inserts = [Product(None, r["name"], r["price"], company_id).to_dict() for r in diff.inserts]
+            try:
+                self.catalog.update_products(inserts, diff.price_updates, diff.deletes)
+            except Exception as e:
+                return f"❌ Ошибка сохранения: {str(e)}"
+            # Кэш LLM сбрасываем только для этого предприятия
+            self.llm_cache.invalidate_companies([company_id])
+
+        return (f"🔄 Прайс предприятия '{company['name']}' обновлен\n"
+                f"📁 Файл: {os.path.basename(file_path)}\n"
+                f"📊 Обработано строк: {stats.total_rows}\n"
+                f"➕ Новых товаров: {len(diff.inserts)}\n"
+                f"💲 Изменено цен: {len(diff.price_updates)}\n"
+                f"➖ Удалено товаров: {len(diff.deletes)}\n"
+                f"✔️ Без изменений: {diff.unchanged}\n"
+                f"⚠️ Отклонено строк: {stats.rejected}")
+
+    def parse_price_file(self, file_path: str) -> ParsedFile:
+        """Разбор прайса за один проход; результат запоминается до загрузки этого же файла.
+
+        Записи запоминаются только у прайсов до REUSE_PARSE_MAX_RECORDS строк, у больших — лишь статистика.
+        """
+        with self._parsed_lock:
+            parsed = self._parsed_file
+        if parsed is not None and parsed.matches(file_path):
+            return parsed
+        parsed = FileParser.parse_file(file_path, REUSE_PARSE_MAX_RECORDS)
+        with self._parsed_lock:
+            self._parsed_file = parsed
+        return parsed
+
+    def _open_price_file(self, file_path: str) -> Tuple[ParseStats, Iterator[Dict]]:
+        """Записи для загрузки: из уже выполненного разбора или потоково из файла"""
+        with self._parsed_lock:
+            parsed = self._parsed_file
+            if parsed is not None and parsed.matches(file_path):
+                # Файл загружается один раз — разбор в памяти больше не нужен
+                self._parsed_file = None
+                if parsed.records is not None:
+                    Metrics.count('import.reused_parse')
+                    return parsed.stats, iter(parsed.records)
+        stats = ParseStats()
+        return stats, FileParser.iter_file(file_path, stats)
+
+    def bulk_import(self, source: str, max_workers: Optional[int] = None) -> Dict:
+        """Массовая загрузка прайсов из папки или манифеста (company,address,file)"""
+        from services.bulk_import import collect_entries, run_bulk_import
+
+        self.catalog.refresh()
+        report = run_bulk_import(self, collect_entries(source), DEFAULT_LOCATION, max_workers)
+        self.llm_cache.invalidate_companies(report['companies'])
+        if report['companies'] or report['updated']:
+            self.catalog.save_snapshot()
+        return report
+
     import json
 
-    def search_products(self, search_term: str, distance_weight: float = 10) -> list:
-        companies = DataStorage.load_data(self.companies_file)
-        products = DataStorage.load_data(self.products_file)
-        found_products = []
+    def search_products(self, search_term: str, distance_weight: float = 10,
+                        distance_mode: str = 'ellipsoidal', top_k: int = DEFAULT_TOP_K,
+                        max_distance_km: Optional[float] = None, nearest_k: Optional[int] = None,
+                        mode: str = 'llm', user: Optional[User] = None) -> list:
+        """Поиск товара; mode: 'llm' — ранжирование моделью, 'local' — без сети, 'hybrid' — LLM по первой странице.
+
+        user — чье местоположение учитывать (по умолчанию пользователь приложения).
+        """
+        if mode != 'llm':
+            return self.search_page(search_term, distance_weight, distance_mode, mode=mode,
+                                    max_distance_km=max_distance_km, nearest_k=nearest_k, user=user)['items']
+        with Metrics.span('search', mode=mode):
+            found_products = self._collect_candidates(search_term, distance_weight, distance_mode, top_k,
+                                                      max_distance_km, nearest_k, user=user)
+            if not found_products:
+                return []
+            return self._llm_rank(found_products, search_term)
+
+    def search_stream(self, search_term: str, distance_weight: float = 10,
+                      distance_mode: str = 'ellipsoidal', top_k: int = DEFAULT_TOP_K,
+                      max_distance_km: Optional[float] = None, nearest_k: Optional[int] = None,
+                      user: Optional[User] = None) -> Iterator[Dict]:
+        """Поиск через LLM с выдачей результатов по одному, в порядке ответа модели.
+
+        Первые товары доступны, пока модель еще генерирует остальные; готовый ответ берется из кэша.
+        Если модель не ответила в пределах бюджета, остальные результаты дает локальное ранжирование.
+        """
+        from gpt import LLMUnavailable, smart_product_search_stream
+
+        start = time.perf_counter()
+        with Metrics.span('search', mode='stream'):
+            found_products = self._collect_candidates(search_term, distance_weight, distance_mode, top_k,
+                                                      max_distance_km, nearest_k, user=user)
+        if not found_products:
+            return
+        by_id = {fp['product']['id']: fp for fp in found_products}
+        cache_key = LLMCache.make_key(search_term, found_products)
+        cached = self.llm_cache.get(cache_key)
+        if cached is not None:
+            product_ids, ranked_by = cached, 'llm_cache'
+        else:
+            product_ids = smart_product_search_stream(found_products, search_term, policy=self.llm_policy)
+            ranked_by = 'llm'
+
+        llm_results, shown = [], set()
+        with Metrics.span('search.llm', candidates=len(found_products), cached=cached is not None):
+            try:
+                for product_id in product_ids:
+                    llm_results.append(product_id)
+                    if product_id not in by_id or product_id in shown:
+                        continue
+                    if not shown:
+                        Metrics.timing('search.time_to_first_result', (time.perf_counter() - start) * 1000)
+                    shown.add(product_id)
+                    yield to_result(by_id[product_id], ranked_by)
+            except LLMUnavailable as e:
+                print(f"LLM недоступна, локальный поиск: {e}")
+                Metrics.count('search.llm_fallbacks')
+                for fp in fallback_rank(found_products, search_term):
+                    if fp['product']['id'] not in shown:
+                        yield to_result(fp, 'fallback')
+                return
+        # Кэшируется только полностью полученный ответ: при досрочной остановке сюда не доходим
+        if cached is None and llm_results:
+            self.llm_cache.put(cache_key, {fp['company']['id'] for fp in found_products}, llm_results)
+
+    def search_page(self, search_term: str, distance_weight: float = 10, distance_mode: str = 'ellipsoidal',
+                    mode: str = 'local', page_size: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                    max_distance_km: Optional[float] = None, nearest_k: Optional[int] = None,
+                    user: Optional[User] = None, sort: str = 'score') -> Dict:
+        """Постраничная локальная выдача: {'items', 'next_cursor', 'mode'}.
 
-        for product in products:
-            company = next((c for c in companies if c['id'] == product['company_id']), None)
-            if company and 'location' in company:
-                company_coords = tuple(company['location'])
-                distance = GeocodingService.calculate_distance(self.user.location, company_coords)
+        Кандидаты ранжируются по price + distance * distance_weight без обращения к сети
+        (sort='price' или 'distance' — по цене или расстоянию);
+        в режиме 'hybrid' LLM дополнительно отсеивает неподходящее на текущей странице
+        и при sort='score' задает порядок страницы.
+        """
+        if mode not in ('local', 'hybrid'):
+            raise ValueError(f"Неизвестный режим постраничного поиска: {mode}")
+        check_sort(sort)
+        with Metrics.span('search', mode=mode):
+            found_products = self._collect_candidates(search_term, distance_weight, distance_mode, LOCAL_TOP_K,
+                                                      max_distance_km, nearest_k, with_match=True, user=user,
+                                                      sort=sort)
+            with Metrics.span('search.rank'):
+                page, next_cursor = rank_page(found_products, page_size, cursor, sort)
+            if mode == 'hybrid' and page:
+                # При sort='score' остается порядок LLM, иначе страница идет по выбранному столбцу
+                items = self._llm_rank(page, search_term, by_total_score=False)
+                if sort != 'score':
+                    items = sort_results(items, sort)
+            else:
+                items = [to_result(fp) for fp in page]
+        return {'items': items, 'next_cursor': next_cursor, 'mode': mode}
+
+    def search_basket(self, items: List[str], distance_weight: float = 10, distance_mode: str = 'ellipsoidal',
+                      max_stores: int = 2, mode: str = 'llm', top_k: int = DEFAULT_TOP_K,
+                      max_distance_km: Optional[float] = None, nearest_k: Optional[int] = None,
+                      user: Optional[User] = None) -> Dict:
+        """Поиск по списку покупок и самая выгодная корзина не более чем из max_stores магазинов.
+
+        Каталог и расстояния считаются один раз на весь список, ранжирование LLM — один запрос
+        (или несколько параллельных, если список не помещается). mode: 'llm' или 'local' (без сети).
+        Возвращает {'items': [{'query', 'options'}], 'baskets', 'best', 'mode'}.
+        """
+        if mode not in ('llm', 'local'):
+            raise ValueError(f"Неизвестный режим поиска по списку: {mode}")
+        # numpy загружается при первом поиске, а не при запуске
+        from services.basket import optimize_basket
+
+        queries = list(dict.fromkeys(item.strip() for item in items if item and item.strip()))
+        with Metrics.span('basket', mode=mode, items=len(queries)):
+            with Metrics.span('search.refresh'):
+                self.catalog.refresh()
+            distances, company_ids = self._reach(distance_mode, max_distance_km, nearest_k, user)
+            rank = self._rank_key(distances, distance_weight)
+            with Metrics.span('search.candidates'):
+                if mode == 'llm':
+                    candidates = [self._score([(p, None) for p in self.catalog.candidates(query, top_k, company_ids,
+                                                                                           rank)],
+                                              distances, distance_weight, with_match=False) for query in queries]
+                else:
+                    candidates = [self._score(self.catalog.scored_candidates(query, LOCAL_TOP_K, company_ids,
+                                                                             MIN_MATCH_SCORE, rank),
+                                              distances, distance_weight, with_match=True) for query in queries]
+            if mode == 'llm':
+                options = self._llm_rank_basket(queries, candidates)
+            else:
+                options = [[fp for fp in found if fp['match'] >= MIN_MATCH_SCORE] for found in candidates]
+            with Metrics.span('basket.optimize'):
+                result = optimize_basket(queries, options, distance_weight, max_stores)
+        result['items'] = [{'query': query,
+                            'options': [to_result(fp) for fp in
+                                        sorted(found, key=lambda fp: fp['total_score'])[:BASKET_OPTIONS]]}
+                           for query, found in zip(queries, options)]
+        result['mode'] = mode
+        return result
+
+    def _llm_rank_basket(self, queries: List[str], candidates: List[List[Dict]]) -> List[List[Dict]]:
+        """Подходящие кандидаты каждого пункта в порядке LLM; пункты из кэша в запрос не попадают.
+
+        Кандидаты помечаются полем ranked_by; при сбое LLM — локальное ранжирование ('fallback').
+        """
+        from gpt import LLMUnavailable, smart_basket_search
+
+        # Ключ тот же, что у search_products: кэш общий для списка и одиночного поиска
+        keys = [LLMCache.make_key(query, found) for query, found in zip(queries, candidates)]
+        rankings = [self.llm_cache.get(key) if found else [] for key, found in zip(keys, candidates)]
+        by_id = {fp['product']['id']: fp for found in candidates for fp in found}
+        sources = ['llm_cache'] * len(queries)
+        pending = [i for i, ranking in enumerate(rankings) if ranking is None]
+        if pending:
+            with Metrics.span('search.llm', candidates=sum(len(candidates[i]) for i in pending), items=len(pending)):
+                try:
+                    computed = smart_basket_search([(queries[i], candidates[i]) for i in pending],
+                                                   policy=self.llm_policy)
+                except LLMUnavailable as e:
+                    print(f"LLM недоступна, локальный поиск: {e}")
+                    Metrics.count('search.llm_fallbacks')
+                    computed = None
+            for n, i in enumerate(pending):
+                if computed is None:
+                    rankings[i] = [fp['product']['id'] for fp in fallback_rank(candidates[i], queries[i])]
+                    sources[i] = 'fallback'
+                    continue
+                rankings[i], sources[i] = computed[n], 'llm'
+                if computed[n]:
+                    company_ids = {fp['company']['id'] for fp in candidates[i]}
+                    company_ids.update(by_id[pid]['company']['id'] for pid in computed[n] if pid in by_id)
+                    self.llm_cache.put(keys[i], company_ids, computed[n])
+        return [[dict(by_id[product_id], ranked_by=source) for product_id in ranking if product_id in by_id]
+                for ranking, source in zip(rankings, sources)]
+
+    def _collect_candidates(self, search_term: str, distance_weight: float, distance_mode: str, top_k: int,
+                            max_distance_km: Optional[float], nearest_k: Optional[int],
+                            with_match: bool = False, user: Optional[User] = None,
+                            sort: str = 'score') -> List[Dict]:
+        """Кандидаты с расстоянием и total_score; with_match добавляет текстовую близость к запросу.
+
+        with_match отбирает все подходящие по тексту товары и из них top_k лучших в порядке sort;
+        без него — top_k самых похожих, из одинаково похожих лучшие по total_score.
+        """
+        with Metrics.span('search.refresh'):
+            self.catalog.refresh()
+        distances, company_ids = self._reach(distance_mode, max_distance_km, nearest_k, user)
+        rank = self._rank_key(distances, distance_weight, sort)
+        with Metrics.span('search.candidates'):
+            if with_match:
+                candidates = self.catalog.scored_candidates(search_term, top_k, company_ids, MIN_MATCH_SCORE, rank)
+            else:
+                candidates = [(product, None)
+                              for product in self.catalog.candidates(search_term, top_k, company_ids, rank)]
+        return self._score(candidates, distances, distance_weight, with_match)
+
+    @staticmethod
+    def _rank_key(distances: Dict[int, float], distance_weight: float, sort: str = 'score'):
+        """Ключ отбора кандидатов в порядке выдачи (как _sort_key) по колонкам цен и предприятий.
+
+        Недостижимые магазины — в конце; при равных ключах каталог сравнивает id товаров.
+        """
+        import numpy as np
+
+        def key(prices: np.ndarray, company_ids: np.ndarray) -> np.ndarray:
+            # Предприятий намного меньше, чем товаров: расстояние ищется один раз на предприятие
+            companies, inverse = np.unique(company_ids, return_inverse=True)
+            distance = np.array([distances.get(cid, np.inf) for cid in companies.tolist()],
+                                dtype=np.float64)[inverse]
+            if sort == 'price':
+                values = prices.astype(np.float64)
+            elif sort == 'distance':
+                values = distance
+            else:
+                values = prices + distance * distance_weight
+            return np.where(np.isinf(distance), np.inf, values)
+
+        return key
+
+    def _reach(self, distance_mode: str, max_distance_km: Optional[float], nearest_k: Optional[int],
+               user: Optional[User]) -> Tuple[Dict[int, float], Optional[Iterable[int]]]:
+        """Расстояния до предприятий и ограничение кандидатов по ним (None — без ограничения)"""
+        # Ограничение по радиусу или числу ближайших магазинов сужает и расчет расстояний, и кандидатов для LLM
+        limited = max_distance_km is not None or nearest_k is not None
+        with Metrics.span('search.distances'):
+            distances = self.catalog.companies_in_reach((user or self.user).location, distance_mode,
+                                                        max_distance_km, nearest_k)
+        return distances, (distances.keys() if limited else None)
+
+    def _score(self, candidates: List[Tuple[Dict, Optional[float]]], distances: Dict[int, float],
+               distance_weight: float, with_match: bool) -> List[Dict]:
+        found_products = []
+        for product, match in candidates:
+            distance = distances.get(product['company_id'])
+            if distance is not None:
+                company = self.catalog.get_company(product['company_id'])
                 total_score = product['price'] + distance * distance_weight
 
-                found_products.append({
+                found = {
                     'product': product,
                     'company': company,
                     'distance': distance,
                     'total_score': total_score
-                })
+                }
+                if with_match:
+                    found['match'] = match
+                found_products.append(found)
+        Metrics.count('search.candidates', len(found_products))
+        return found_products
 
-        if not found_products:
-            return []
+    def _llm_rank(self, found_products: List[Dict], search_term: str, by_total_score: bool = True) -> List[Dict]:
+        """Отобранные LLM кандидаты по total_score; by_total_score=False — в порядке ответа LLM"""
+        # groq и conf.py загружаются только при первом обращении к LLM
+        from gpt import LLMUnavailable, smart_product_search
+
+        ranked_by = 'llm_cache'
+
+        def compute():
+            nonlocal ranked_by
+            ranked_by = 'llm'
+            return smart_product_search(found_products, search_term, policy=self.llm_policy)
 
-        llm_results = smart_product_search(found_products, search_term)
-        product_map = {(fp['product']['name'], fp['company']['name']): fp for fp in found_products}
+        cache_key = LLMCache.make_key(search_term, found_products)
+        with Metrics.span('search.llm', candidates=len(found_products)):
+            try:
+                llm_results = self.llm_cache.get_or_compute(
+                    cache_key,
+                    {fp['company']['id'] for fp in found_products},
+                    compute
+                )
+            except LLMUnavailable as e:
+                # Поиск не ждет модель дольше бюджета: отвечаем локальным ранжированием
+                print(f"LLM недоступна, локальный поиск: {e}")
+                Metrics.count('search.llm_fallbacks')
+                return [to_result(fp, 'fallback') for fp in fallback_rank(found_products, search_term)]
+        by_id = {fp['product']['id']: fp for fp in found_products}
 
-        final_results = []
-        for item in llm_results:
-            key = (item['name'], item['company'])
-            if key in product_map:
-                item['total_score'] = product_map[key]['total_score']
-                final_results.append(item)
+        # Ответ мог прийти из кэша для соседней точки — цену и расстояние берем актуальные
+        final_results = [to_result(by_id[product_id], ranked_by) for product_id in llm_results
+                         if product_id in by_id]
 
+        if not by_total_score:
+            return final_results
         final_results_sorted = sorted(final_results, key=lambda x: x['total_score'])
 
         return final_results_sorted
 
-    def get_all_companies(self) -> List[Dict]:
-        companies = DataStorage.load_data(self.companies_file)
-        result = []
-        for company in companies:
-            if 'location' in company:
-                distance = GeocodingService.calculate_distance(self.user.location, tuple(company['location']))
-            else:
-                distance = "Неизвестно"
-            result.append({
-                'id': company['id'],
-                'name': company['name'],
-                'address': company.get('address', 'Не указан'),
-                'distance': distance
-            })
-        return result
+    def get_all_companies(self, distance_mode: str = 'ellipsoidal', max_distance_km: Optional[float] = None,
+                          nearest_k: Optional[int] = None, user: Optional[User] = None) -> List[Dict]:
+        companies, distances = self._companies_in_view(distance_mode, max_distance_km, nearest_k, user)
+        return [self._company_row(company, distances) for company in companies]
+
+    def get_companies_page(self, sort: str = 'distance', page_size: int = DEFAULT_PAGE_SIZE,
+                           cursor: Optional[str] = None, distance_mode: str = 'ellipsoidal',
+                           max_distance_km: Optional[float] = None, nearest_k: Optional[int] = None,
+                           user: Optional[User] = None) -> Dict:
+        """Страница списка предприятий: {'items', 'next_cursor', 'total'}.
+
+        sort — 'distance' (без координат в конце) или 'name'; курсор — смещение в этом порядке.
+        Строки выдачи строятся только для страницы, а не для всего списка.
+        """
+        if sort not in COMPANY_SORTS:
+            raise ValueError(f"Неизвестный порядок сортировки: {sort}")
+        offset = int(cursor) if cursor else 0
+        if offset < 0:
+            raise ValueError(f"Некорректный курсор: {cursor}")
+        companies, distances = self._companies_in_view(distance_mode, max_distance_km, nearest_k, user)
+        if sort == 'distance':
+            key = lambda c: (distances.get(c['id'], float('inf')), c['id'])
+        else:
+            key = lambda c: (c['name'].casefold(), c['id'])
+        page = heapq.nsmallest(offset + page_size + 1, companies, key=key)[offset:]
+        next_cursor = str(offset + page_size) if len(page) > page_size else None
+        return {'items': [self._company_row(company, distances) for company in page[:page_size]],
+                'next_cursor': next_cursor, 'total': len(companies)}
+
+    def _companies_in_view(self, distance_mode: str, max_distance_km: Optional[float], nearest_k: Optional[int],
+                           user: Optional[User]) -> Tuple[List[Dict], Dict[int, float]]:
+        self.catalog.refresh()
+        location = (user or self.user).location
+        if max_distance_km is None and nearest_k is None:
+            return self.catalog.companies, self.catalog.distances(location, distance_mode)
+        # Только магазины в пределах досягаемости, ближайшие первыми
+        distances = self.catalog.companies_in_reach(location, distance_mode, max_distance_km, nearest_k)
+        return [self.catalog.get_company(cid) for cid in distances], distances
+
+    @staticmethod
+    def _company_row(company: Dict, distances: Dict[int, float]) -> Dict:
+        return {
+            'id': company['id'],
+            'name': company['name'],
+            'address': company.get('address', 'Не указан'),
+            'distance': distances.get(company['id'], "Неизвестно")
+        }
 
     def validate_price_file(self, file_path: str) -> bool:
-        if not file_path.lower().endswith('.docx'):
-            return False
-        if not os.path.exists(file_path):
+        if not FileParser.is_supported(file_path) or not os.path.exists(file_path):
             return False
         try:
-            doc = Document(file_path)
-            return len(doc.paragraphs) > 0
-        except:
+            return self.parse_price_file(file_path).stats.valid > 0
+        except Exception:
             return False
 
     def get_file_stats(self, file_path: str) -> Dict:
+        """total_lines, valid_products, rejected, avg_price, min_price, max_price; разбор общий с validate_price_file"""
         try:
-            products = FileParser.parse_docx_file(file_path)
-            return {
-                'total_lines': len([p for p in Document(file_path).paragraphs if p.text.strip()]),
-                'valid_products': len(products),
-                'avg_price': sum(p['price'] for p in products) / len(products) if products else 0
-            }
-        except:
-            return {'total_lines': 0, 'valid_products': 0, 'avg_price': 0}
+            return self.parse_price_file(file_path).stats.to_dict()
+        except Exception:
+            return ParseStats().to_dict()
 
     def get_user_location_info(self) -> str:
         return f"{self.user.address}\nКоординаты: {self.user.location}"
 
-    def set_user_location(self, city: str, street: str) -> bool:
+    def resolve_default_location(self) -> bool:
+        """Уточняет координаты адреса по умолчанию, если пользователь еще не задал свой"""
+        if self.user.address != DEFAULT_ADDRESS:
+            return False
+        location = GeocodingService.geocode_address(DEFAULT_ADDRESS)
+        if location and self.user.address == DEFAULT_ADDRESS:
+            self.user.set_location(DEFAULT_ADDRESS, location)
+            return True
+        return False
+
+    def set_user_location(self, city: str, street: str, user: Optional[User] = None) -> bool:
+        user = user or self.user
         user_address = f"{city}, {street}"
         location = GeocodingService.geocode_address(user_address)
         if location:
-            self.user.address = user_address
-            self.user.location = location
+            user.set_location(user_address, location)
             return True
         return False
 
+    def new_user(self) -> User:
+        """Пользователь с местоположением по умолчанию, например для нового сеанса API"""
+        return User(DEFAULT_ADDRESS, GeocodingService.cached_location(DEFAULT_ADDRESS) or DEFAULT_LOCATION)
+
 
 
 
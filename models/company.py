@@ -1,6 +1,8 @@
 from typing import Dict, List
 
 class Company:
+    __slots__ = ('id', 'name', 'address', 'location')
+
     def __init__(self, id: int, name: str, address: str, location: List[float]):
         self.id = id
         self.name = name
@@ -1,7 +1,9 @@
-from typing import Dict
+from typing import Dict, Optional
 
 class Product:
-    def __init__(self, id: int, name: str, price: float, company_id: int):
+    __slots__ = ('id', 'name', 'price', 'company_id')
+
+    def __init__(self, id: Optional[int], name: str, price: float, company_id: int):
         self.id = id
         self.name = name
         self.price = price
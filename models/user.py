@@ -1,6 +1,8 @@
 from typing import Tuple
 
 class User:
+    __slots__ = ('address', 'location')
+
     def __init__(self, address: str, location: Tuple[float, float]):
         self.address = address
         self.location = location
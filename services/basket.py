@@ -0,0 +1,140 @@
+import itertools
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from services.ranking import to_result
+
+# Больше магазинов за один поход обычно не рассматривают
+MAX_BASKET_STORES = 4
+# Сколько магазинов перебирать в сочетаниях: лучшие по каждому пункту и лучшие для всей корзины
+POOL_STORES = 24
+STORES_PER_ITEM = 3
+# Сочетаний магазинов в одной порции расчета
+COMBINATION_CHUNK = 2048
+
+
+def _offer_matrix(options_by_item: List[List[Dict]]):
+    """Самое дешевое предложение каждого магазина по каждому пункту.
+
+    Возвращает (id магазинов, цены [магазин x пункт] с inf там, где пункта нет,
+    расстояния до магазинов, выбранные кандидаты {(магазин, пункт): кандидат}).
+    """
+    offers: Dict[tuple, Dict] = {}
+    distances: Dict[int, float] = {}
+    for item_index, options in enumerate(options_by_item):
+        for found in options:
+            company_id = found['company']['id']
+            key = (company_id, item_index)
+            best = offers.get(key)
+            if best is None or found['product']['price'] < best['product']['price']:
+                offers[key] = found
+            distances[company_id] = found['distance']
+    company_ids = list(distances)
+    row = {company_id: i for i, company_id in enumerate(company_ids)}
+    prices = np.full((len(company_ids), len(options_by_item)), np.inf)
+    for (company_id, item_index), found in offers.items():
+        prices[row[company_id], item_index] = found['product']['price']
+    return company_ids, prices, np.array([distances[c] for c in company_ids]), offers
+
+
+def _store_pool(prices: np.ndarray, distance_costs: np.ndarray) -> List[int]:
+    """Не больше POOL_STORES строк магазинов для перебора, сколько бы ни было пунктов.
+
+    Сначала лучшие магазины для всей корзины, затем по очереди лучшие для каждого пункта.
+    """
+    available = np.isfinite(prices)
+    # Корзина в одном магазине: сначала больше пунктов, затем дешевле
+    single_cost = np.where(available, prices, 0).sum(axis=1) + distance_costs
+    pool = np.lexsort((single_cost, -available.sum(axis=1)))[:POOL_STORES // 2].tolist()
+    # Для одного пункта стоимость — цена плюс дорога до магазина
+    per_item = prices + distance_costs[:, None]
+    ranked = [np.flatnonzero(available[:, i])[np.argsort(per_item[available[:, i], i])[:STORES_PER_ITEM]]
+              for i in range(prices.shape[1])]
+    for place in range(STORES_PER_ITEM):
+        pool.extend(int(rows[place]) for rows in ranked if place < len(rows))
+    return list(dict.fromkeys(pool))[:POOL_STORES]
+
+
+def _best_combination(prices: np.ndarray, distance_costs: np.ndarray, rows: List[int], size: int):
+    """Лучшее сочетание size магазинов из rows: (строки, покрыто пунктов, стоимость) или None.
+
+    Сочетания оцениваются порциями по COMBINATION_CHUNK, чтобы память не росла с их числом.
+    """
+    if len(rows) < size:
+        return None
+    combinations = itertools.combinations(rows, size)
+    best = None
+    while True:
+        combos = np.array(list(itertools.islice(combinations, COMBINATION_CHUNK)))
+        if not len(combos):
+            return best
+        best_prices = prices[combos].min(axis=1)
+        covered = np.isfinite(best_prices).sum(axis=1)
+        cost = np.where(np.isfinite(best_prices), best_prices, 0).sum(axis=1) + distance_costs[combos].sum(axis=1)
+        i = np.lexsort((cost, -covered))[0]
+        if best is None or (-covered[i], cost[i]) < (-best[1], best[2]):
+            best = combos[i].tolist(), int(covered[i]), float(cost[i])
+
+
+def _basket(queries: List[str], company_ids: List[int], prices: np.ndarray, distances: np.ndarray,
+            offers: Dict[tuple, Dict], rows: List[int], distance_weight: float) -> Dict:
+    """Корзина из выбранных магазинов: каждый пункт покупается там, где он дешевле всего"""
+    stores = {row: [] for row in rows}
+    missing = []
+    items_price = 0.0
+    for item_index, query in enumerate(queries):
+        row = min(rows, key=lambda r: prices[r, item_index])
+        if not np.isfinite(prices[row, item_index]):
+            missing.append(query)
+            continue
+        found = offers[(company_ids[row], item_index)]
+        items_price += found['product']['price']
+        stores[row].append(dict(to_result(found), query=query))
+    # Магазин, в котором ничего не выгоднее, посещать незачем
+    visited = [row for row in rows if stores[row]]
+    distance_cost = float(sum(distances[row] for row in visited) * distance_weight)
+    return {
+        'stores': [{'company': stores[row][0]['company'], 'company_id': company_ids[row],
+                    'distance': float(distances[row]), 'items': stores[row]} for row in visited],
+        'store_count': len(visited),
+        'items_price': round(items_price, 2),
+        'distance_cost': round(distance_cost, 2),
+        'total_score': round(items_price + distance_cost, 2),
+        'missing': missing
+    }
+
+
+def optimize_basket(queries: List[str], options_by_item: List[List[Dict]], distance_weight: float,
+                    max_stores: int = 2) -> Dict:
+    """Самая выгодная корзина по списку покупок в модели price + distance * distance_weight.
+
+    options_by_item — для каждого пункта подходящие кандидаты (product, company, distance).
+    Дорога до магазина учитывается один раз, сколько бы товаров в нем ни покупалось.
+    Возвращает {'baskets': лучшая корзина для 1..max_stores магазинов, 'best': лучшая из них};
+    корзина, покрывающая больше пунктов, всегда лучше более дешевой, но неполной.
+    """
+    max_stores = max(1, min(max_stores, MAX_BASKET_STORES))
+    company_ids, prices, distances, offers = _offer_matrix(options_by_item)
+    if not company_ids:
+        empty = {'stores': [], 'store_count': 0, 'items_price': 0, 'distance_cost': 0, 'total_score': 0,
+                 'missing': list(queries)}
+        return {'baskets': [], 'best': empty}
+
+    distance_costs = distances * distance_weight
+    baskets = []
+    best_key: Optional[tuple] = None
+    best = None
+    for size in range(1, max_stores + 1):
+        # Один магазин перебираем по всем, сочетания — среди отобранных
+        rows = list(range(len(company_ids))) if size == 1 else _store_pool(prices, distance_costs)
+        found = _best_combination(prices, distance_costs, rows, size)
+        if found is None:
+            break
+        basket = _basket(queries, company_ids, prices, distances, offers, found[0], distance_weight)
+        basket['max_stores'] = size
+        baskets.append(basket)
+        key = (len(basket['missing']), basket['total_score'])
+        if best_key is None or key < best_key:
+            best_key, best = key, basket
+    return {'baskets': baskets, 'best': best}
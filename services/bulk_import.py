@@ -0,0 +1,188 @@
+import csv
+import itertools
+import json
+import os
+import pickle
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from models.company import Company
+from models.product import Product
+from services.file_parser import SUPPORTED_EXTENSIONS, FileParser, ParseStats
+from services.geocoding import GeocodingService
+from utils.record_spool import SPOOL_CHUNK_SIZE
+
+if TYPE_CHECKING:
+    from main import PriceManager
+
+PRICE_FILE_EXTENSIONS = SUPPORTED_EXTENSIONS
+MANIFEST_NAMES = ('manifest.csv', 'manifest.json')
+
+
+class ImportEntry:
+    """Один прайс для массовой загрузки"""
+
+    def __init__(self, company_name: str, file_path: str, address: Optional[str] = None):
+        self.company_name = company_name
+        self.file_path = file_path
+        self.address = address or None
+
+
+def load_manifest(manifest_path: str) -> List[ImportEntry]:
+    """Читает манифест CSV (company,address,file) или JSON (список объектов с теми же полями).
+
+    Относительные пути к файлам считаются от папки манифеста.
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    if manifest_path.lower().endswith('.json'):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+    else:
+        with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+            rows = list(csv.DictReader(f))
+
+    entries = []
+    for row in rows:
+        file_path = os.path.join(base_dir, row['file'].strip())
+        entries.append(ImportEntry(row['company'].strip(), file_path, (row.get('address') or '').strip()))
+    return entries
+
+
+def collect_entries(source: str) -> List[ImportEntry]:
+    """Папка (с манифестом или без) или путь к манифесту"""
+    if not os.path.isdir(source):
+        return load_manifest(source)
+    for name in MANIFEST_NAMES:
+        manifest_path = os.path.join(source, name)
+        if os.path.exists(manifest_path):
+            return load_manifest(manifest_path)
+    # Без манифеста название предприятия берем из имени файла, адрес не указан
+    return [ImportEntry(os.path.splitext(name)[0], os.path.join(source, name))
+            for name in sorted(os.listdir(source))
+            if name.lower().endswith(PRICE_FILE_EXTENSIONS)]
+
+
+def parse_price_file(file_path: str, spool_dir: str) -> Dict:
+    """Разбор одного файла в отдельном процессе; функция верхнего уровня, чтобы ее можно было передать в пул.
+
+    Записи пачками пишутся во временный файл в spool_dir, а не возвращаются списком: ни процесс разбора,
+    ни основной процесс не держат весь прайс в памяти.
+    """
+    start = time.perf_counter()
+    stats = ParseStats()
+    fd, records_path = tempfile.mkstemp(suffix='.records', dir=spool_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            records = FileParser.iter_file(file_path, stats)
+            while True:
+                chunk = list(itertools.islice(records, SPOOL_CHUNK_SIZE))
+                if not chunk:
+                    break
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+        error = None
+    except Exception as e:
+        error = str(e)
+    return {
+        'records_path': records_path,
+        'stats': stats,
+        'parse_seconds': time.perf_counter() - start,
+        'error': error
+    }
+
+
+def read_records(records_path: str) -> Iterator[Dict]:
+    """Записи, сохраненные parse_price_file, по пачкам"""
+    with open(records_path, 'rb') as f:
+        while True:
+            try:
+                chunk = pickle.load(f)
+            except EOFError:
+                return
+            yield from chunk
+
+
+def run_bulk_import(manager: "PriceManager", entries: List[ImportEntry], default_location: Tuple[float, float],
+                    max_workers: Optional[int] = None) -> Dict:
+    """Параллельно разбирает файлы и геокодирует адреса, затем сохраняет каждый файл отдельной записью.
+
+    Предприятие, которое уже есть в каталоге (то же название и адрес), обновляется через
+    reimport_company_file, поэтому повторный запуск манифеста не создает дублей.
+    Возвращает отчет: {'files': [...], 'companies': [...id новых], 'updated': [...id обновленных],
+    'total_seconds', 'commit_seconds'}.
+    """
+    start = time.perf_counter()
+    catalog = manager.catalog
+    reports = [{'file': os.path.basename(e.file_path), 'company': e.company_name, 'status': 'ok',
+                'company_id': None, 'products': 0, 'rejected': 0, 'parse_seconds': 0.0, 'geocode_seconds': 0.0,
+                'error': None}
+               for e in entries]
+    new_companies, updated_companies = [], []
+    commit_seconds = 0.0
+
+    with tempfile.TemporaryDirectory(prefix='bulk_import_') as spool_dir, \
+            ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(parse_price_file, e.file_path, spool_dir) for e in entries]
+
+        # Пока файлы разбираются, геокодируем адреса с допустимой для провайдера скоростью
+        locations, geocode_seconds = {}, {}
+        for address, location in GeocodingService.geocode_many({e.address for e in entries if e.address},
+                                                               timings=geocode_seconds):
+            locations[address] = location
+
+        # Файлы сохраняются по одному по мере разбора: в памяти не больше одного прайса
+        for entry, future, report in zip(entries, futures, reports):
+            result = future.result()
+            stats = result['stats']
+            report['parse_seconds'] = result['parse_seconds']
+            report['rejected'] = stats.rejected
+            if entry.address:
+                location, address = locations.get(entry.address), entry.address
+                report['geocode_seconds'] = geocode_seconds.get(entry.address, 0.0)
+            else:
+                location, address = default_location, "Адрес не указан"
+
+            if result['error']:
+                report['status'], report['error'] = 'error', f"Ошибка обработки файла: {result['error']}"
+            elif not stats.valid:
+                report['status'], report['error'] = 'error', "В файле не найдено товаров с ценами"
+            elif not location:
+                report['status'], report['error'] = 'error', f"Не удалось определить координаты для адреса: {address}"
+            if report['status'] != 'ok':
+                os.remove(result['records_path'])
+                continue
+
+            commit_start = time.perf_counter()
+            try:
+                existing = manager.find_company(entry.company_name, entry.address)
+                if existing:
+                    message = manager.reimport_company_file(existing['id'], entry.file_path,
+                                                            parsed=(stats, read_records(result['records_path'])))
+                    report['company_id'] = existing['id']
+                    if message.startswith('❌'):
+                        report['status'], report['error'] = 'error', message[2:]
+                    else:
+                        report['status'] = 'updated'
+                        report['products'] = stats.valid
+                        updated_companies.append(existing['id'])
+                else:
+                    # id товаров присвоит хранилище
+                    company = Company(catalog.allocate_company_ids(), entry.company_name, address, list(location))
+                    products = (Product(None, record['name'], record['price'], company.id).to_dict()
+                                for record in read_records(result['records_path']))
+                    report['products'] = catalog.add_company(company.to_dict(), products)
+                    report['company_id'] = company.id
+                    new_companies.append(company.id)
+            except Exception as e:
+                report['status'], report['error'] = 'error', f"Ошибка сохранения: {e}"
+            commit_seconds += time.perf_counter() - commit_start
+            os.remove(result['records_path'])
+
+    return {
+        'files': reports,
+        'companies': new_companies,
+        'updated': updated_companies,
+        'total_seconds': time.perf_counter() - start,
+        'commit_seconds': commit_seconds
+    }
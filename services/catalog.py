@@ -0,0 +1,318 @@
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Collection, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from services.fuzzy_index import FuzzyIndex
+from services.geocoding import GeocodingService
+from services.spatial_index import SpatialIndex
+from utils.data_storage import StorageBackend
+from utils.metrics import Metrics
+from utils.record_spool import RecordSpool
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from services.columnar_store import ColumnarProducts
+
+# rank(цены, id предприятий) -> ключи отбора тех же товаров (меньше — лучше)
+RankFunc = Callable[["np.ndarray", "np.ndarray"], "np.ndarray"]
+
+# По сколько новых товаров сливать с каталогом под блокировкой при добавлении предприятий
+MERGE_CHUNK_SIZE = 20000
+# Для скольких точек (пользователей API, сеансов) хранить таблицы расстояний
+DISTANCE_CACHE_ORIGINS = 64
+
+
+class Catalog:
+    """Резидентный каталог: предприятия в памяти с индексом по id, товары — в колонках (ColumnarProducts)"""
+
+    def __init__(self, storage: StorageBackend, snapshot_path: Optional[str] = None):
+        self.storage = storage
+        # Бинарный снимок колонок товаров для быстрого старта, актуален пока не изменилось хранилище
+        self.snapshot_path = snapshot_path
+        self.companies: List[Dict] = []
+        self.products: Optional["ColumnarProducts"] = None
+        self.companies_by_id: Dict[int, Dict] = {}
+        self.index = FuzzyIndex()
+        self.spatial = SpatialIndex()
+        self._signature = None
+        # Каталогом пользуются фоновые потоки GUI
+        self._lock = threading.RLock()
+        # Писатели каталога идут по одному; пока идет запись в хранилище, refresh не перечитывает его
+        self._write_lock = threading.Lock()
+        self._writing = False
+        # (точка, режим) -> {company_id: км}, недавно использованные в конце
+        self._distances: "OrderedDict[Tuple, Dict[int, float]]" = OrderedDict()
+
+    def refresh(self) -> bool:
+        """Перечитывает хранилище только если данные изменились"""
+        with self._lock:
+            if self._writing:
+                return False
+            signature = self.storage.signature()
+            if signature == self._signature:
+                return False
+            with Metrics.span('catalog.load'):
+                self.companies = self.storage.load_companies()
+                self.products = self._load_products(signature)
+            self._signature = signature
+            with Metrics.span('catalog.index', products=len(self.products)):
+                self._rebuild_index()
+            return True
+
+    @staticmethod
+    def _snapshot_signature(signature):
+        # Подпись хранится в заголовке снимка в виде JSON
+        return json.loads(json.dumps(signature))
+
+    def _load_products(self, signature) -> "ColumnarProducts":
+        # numpy нужен только каталогу с товарами и не загружается при импорте
+        from services.columnar_store import ColumnarProducts
+
+        snapshot_signature = self._snapshot_signature(signature)
+        if (self.snapshot_path and os.path.exists(self.snapshot_path)
+                and ColumnarProducts.read_signature(self.snapshot_path) == snapshot_signature):
+            try:
+                return ColumnarProducts.load(self.snapshot_path)
+            except (OSError, ValueError) as e:
+                print(f"Снимок каталога не прочитан: {e}")
+        return ColumnarProducts.from_products(self.storage.load_products(), snapshot_signature)
+
+    def save_snapshot(self) -> bool:
+        """Сохраняет колонки товаров в снимок для следующего запуска; актуальный снимок не перезаписывается"""
+        if not self.snapshot_path:
+            return False
+        from services.columnar_store import ColumnarProducts
+
+        with self._lock:
+            self.refresh()
+            products = self.products
+            signature = self._snapshot_signature(self._signature)
+            if ColumnarProducts.read_signature(self.snapshot_path) == signature:
+                return True
+            products.signature = signature
+            # Запись идет под блокировкой: колонки не должны меняться, пока пишутся в файл
+            products.save(self.snapshot_path)
+        return True
+
+    def _rebuild_index(self):
+        self.companies_by_id = {c['id']: c for c in self.companies}
+        self.spatial = SpatialIndex()
+        for company in self.companies:
+            if 'location' in company:
+                self.spatial.add(company['id'], company['location'])
+        # Название нормализуется один раз на все товары с ним
+        self.index = FuzzyIndex()
+        for name, product_ids in self.products.name_groups():
+            self.index.add_many(product_ids, name)
+        # Предприятия могли поменять координаты — таблицы расстояний строим заново
+        self._distances = OrderedDict()
+
+    @property
+    def product_count(self) -> int:
+        return len(self.products) if self.products is not None else 0
+
+    def get_company(self, company_id: int) -> Optional[Dict]:
+        return self.companies_by_id.get(company_id)
+
+    def get_product(self, product_id: int) -> Optional[Dict]:
+        with self._lock:
+            row = self.products.row(product_id)
+            return None if row is None else self.products.get(row)
+
+    def candidates(self, query: str, top_k: int, company_ids: Optional[Collection[int]] = None,
+                   rank: Optional[RankFunc] = None) -> List[Dict]:
+        """До top_k товаров, наиболее похожих на запрос; небольшой каталог отдается целиком.
+
+        company_ids ограничивает выдачу товарами указанных предприятий.
+        rank решает, какие из одинаково похожих товаров попадут в top_k.
+        """
+        with self._lock:
+            if company_ids is None:
+                if len(self.products) <= top_k:
+                    return list(self.products)
+                found = self.index.search(query, top_k, rank=self._by_id(rank))
+            else:
+                in_reach = self.products.company_rows(company_ids)
+                if len(in_reach) <= top_k:
+                    return self.products.products(in_reach.tolist())
+                found = self.index.search(query, top_k, accept=self._in_companies(company_ids),
+                                          rank=self._by_id(rank))
+            return self._products([product_id for product_id, _ in found])
+
+    def scored_candidates(self, query: str, limit: int, company_ids: Optional[Collection[int]] = None,
+                          min_score: Optional[float] = None,
+                          rank: Optional[RankFunc] = None) -> List[Tuple[Dict, float]]:
+        """До limit пар (товар, текстовая близость к запросу).
+
+        С min_score отбираются все товары не хуже этой близости, а из них — limit лучших по rank
+        (при равенстве — по id): так далекие точные совпадения не вытесняют близкие и дешевые.
+        Без min_score — лучшие по близости.
+        """
+        import numpy as np
+
+        with self._lock:
+            accept = self._in_companies(company_ids) if company_ids is not None else None
+            if min_score is None:
+                found = self.index.search(query, limit, accept=accept, rank=self._by_id(rank))
+            else:
+                found = self.index.matches(query, min_score, accept=accept)
+                if rank is not None and len(found) > limit:
+                    ids = np.fromiter((product_id for product_id, _ in found), dtype=np.int64, count=len(found))
+                    rows = self.products.rows(ids)
+                    keys = rank(self.products.prices[rows], self.products.company_ids[rows])
+                    found = [found[i] for i in np.lexsort((ids, keys))[:limit].tolist()]
+            products = self._products([product_id for product_id, _ in found])
+            return [(product, score) for product, (_, score) in zip(products, found)]
+
+    def _products(self, product_ids: List[int]) -> List[Dict]:
+        return self.products.products(self.products.rows(product_ids).tolist()) if product_ids else []
+
+    def _by_id(self, rank: Optional[RankFunc]) -> Optional[Callable[[List[int]], List]]:
+        if rank is None:
+            return None
+
+        def keys(product_ids: List[int]) -> List:
+            rows = self.products.rows(product_ids)
+            return rank(self.products.prices[rows], self.products.company_ids[rows]).tolist()
+        return keys
+
+    def _in_companies(self, company_ids: Collection[int]) -> Callable[[List[int]], List[int]]:
+        import numpy as np
+
+        wanted = np.fromiter(company_ids, dtype=np.int64)
+
+        def accept(product_ids: List[int]) -> List[int]:
+            ids = np.asarray(product_ids, dtype=np.int64)
+            return ids[np.isin(self.products.company_ids[self.products.rows(ids)], wanted)].tolist()
+        return accept
+
+    def distances(self, origin: Tuple[float, float], mode: str = 'ellipsoidal',
+                  company_ids: Optional[Collection[int]] = None) -> Dict[int, float]:
+        """Расстояния до предприятий с координатами; таблицы хранятся для нескольких последних точек.
+
+        Если передан company_ids, досчитываются только эти предприятия.
+        """
+        with self._lock:
+            key = (tuple(origin), mode)
+            table = self._distances.get(key)
+            if table is None:
+                table = self._distances[key] = {}
+                while len(self._distances) > DISTANCE_CACHE_ORIGINS:
+                    self._distances.popitem(last=False)
+            else:
+                self._distances.move_to_end(key)
+            targets = self.companies if company_ids is None else (
+                self.companies_by_id[cid] for cid in company_ids if cid in self.companies_by_id)
+            missing = [c for c in targets if c['id'] not in table and 'location' in c]
+            if missing:
+                values = GeocodingService.calculate_distances(
+                    origin, [c['location'] for c in missing], mode=mode)
+                # Таблицу могут читать другие потоки — дополняем копию
+                table = dict(table)
+                for company, distance in zip(missing, values):
+                    table[company['id']] = float(distance)
+                self._distances[key] = table
+            return table
+
+    def companies_in_reach(self, origin: Tuple[float, float], mode: str = 'ellipsoidal',
+                           max_distance_km: Optional[float] = None,
+                           nearest_k: Optional[int] = None) -> Dict[int, float]:
+        """Предприятия в радиусе max_distance_km и/или k ближайших: {id: км}, ближайшие первыми"""
+        with self._lock:
+            if max_distance_km is None and nearest_k is None:
+                selected = self.distances(origin, mode)
+            else:
+                if nearest_k is not None:
+                    ids = [cid for cid, _ in self.spatial.nearest(origin, nearest_k)]
+                else:
+                    ids = self.spatial.within_radius(origin, max_distance_km)
+                distances = self.distances(origin, mode, ids)
+                selected = {cid: distances[cid] for cid in ids if cid in distances}
+            if max_distance_km is not None:
+                selected = {cid: d for cid, d in selected.items() if d <= max_distance_km}
+            return dict(sorted(selected.items(), key=lambda item: item[1]))
+
+    def allocate_company_ids(self, count: int = 1) -> int:
+        """Первый из count новых id предприятий; id никогда не переиспользуются"""
+        return self.storage.allocate_ids('company', count)
+
+    def company_products(self, company_id: int) -> List[Dict]:
+        with self._lock:
+            return self.products.products(self.products.company_rows([company_id]).tolist())
+
+    def add_company(self, company: Dict, products: Iterable[Dict]) -> int:
+        """Добавляет предприятие с товарами и сохраняет их в хранилище; возвращает число товаров.
+
+        products может быть генератором — он читается до захвата блокировок (см. add_companies).
+        """
+        return self.add_companies([company], products)
+
+    def add_companies(self, companies: List[Dict], products: Iterable[Dict]) -> int:
+        """Добавляет несколько предприятий и их товары одной записью в хранилище.
+
+        Товары сначала читаются в RecordSpool без блокировок: разбор большого прайса не задерживает поиск.
+        Запись в хранилище и сборка колонок и индекса новых товаров идут под блокировкой писателей,
+        поиск в это время видит каталог до записи. Блокировка каталога берется только на слияние пачек
+        по MERGE_CHUNK_SIZE товаров, поэтому новые товары появляются в поиске постепенно.
+        """
+        from services.columnar_store import ColumnarProducts
+
+        with RecordSpool(products) as staged, self._write_lock:
+            first_id = self.storage.allocate_ids('product', staged.missing_ids) if staged.missing_ids else None
+
+            def with_ids() -> Iterator[Dict]:
+                # При каждом проходе по буферу товары получают одни и те же id
+                next_id = first_id
+                for product in staged:
+                    if product.get('id') is None:
+                        product['id'] = next_id
+                        next_id += 1
+                    yield product
+
+            with self._lock:
+                self.refresh()
+                self._writing = True
+            try:
+                self.storage.add_companies(companies, with_ids())
+                with self._lock:
+                    self.companies.extend(companies)
+                    for company in companies:
+                        self.companies_by_id[company['id']] = company
+                        if 'location' in company:
+                            self.spatial.add(company['id'], company['location'])
+
+                added = with_ids()
+                while True:
+                    chunk = ColumnarProducts.from_products(itertools.islice(added, MERGE_CHUNK_SIZE))
+                    if not len(chunk):
+                        break
+                    chunk_index = self.index.prepare(chunk.name_groups())
+                    with self._lock:
+                        self.products.extend(chunk)
+                        self.index.merge(chunk_index)
+                with self._lock:
+                    self._signature = self.storage.signature()
+            finally:
+                with self._lock:
+                    self._writing = False
+            return len(staged)
+
+    def update_products(self, inserts: List[Dict], price_updates: List[Tuple[int, float]],
+                        deletes: List[int]):
+        """Точечные изменения товаров: запись в хранилище и обновление индексов в памяти"""
+        with self._write_lock, self._lock:
+            self.refresh()
+            self.storage.update_products(inserts, price_updates, deletes)
+            self.products.set_prices([product_id for product_id, _ in price_updates],
+                                     [price for _, price in price_updates])
+            for product_id in set(deletes):
+                self.index.remove(product_id, self.products.name(self.products.row(product_id)))
+            self.products.delete(list(set(deletes)))
+            self.products.append(inserts)
+            for product in inserts:
+                self.index.add(product['id'], product['name'])
+            self._signature = self.storage.signature()
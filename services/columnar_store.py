@@ -0,0 +1,229 @@
+import json
+import mmap
+import os
+import struct
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+SNAPSHOT_MAGIC = b'PRCCOL01'
+_HEADER_LEN = struct.Struct('<Q')
+_ALIGN = 8
+
+
+class ColumnarProducts:
+    """Товары в колонках: id, company_id и цены в массивах, названия — в одной таблице строк.
+
+    Одинаковые названия хранятся один раз (name_ids ссылаются на таблицу строк).
+    Строки упорядочены по id, поэтому строка товара находится двоичным поиском.
+    Снимок на диске открывается через mmap без разбора JSON: массивы остаются представлениями
+    поверх файла, пока каталог не изменится. dict товара создается только при выдаче (get).
+    """
+
+    def __init__(self, ids: np.ndarray, company_ids: np.ndarray, prices: np.ndarray,
+                 name_ids: np.ndarray, names: List[str], signature=None):
+        self.ids = ids
+        self.company_ids = company_ids
+        self.prices = prices
+        self.name_ids = name_ids
+        self.names = names
+        self.signature = signature
+        self._name_index: Optional[Dict[str, int]] = None
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_products(cls, products: Iterable[Dict], signature=None) -> "ColumnarProducts":
+        store = cls.empty(signature)
+        store.append(products)
+        return store
+
+    @classmethod
+    def empty(cls, signature=None) -> "ColumnarProducts":
+        return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64),
+                   np.empty(0, dtype=np.int32), [], signature)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def mapped(self) -> bool:
+        """Массивы еще отображены из файла снимка"""
+        return self._mmap is not None
+
+    def nbytes(self) -> int:
+        return (self.ids.nbytes + self.company_ids.nbytes + self.prices.nbytes + self.name_ids.nbytes
+                + sum(len(name.encode('utf-8')) for name in self.names))
+
+    # --- чтение ---
+
+    def rows(self, product_ids: Sequence[int]) -> np.ndarray:
+        """Номера строк товаров с данными id (все id должны быть в каталоге)"""
+        return np.searchsorted(self.ids, np.asarray(product_ids, dtype=np.int64))
+
+    def row(self, product_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.ids, product_id))
+        return row if row < len(self.ids) and self.ids[row] == product_id else None
+
+    def name(self, row: int) -> str:
+        return self.names[self.name_ids[row]]
+
+    def get(self, row: int) -> Dict:
+        return {
+            "id": int(self.ids[row]),
+            "name": self.name(row),
+            "price": float(self.prices[row]),
+            "company_id": int(self.company_ids[row])
+        }
+
+    def products(self, rows: Iterable[int]) -> List[Dict]:
+        return [self.get(row) for row in rows]
+
+    def company_rows(self, company_ids: Iterable[int]) -> np.ndarray:
+        """Строки товаров указанных предприятий, по возрастанию id"""
+        wanted = np.fromiter(company_ids, dtype=np.int64)
+        return np.flatnonzero(np.isin(self.company_ids, wanted))
+
+    def name_groups(self) -> Iterator[tuple]:
+        """(название, [id товаров]) по каждому названию, у которого есть товары"""
+        if not len(self.ids):
+            return
+        order = np.argsort(self.name_ids, kind='stable')
+        sorted_names = self.name_ids[order]
+        bounds = np.flatnonzero(np.diff(sorted_names)) + 1
+        ids = self.ids[order]
+        for start, end in zip(np.concatenate(([0], bounds)).tolist(), np.concatenate((bounds, [len(ids)])).tolist()):
+            yield self.names[sorted_names[start]], ids[start:end].tolist()
+
+    def __iter__(self) -> Iterator[Dict]:
+        for product_id, company_id, price, name_id in zip(self.ids.tolist(), self.company_ids.tolist(),
+                                                           self.prices.tolist(), self.name_ids.tolist()):
+            yield {"id": product_id, "name": self.names[name_id], "price": price, "company_id": company_id}
+
+    # --- изменения: каждое заменяет массивы новыми, снимок после этого больше не отображен ---
+
+    def _intern(self, name: str) -> int:
+        if self._name_index is None:
+            self._name_index = {value: i for i, value in enumerate(self.names)}
+        name_id = self._name_index.get(name)
+        if name_id is None:
+            name_id = self._name_index[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+
+    def append(self, products: Iterable[Dict]):
+        ids, company_ids, prices, name_ids = [], [], [], []
+        for product in products:
+            ids.append(product['id'])
+            company_ids.append(product['company_id'])
+            prices.append(product['price'])
+            name_ids.append(self._intern(product['name']))
+        if not ids:
+            return
+        self._set(np.concatenate((self.ids, np.array(ids, dtype=np.int64))),
+                  np.concatenate((self.company_ids, np.array(company_ids, dtype=np.int64))),
+                  np.concatenate((self.prices, np.array(prices, dtype=np.float64))),
+                  np.concatenate((self.name_ids, np.array(name_ids, dtype=np.int32))))
+
+    def extend(self, other: "ColumnarProducts"):
+        """Добавляет строки другого набора (собранного заранее): переводятся только его уникальные названия"""
+        if not len(other):
+            return
+        remap = np.array([self._intern(name) for name in other.names], dtype=np.int32)
+        self._set(np.concatenate((self.ids, other.ids)), np.concatenate((self.company_ids, other.company_ids)),
+                  np.concatenate((self.prices, other.prices)),
+                  np.concatenate((self.name_ids, remap[other.name_ids])))
+
+    def set_prices(self, product_ids: Sequence[int], prices: Sequence[float]):
+        if not len(product_ids):
+            return
+        updated = self.prices.copy()
+        updated[self.rows(product_ids)] = prices
+        self._set(self.ids, self.company_ids, updated, self.name_ids)
+
+    def delete(self, product_ids: Sequence[int]):
+        if not len(product_ids):
+            return
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[self.rows(product_ids)] = False
+        self._set(self.ids[keep], self.company_ids[keep], self.prices[keep], self.name_ids[keep])
+
+    def _set(self, ids, company_ids, prices, name_ids):
+        # Новые id выдаются по возрастанию, сортировка нужна только после миграции со своими id
+        if len(ids) > 1 and not (ids[1:] > ids[:-1]).all():
+            order = np.argsort(ids, kind='stable')
+            ids, company_ids, prices, name_ids = ids[order], company_ids[order], prices[order], name_ids[order]
+        # Представления поверх снимка копируются: после изменения файл снимка можно перезаписать
+        self.ids, self.company_ids, self.prices, self.name_ids = (
+            array if array.flags.owndata else array.copy() for array in (ids, company_ids, prices, name_ids))
+        self._mmap = None
+
+    # --- снимок ---
+
+    def _sections(self):
+        encoded = [name.encode('utf-8') for name in self.names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        if encoded:
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return (('ids', self.ids), ('company_ids', self.company_ids), ('prices', self.prices),
+                ('name_ids', self.name_ids), ('name_offsets', offsets),
+                ('names_blob', np.frombuffer(b''.join(encoded), dtype=np.uint8)))
+
+    def save(self, path: str):
+        """Пишет бинарный снимок: заголовок JSON с описанием секций и выровненные массивы"""
+        sections = self._sections()
+        layout, offset = {}, 0
+        for name, array in sections:
+            layout[name] = [offset, array.dtype.str, len(array)]
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+        header = json.dumps({'layout': layout, 'signature': self.signature}).encode('utf-8')
+        header += b' ' * (-(len(SNAPSHOT_MAGIC) + _HEADER_LEN.size + len(header)) % _ALIGN)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(_HEADER_LEN.pack(len(header)))
+            f.write(header)
+            for _, array in sections:
+                data = array.tobytes()
+                f.write(data)
+                f.write(b'\0' * (-len(data) % _ALIGN))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "ColumnarProducts":
+        """Открывает снимок через mmap: числовые массивы — представления поверх файла, без копирования.
+
+        Декодируются только уникальные названия.
+        """
+        with open(path, 'rb') as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mm[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+            mm.close()
+            raise ValueError(f"{path}: не снимок каталога")
+        (header_len,) = _HEADER_LEN.unpack_from(mm, len(SNAPSHOT_MAGIC))
+        data_start = len(SNAPSHOT_MAGIC) + _HEADER_LEN.size
+        header = json.loads(mm[data_start:data_start + header_len])
+        data_start += header_len
+
+        arrays = {}
+        for name, (offset, dtype, count) in header['layout'].items():
+            arrays[name] = np.frombuffer(mm, dtype=np.dtype(dtype), count=count, offset=data_start + offset)
+        blob = arrays.pop('names_blob').tobytes()
+        offsets = arrays.pop('name_offsets').tolist()
+        names = [blob[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+        store = cls(arrays['ids'], arrays['company_ids'], arrays['prices'], arrays['name_ids'],
+                    names, header.get('signature'))
+        store._mmap = mm
+        return store
+
+    @staticmethod
+    def read_signature(path: str):
+        """Подпись хранилища, из которого сделан снимок, без загрузки массивов"""
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+                    return None
+                (header_len,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+                return json.loads(f.read(header_len)).get('signature')
+        except (OSError, ValueError, struct.error):
+            return None
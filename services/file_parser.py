@@ -1,27 +1,259 @@
 # services/file_parser.py
-import openpyxl
-from typing import List, Dict
+import codecs
+import csv
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Ключевые слова заголовков колонок
+NAME_HEADERS = ('наименование', 'название', 'товар', 'продукт', 'name', 'product')
+PRICE_HEADERS = ('цена', 'стоимость', 'руб', 'price', 'cost')
+# Сколько первых строк просматривать в поисках заголовка
+HEADER_SCAN_ROWS = 20
+# Форматы прайсов, которые понимает FileParser.iter_file
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv', '.docx')
+_WORD_RE = re.compile(r"\w+")
+CSV_DELIMITERS = ';,\t|'
+# Строка абзаца .docx вида "Молоко 3,2%, 89,90 руб." -> название и цена
+_LINE_RE = re.compile(r"^(?P<name>.+?)\s*(?:[,;:\t|]|\s[-–—]\s)\s*"
+                      r"(?P<price>\d[\d \xa0]*(?:[.,]\d+)?\s*(?:руб\.?|р\.|₽)?)\s*$", re.IGNORECASE)
+
+
+class ParseStats:
+    """Статистика разбора прайса"""
+
+    def __init__(self):
+        self.total_rows = 0
+        self.valid = 0
+        self.rejected = 0
+        self.header_row: Optional[int] = None
+        self.name_column = 0
+        self.price_column = 1
+        self.price_sum = 0.0
+        self.min_price: Optional[float] = None
+        self.max_price: Optional[float] = None
+
+    def add_price(self, price: float):
+        self.valid += 1
+        self.price_sum += price
+        if self.min_price is None or price < self.min_price:
+            self.min_price = price
+        if self.max_price is None or price > self.max_price:
+            self.max_price = price
+
+    @property
+    def avg_price(self) -> float:
+        return self.price_sum / self.valid if self.valid else 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'total_lines': self.total_rows,
+            'valid_products': self.valid,
+            'rejected': self.rejected,
+            'avg_price': self.avg_price,
+            'min_price': self.min_price or 0,
+            'max_price': self.max_price or 0
+        }
+
+
+class ParsedFile:
+    """Разобранный прайс: статистика и (для небольших файлов) записи, привязанные к версии файла на диске"""
+
+    def __init__(self, file_path: str, records: Optional[List[Dict]], stats: ParseStats):
+        self.file_path = os.path.abspath(file_path)
+        self.signature = ParsedFile.file_signature(file_path)
+        self.records = records
+        self.stats = stats
+
+    @staticmethod
+    def file_signature(file_path: str) -> Tuple[int, int]:
+        st = os.stat(file_path)
+        return st.st_mtime_ns, st.st_size
+
+    def matches(self, file_path: str) -> bool:
+        """Тот же файл и он не менялся после разбора"""
+        try:
+            return (os.path.abspath(file_path) == self.file_path
+                    and ParsedFile.file_signature(file_path) == self.signature)
+        except OSError:
+            return False
+
 
 class FileParser:
+    @staticmethod
+    def is_supported(file_path: str) -> bool:
+        return file_path.lower().endswith(SUPPORTED_EXTENSIONS)
+
+    @staticmethod
+    def iter_file(file_path: str, stats: Optional[ParseStats] = None) -> Iterator[Dict]:
+        """Записи {'name', 'price'} из прайса любого поддерживаемого формата; stats заполняется по ходу чтения"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension == '.xlsx':
+            return FileParser.iter_excel_file(file_path, stats)
+        if extension == '.csv':
+            return FileParser.iter_csv_file(file_path, stats)
+        if extension == '.docx':
+            return FileParser.iter_docx_file(file_path, stats)
+        raise ValueError(f"Неподдерживаемый формат файла: {extension or 'без расширения'} "
+                         f"(поддерживаются {', '.join(SUPPORTED_EXTENSIONS)})")
+
+    @staticmethod
+    def parse_file(file_path: str, max_records: Optional[int] = None) -> ParsedFile:
+        """Один проход по файлу: статистика для проверки и предпросмотра и записи для загрузки.
+
+        Если записей больше max_records, они не сохраняются (records=None) — большой прайс
+        не держится в памяти, при загрузке он читается потоково заново.
+        """
+        stats = ParseStats()
+        records: Optional[List[Dict]] = []
+        for record in FileParser.iter_file(file_path, stats):
+            if records is not None:
+                records.append(record)
+                if max_records is not None and len(records) > max_records:
+                    records = None
+        return ParsedFile(file_path, records, stats)
+
     @staticmethod
     def parse_excel_file(file_path: str) -> List[Dict]:
-        wb = openpyxl.load_workbook(file_path)
-        ws = wb.active
-
-        products = []
-        # Предполагаем: первая колонка — название, вторая — цена
-        # Пропускаем заголовки
-        rows = list(ws.iter_rows(values_only=True))
-        for row in rows[1:]:
-            if row and len(row) >= 2:
-                name = str(row[0]).strip()
-                try:
-                    price = float(str(row[1]).replace(',', '.'))
-                except (TypeError, ValueError):
+        return list(FileParser.iter_excel_file(file_path))
+
+    @staticmethod
+    def iter_excel_file(file_path: str, stats: Optional[ParseStats] = None) -> Iterator[Dict]:
+        """Потоково читает .xlsx в read-only режиме и выдает записи {'name', 'price'}.
+
+        Память не зависит от размера файла: строки не накапливаются.
+        """
+        import openpyxl
+
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            yield from FileParser._iter_records(wb.active.iter_rows(values_only=True), stats)
+        finally:
+            wb.close()
+
+    @staticmethod
+    def iter_csv_file(file_path: str, stats: Optional[ParseStats] = None) -> Iterator[Dict]:
+        """Потоково читает .csv: кодировка (UTF-8 или cp1251) и разделитель определяются по началу файла"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(64 * 1024)
+        try:
+            # Инкрементальный декодер не спотыкается о символ, обрезанный на границе образца
+            text = codecs.getincrementaldecoder('utf-8-sig')().decode(sample, final=False)
+            encoding = 'utf-8-sig'
+        except UnicodeDecodeError:
+            text = sample.decode('cp1251', errors='replace')
+            encoding = 'cp1251'
+        try:
+            delimiter = csv.Sniffer().sniff(text[:8192], delimiters=CSV_DELIMITERS).delimiter
+        except csv.Error:
+            delimiter = ';'
+
+        with open(file_path, 'r', encoding=encoding, errors='replace', newline='') as f:
+            yield from FileParser._iter_records(csv.reader(f, delimiter=delimiter), stats)
+
+    @staticmethod
+    def iter_docx_file(file_path: str, stats: Optional[ParseStats] = None) -> Iterator[Dict]:
+        """Читает .docx: строки таблиц, а если таблиц нет — абзацы вида 'Название товара, Цена'"""
+        from docx import Document
+
+        document = Document(file_path)
+        if document.tables:
+            rows = ([cell.text.strip() for cell in row.cells] for table in document.tables for row in table.rows)
+        else:
+            rows = (FileParser._split_line(p.text) for p in document.paragraphs if p.text.strip())
+        yield from FileParser._iter_records(rows, stats)
+
+    @staticmethod
+    def _split_line(text: str) -> Tuple[str, ...]:
+        match = _LINE_RE.match(text.strip())
+        if match is None:
+            return (text.strip(),)
+        return match['name'], match['price']
+
+    @staticmethod
+    def _iter_records(rows: Iterable[Sequence], stats: Optional[ParseStats]) -> Iterator[Dict]:
+        """Общий для всех форматов разбор строк: поиск заголовка, колонок и проверка записей"""
+        stats = stats if stats is not None else ParseStats()
+        rows = iter(rows)
+        # Буферизуем только первые строки, пока ищем заголовок
+        head = []
+        for row in rows:
+            head.append(row)
+            if len(head) >= HEADER_SCAN_ROWS:
+                break
+        header_index, stats.name_column, stats.price_column = FileParser._detect_columns(head)
+        if header_index is not None:
+            stats.header_row = header_index + 1
+            head = head[header_index + 1:]
+
+        for row_iter in (head, rows):
+            for row in row_iter:
+                stats.total_rows += 1
+                record = FileParser._parse_row(row, stats.name_column, stats.price_column)
+                if record is None:
+                    stats.rejected += 1
                     continue
-                if name and price:
-                    products.append({
-                        'name': name,
-                        'price': price
-                    })
-        return products
+                stats.add_price(record['price'])
+                yield record
+
+    @staticmethod
+    def _parse_price(value) -> Optional[float]:
+        if value is None or isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        text = str(value).replace('\xa0', '').replace(' ', '').replace(',', '.')
+        for suffix in ('руб.', 'руб', 'р.', '₽'):
+            if text.lower().endswith(suffix):
+                text = text[:-len(suffix)]
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _parse_row(row: Sequence, name_column: int, price_column: int) -> Optional[Dict]:
+        if not row or len(row) <= max(name_column, price_column):
+            return None
+        raw_name = row[name_column]
+        if raw_name is None:
+            return None
+        name = str(raw_name).strip()
+        price = FileParser._parse_price(row[price_column])
+        if not name or price is None or price <= 0:
+            return None
+        return {'name': name, 'price': price}
+
+    @staticmethod
+    def _is_header(cell: str, headers: Sequence[str]) -> bool:
+        """Ячейка — заголовок колонки: одно из ее слов начинается с ключевого слова (подстроки не в счет)"""
+        return any(word.startswith(h) for word in _WORD_RE.findall(cell) for h in headers)
+
+    @staticmethod
+    def _detect_columns(rows: List[Sequence]) -> Tuple[Optional[int], int, int]:
+        """Ищет строку заголовка и номера колонок названия и цены.
+
+        Возвращает (индекс строки заголовка или None, колонка названия, колонка цены).
+        """
+        for index, row in enumerate(rows):
+            cells = [str(cell).strip().lower() if cell is not None else '' for cell in row or ()]
+            name_column = next((i for i, c in enumerate(cells) if FileParser._is_header(c, NAME_HEADERS)), None)
+            price_column = next((i for i, c in enumerate(cells)
+                                 if i != name_column and FileParser._is_header(c, PRICE_HEADERS)), None)
+            # "Продукт творожный;89 руб." — данные, а не заголовок: в колонке цены число
+            if (name_column is not None and price_column is not None
+                    and FileParser._parse_price(row[price_column]) is None):
+                return index, name_column, price_column
+
+        # Заголовка нет: первая строка с текстом и числом задает колонки
+        for row in rows:
+            cells = list(row or ())
+            name_column = next((i for i, c in enumerate(cells)
+                                if isinstance(c, str) and c.strip() and FileParser._parse_price(c) is None), None)
+            if name_column is None:
+                continue
+            price_column = next((i for i, c in enumerate(cells)
+                                 if i != name_column and FileParser._parse_price(c) is not None), None)
+            if price_column is not None:
+                return None, name_column, price_column
+        return None, 0, 1
@@ -0,0 +1,170 @@
+import heapq
+import re
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+
+class FuzzyIndex:
+    """Триграммный индекс названий товаров для поиска с опечатками (солоко -> молоко)"""
+
+    def __init__(self):
+        # нормализованное название -> id товаров с таким названием
+        self._names: Dict[str, Set[int]] = defaultdict(set)
+        # триграмма -> нормализованные названия, в которых она встречается
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._name_trigrams: Dict[str, Set[str]] = {}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        text = str(text).lower().replace('ё', 'е')
+        return _NON_WORD.sub(' ', text).replace('_', ' ').strip()
+
+    @staticmethod
+    def trigrams(normalized: str) -> Set[str]:
+        result = set()
+        for word in normalized.split():
+            padded = f" {word} "
+            result.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        return result
+
+    @staticmethod
+    def _score(common: int, query_size: int, name_size: int) -> float:
+        # Доля триграмм запроса в названии ("чехол" в "чехол для ноута")
+        # плюс коэффициент Дайса, чтобы короткие точные совпадения были выше
+        containment = common / query_size
+        dice = 2 * common / (query_size + name_size)
+        return (containment + dice) / 2
+
+    @staticmethod
+    def similarity(query: str, name: str) -> float:
+        """Текстовая близость названия к запросу по той же формуле, что и в search (без индекса)"""
+        query_grams = FuzzyIndex.trigrams(FuzzyIndex.normalize(query))
+        if not query_grams:
+            return 0.0
+        name_grams = FuzzyIndex.trigrams(FuzzyIndex.normalize(name))
+        return FuzzyIndex._score(len(query_grams & name_grams), len(query_grams), len(name_grams))
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids in self._names.values())
+
+    def add(self, product_id: int, name: str):
+        self.add_many([product_id], name)
+
+    def add_many(self, product_ids: Iterable[int], name: str):
+        """Несколько товаров с одним названием: название нормализуется и разбирается один раз"""
+        normalized = self.normalize(name)
+        if normalized not in self._name_trigrams:
+            grams = self.trigrams(normalized)
+            self._name_trigrams[normalized] = grams
+            for gram in grams:
+                self._postings[gram].add(normalized)
+        self._names[normalized].update(product_ids)
+
+    def prepare(self, groups: Iterable[Tuple[str, List[int]]]) -> "FuzzyIndex":
+        """Индекс новых товаров для merge из пар (название, id); триграммы известных названий не пересчитываются.
+
+        Этот индекс только читается, поэтому сборка может идти без блокировки, пока его не меняют.
+        """
+        batch = FuzzyIndex()
+        for name, product_ids in groups:
+            normalized = self.normalize(name)
+            if normalized in self._name_trigrams:
+                batch._names[normalized].update(product_ids)
+            else:
+                batch.add_many(product_ids, name)
+        return batch
+
+    def merge(self, other: "FuzzyIndex"):
+        """Добавляет товары другого индекса, построенного заранее; other после слияния не используется.
+
+        Новые названия переносятся готовыми множествами, поэлементно объединяются только общие.
+        """
+        for normalized in other._names.keys() & self._names.keys():
+            other._names[normalized].update(self._names[normalized])
+        self._names.update(other._names)
+        self._name_trigrams.update(other._name_trigrams)
+        for gram, names in other._postings.items():
+            existing = self._postings.get(gram)
+            if existing is None:
+                self._postings[gram] = names
+            else:
+                existing.update(names)
+
+    def remove(self, product_id: int, name: str):
+        normalized = self.normalize(name)
+        ids = self._names.get(normalized)
+        if not ids:
+            return
+        ids.discard(product_id)
+        if not ids:
+            del self._names[normalized]
+            for gram in self._name_trigrams.pop(normalized, ()):
+                self._postings[gram].discard(normalized)
+                if not self._postings[gram]:
+                    del self._postings[gram]
+
+    def _shared(self, query: str) -> Tuple[int, Dict[str, int]]:
+        """(число триграмм запроса, {название: общих триграмм}) по всем названиям с общими триграммами"""
+        query_grams = self.trigrams(self.normalize(query))
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for name in self._postings.get(gram, ()):
+                shared[name] += 1
+        return len(query_grams), shared
+
+    def search(self, query: str, limit: int, accept: Optional[Callable[[List[int]], List[int]]] = None,
+               rank: Optional[Callable[[List[int]], Sequence]] = None) -> List[Tuple[int, float]]:
+        """Возвращает до limit пар (product_id, score), лучшие первыми.
+
+        accept(список id) оставляет подходящие товары, например, без слишком далеких магазинов.
+        rank(список id) — ключи товаров (меньше — лучше, например цена плюс дорога): товары с одинаковой
+        близостью упорядочиваются по ним, при равенстве по id, и только потом отсекаются по limit.
+        """
+        query_size, shared = self._shared(query)
+        if not query_size or limit <= 0:
+            return []
+
+        def score(name: str) -> float:
+            return self._score(shared[name], query_size, len(self._name_trigrams[name]))
+
+        if accept is None and len(shared) > limit:
+            # Названий не больше, чем товаров, поэтому limit названий всегда хватит;
+            # названия с той же близостью, что и последнее, тоже участвуют в отборе
+            cutoff = score(heapq.nlargest(limit, shared, key=score)[-1])
+            names = [name for name in shared if score(name) >= cutoff]
+        else:
+            names = list(shared)
+        tiers: Dict[float, List[str]] = defaultdict(list)
+        for name in names:
+            tiers[score(name)].append(name)
+
+        result = []
+        for name_score in sorted(tiers, reverse=True):
+            ids = [product_id for name in tiers[name_score] for product_id in self._names[name]]
+            if accept is not None and ids:
+                ids = accept(ids)
+            if not ids:
+                continue
+            remaining = limit - len(result)
+            keyed = zip(rank(ids), ids) if rank is not None else ((product_id, product_id) for product_id in ids)
+            ordered = heapq.nsmallest(remaining, keyed) if len(ids) > remaining else sorted(keyed)
+            result.extend((product_id, name_score) for _, product_id in ordered)
+            if len(result) >= limit:
+                break
+        return result
+
+    def matches(self, query: str, min_score: float,
+                accept: Optional[Callable[[List[int]], List[int]]] = None) -> List[Tuple[int, float]]:
+        """Все пары (product_id, score) с близостью не ниже min_score, без упорядочивания"""
+        query_size, shared = self._shared(query)
+        result = []
+        for name, common in shared.items():
+            name_score = self._score(common, query_size, len(self._name_trigrams[name]))
+            if name_score >= min_score:
+                result.extend((product_id, name_score) for product_id in self._names[name])
+        if accept is not None and result:
+            accepted = set(accept([product_id for product_id, _ in result]))
+            result = [pair for pair in result if pair[0] in accepted]
+        return result
@@ -0,0 +1,95 @@
+import atexit
+import json
+import os
+import re
+import threading
+import time
+from typing import Optional, Tuple
+
+_SPACES = re.compile(r"\s+")
+
+
+class GeocodeCache:
+    """Кэш адрес -> координаты в JSON-файле, включая отрицательные ответы.
+
+    Файл переписывается целиком, поэтому новые записи сбрасываются на диск пачками: после flush_every
+    изменений или через flush_interval секунд после прошлой записи, а также по flush() и при выходе.
+    """
+
+    def __init__(self, filename: str = 'geocode_cache.json', ttl_seconds: float = 30 * 24 * 3600,
+                 negative_ttl_seconds: float = 24 * 3600, flush_every: int = 100, flush_interval: float = 5.0):
+        self.filename = filename
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._entries = self._load()
+        self._dirty = 0
+        self._saved_at = time.monotonic()
+        atexit.register(self._flush_at_exit)
+
+    @staticmethod
+    def normalize(address: str) -> str:
+        address = _SPACES.sub(' ', str(address).lower().replace('ё', 'е')).strip()
+        return address.strip(' ,.')
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.filename):
+            return {}
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def flush(self):
+        """Записывает несохраненные изменения на диск"""
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                entries = dict(self._entries)
+                self._dirty = 0
+                self._saved_at = time.monotonic()
+            # Пишем во временный файл и подменяем, чтобы не получить обрезанный кэш
+            tmp_name = f"{self.filename}.tmp"
+            with open(tmp_name, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp_name, self.filename)
+            self.writes += 1
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except OSError as e:
+            print(f"Не удалось сохранить кэш геокодирования: {e}")
+
+    def get(self, address: str) -> Tuple[bool, Optional[Tuple[float, float]]]:
+        """Возвращает (найдено_в_кэше, координаты или None для отрицательного ответа)"""
+        key = self.normalize(address)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            location = entry['location']
+            ttl = self.ttl_seconds if location is not None else self.negative_ttl_seconds
+            if time.time() - entry['ts'] >= ttl:
+                del self._entries[key]
+                return False, None
+        return True, tuple(location) if location is not None else None
+
+    def put(self, address: str, location: Optional[Tuple[float, float]]):
+        key = self.normalize(address)
+        with self._lock:
+            self._entries[key] = {
+                'location': list(location) if location is not None else None,
+                'ts': time.time()
+            }
+            self._dirty += 1
+            due = (self._dirty >= self.flush_every
+                   or time.monotonic() - self._saved_at >= self.flush_interval)
+        if due:
+            self.flush()
@@ -1,23 +1,255 @@
-import requests
-from geopy.distance import geodesic
-from typing import Optional, Tuple
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+from services.geocode_cache import GeocodeCache
+from utils.metrics import Metrics
+from utils.rate_limiter import TokenBucket
+
+if TYPE_CHECKING:
+    import numpy as np
+    import requests
+
+EARTH_RADIUS_KM = 6371.0088
+# Эллипсоид WGS-84
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = (1 - WGS84_F) * WGS84_A
+
+DISTANCE_MODES = ('haversine', 'ellipsoidal')
+
+# Политика Nominatim: не больше одного запроса в секунду
+DEFAULT_GEOCODE_RATE = 1.0
+# Ответы, после которых имеет смысл повторить запрос
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
 
 class GeocodingService:
-    @staticmethod
-    def geocode_address(address: str) -> Optional[Tuple[float, float]]:
+    base_url = "https://nominatim.openstreetmap.org/search"
+    user_agent = 'PriceManagerApp/1.0'
+    # (connect, read) в секундах
+    timeout = (3.05, 10)
+    cache: Optional[GeocodeCache] = None
+    # Общий лимит для всех запросов процесса к провайдеру
+    rate_limiter = TokenBucket(DEFAULT_GEOCODE_RATE)
+    # requests импортируется при первом запросе к геокодеру
+    _session: Optional["requests.Session"] = None
+    _session_lock = threading.Lock()
+
+    @classmethod
+    def configure(cls, base_url: Optional[str] = None, cache: Optional[GeocodeCache] = None,
+                  timeout: Optional[Tuple[float, float]] = None, rate: Optional[float] = None):
+        """Переопределение провайдера и кэша, например для локального тестового сервера"""
+        if base_url is not None:
+            cls.base_url = base_url
+        if cache is not None:
+            cls.cache = cache
+        if timeout is not None:
+            cls.timeout = timeout
+        if rate is not None:
+            cls.rate_limiter = TokenBucket(rate)
+
+    @classmethod
+    def get_session(cls) -> "requests.Session":
+        """Общая keep-alive сессия для всех запросов к геокодеру"""
+        with cls._session_lock:
+            if cls._session is None:
+                import requests
+
+                session = requests.Session()
+                session.headers['User-Agent'] = cls.user_agent
+                cls._session = session
+            return cls._session
+
+    @classmethod
+    def get_cache(cls) -> GeocodeCache:
+        if cls.cache is None:
+            cls.cache = GeocodeCache('geocode_cache.json')
+        return cls.cache
+
+    @classmethod
+    def cached_location(cls, address: str) -> Optional[Tuple[float, float]]:
+        """Координаты из кэша без обращения к сети"""
+        return cls.get_cache().get(address)[1]
+
+    @classmethod
+    def geocode_address(cls, address: str) -> Optional[Tuple[float, float]]:
+        cache = cls.get_cache()
+        hit, location = cache.get(address)
+        if hit:
+            Metrics.count('geocode.cache_hits')
+            return location
+        Metrics.count('geocode.cache_misses')
         try:
-            url = "https://nominatim.openstreetmap.org/search"
-            params = {'q': address, 'format': 'json', 'limit': 1}
-            headers = {'User-Agent': 'PriceManagerApp/1.0'}
-            response = requests.get(url, params=params, headers=headers)
-            response.raise_for_status()
-            data = response.json()
-            if data:
-                return (float(data[0]['lat']), float(data[0]['lon']))
+            location = cls._lookup(address)
         except Exception as e:
+            # Сетевые ошибки не кэшируем — в следующий раз попробуем снова
             print(f"Ошибка геокодирования: {e}")
+            Metrics.count('geocode.errors')
+            return None
+        cache.put(address, location)
+        return location
+
+    @classmethod
+    def geocode_many(cls, addresses: Iterable[str], max_workers: int = 4, retries: int = 3,
+                     backoff: float = 1.0, timings: Optional[Dict[str, float]] = None
+                     ) -> Iterator[Tuple[str, Optional[Tuple[float, float]]]]:
+        """Пакетное геокодирование: выдает (адрес, координаты) по мере готовности.
+
+        Одинаковые после нормализации адреса запрашиваются один раз, кэш проверяется
+        до сети, запросы идут параллельно, но не быстрее общего rate_limiter.
+        timings, если передан, получает время на каждый адрес: ожидание лимита, запрос и повторы (из кэша — 0).
+        """
+        cache = cls.get_cache()
+        # нормализованный адрес -> исходные написания
+        pending = {}
+        for address in addresses:
+            pending.setdefault(GeocodeCache.normalize(address), []).append(address)
+
+        to_fetch = {}
+        for key, variants in pending.items():
+            hit, location = cache.get(key)
+            Metrics.count('geocode.cache_hits' if hit else 'geocode.cache_misses')
+            if hit:
+                for address in dict.fromkeys(variants):
+                    if timings is not None:
+                        timings[address] = 0.0
+                    yield address, location
+            else:
+                to_fetch[key] = variants
+        if not to_fetch:
+            return
+
+        seconds = {}
+
+        def lookup(key: str, address: str) -> Optional[Tuple[float, float]]:
+            started = time.perf_counter()
+            try:
+                return cls._lookup_with_retries(address, retries, backoff)
+            finally:
+                seconds[key] = time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(lookup, key, variants[0]): key for key, variants in to_fetch.items()}
+            try:
+                for future in as_completed(futures):
+                    key = futures[future]
+                    try:
+                        location = future.result()
+                        cache.put(key, location)
+                    except Exception as e:
+                        print(f"Ошибка геокодирования: {e}")
+                        Metrics.count('geocode.errors')
+                        location = None
+                    for address in dict.fromkeys(to_fetch[key]):
+                        if timings is not None:
+                            timings[address] = seconds[key]
+                        yield address, location
+            finally:
+                # Кэш пишется пачками; результаты пакета сохраняем сразу
+                cache.flush()
+
+    @classmethod
+    def _lookup_with_retries(cls, address: str, retries: int, backoff: float) -> Optional[Tuple[float, float]]:
+        import requests
+
+        for attempt in range(retries + 1):
+            try:
+                return cls._lookup(address)
+            except requests.RequestException as e:
+                status = e.response.status_code if e.response is not None else None
+                if attempt == retries or (status is not None and status not in RETRY_STATUS_CODES):
+                    raise
+            # Экспоненциальная пауза со случайным разбросом, чтобы потоки не повторяли синхронно
+            time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+    @classmethod
+    def _lookup(cls, address: str) -> Optional[Tuple[float, float]]:
+        params = {'q': address, 'format': 'json', 'limit': 1}
+        with Metrics.span('geocode.rate_wait'):
+            cls.rate_limiter.acquire()
+        with Metrics.span('geocode.request'):
+            response = cls.get_session().get(cls.base_url, params=params, timeout=cls.timeout)
+        Metrics.count('geocode.requests')
+        response.raise_for_status()
+        data = response.json()
+        if data:
+            return (float(data[0]['lat']), float(data[0]['lon']))
         return None
 
     @staticmethod
-    def calculate_distance(coord1: Tuple[float, float], coord2: Tuple[float, float]) -> float:
-        return geodesic(coord1, coord2).km
+    def calculate_distances(origin: Tuple[float, float], coords: Sequence[Sequence[float]],
+                            mode: str = 'ellipsoidal') -> "np.ndarray":
+        """Расстояния (км) от origin до всех точек coords за один проход NumPy.
+
+        mode='haversine' — быстрая сфера, mode='ellipsoidal' — формула Винсенти на WGS-84
+        (совпадает с geopy.geodesic до долей метра).
+        """
+        # numpy импортируется при первом расчете, а не при запуске приложения
+        import numpy as np
+
+        if mode not in DISTANCE_MODES:
+            raise ValueError(f"Неизвестный режим расчета расстояний: {mode}")
+        points = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        if not len(points):
+            return np.empty(0, dtype=np.float64)
+        lat1, lon1 = np.radians(origin[0]), np.radians(origin[1])
+        lat2, lon2 = np.radians(points[:, 0]), np.radians(points[:, 1])
+        if mode == 'haversine':
+            return GeocodingService._haversine(lat1, lon1, lat2, lon2)
+        return GeocodingService._vincenty(lat1, lon1, lat2, lon2)
+
+    @staticmethod
+    def _haversine(lat1, lon1, lat2, lon2) -> "np.ndarray":
+        import numpy as np
+
+        h = (np.sin((lat2 - lat1) / 2) ** 2
+             + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0)))
+
+    @staticmethod
+    def _vincenty(lat1, lon1, lat2, lon2, max_iterations: int = 200) -> "np.ndarray":
+        import numpy as np
+
+        f = WGS84_F
+        L = lon2 - lon1
+        U1 = np.arctan((1 - f) * np.tan(lat1))
+        U2 = np.arctan((1 - f) * np.tan(lat2))
+        sin_u1, cos_u1 = np.sin(U1), np.cos(U1)
+        sin_u2, cos_u2 = np.sin(U2), np.cos(U2)
+
+        lam = L.copy()
+        converged = np.zeros(L.shape, dtype=bool)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            for _ in range(max_iterations):
+                sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+                sin_sigma = np.hypot(cos_u2 * sin_lam, cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam)
+                cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+                sigma = np.arctan2(sin_sigma, cos_sigma)
+                # Совпадающие точки: sin_sigma == 0
+                sin_alpha = np.where(sin_sigma == 0, 0.0, cos_u1 * cos_u2 * sin_lam / sin_sigma)
+                cos2_alpha = 1 - sin_alpha ** 2
+                # Точки на экваторе: cos2_alpha == 0
+                cos_2sm = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha)
+                C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+                lam_prev = lam
+                lam = L + (1 - C) * f * sin_alpha * (
+                    sigma + C * sin_sigma * (cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+                converged = np.abs(lam - lam_prev) < 1e-12
+                if converged.all():
+                    break
+
+            u2 = cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2
+            A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+            B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+            delta_sigma = B * sin_sigma * (cos_2sm + B / 4 * (
+                cos_sigma * (-1 + 2 * cos_2sm ** 2)
+                - B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sm ** 2)))
+            distances = WGS84_B * A * (sigma - delta_sigma) / 1000
+
+        # Почти антиподальные точки не сходятся — для них берем сферическое приближение
+        fallback = ~converged | ~np.isfinite(distances)
+        if fallback.any():
+            distances = np.where(fallback, GeocodingService._haversine(lat1, lon1, lat2, lon2), distances)
+        return distances
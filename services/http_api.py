@@ -0,0 +1,336 @@
+import asyncio
+import functools
+import json
+import os
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from aiohttp import web
+
+from models.user import User
+from services.file_parser import SUPPORTED_EXTENSIONS
+from services.geocoding import DISTANCE_MODES
+from services.ranking import COMPANY_SORTS, SORT_KEYS, sort_results
+
+SESSION_COOKIE = 'session'
+SESSION_HEADER = 'X-Session-Id'
+# Сеанс без запросов дольше этого срока забывается
+SESSION_TTL_SECONDS = 24 * 3600
+MAX_SESSIONS = 100000
+MAX_UPLOAD_BYTES = 50 * 2 ** 20
+# Загружаемый файл копится в памяти блоками этого размера перед записью на диск
+UPLOAD_WRITE_BYTES = 2 ** 20
+UPLOAD_EXTENSIONS = SUPPORTED_EXTENSIONS
+SEARCH_MODES = ('llm', 'local', 'hybrid')
+BASKET_MODES = ('llm', 'local')
+RESULT_SORTS = tuple(SORT_KEYS)
+# Проверено: 50 пунктов по 4 магазина — около 3 с и 20 МБ на каталоге в 100 тыс. товаров
+MAX_BASKET_ITEMS = 50
+
+MANAGER_KEY = web.AppKey('manager', object)
+SESSIONS_KEY = web.AppKey('sessions', object)
+EXECUTOR_KEY = web.AppKey('executor', ThreadPoolExecutor)
+NETWORK_EXECUTOR_KEY = web.AppKey('network_executor', ThreadPoolExecutor)
+
+
+class SessionStore:
+    """Местоположение каждого клиента API: id сеанса -> User, вытеснение самых давних"""
+
+    def __init__(self, new_user, ttl_seconds: float = SESSION_TTL_SECONDS, max_sessions: int = MAX_SESSIONS):
+        self.new_user = new_user
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        # id -> (время последнего запроса, пользователь)
+        self._sessions: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def get(self, session_id: Optional[str]) -> Optional[User]:
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id) if session_id else None
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl_seconds:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+            return entry[1]
+
+    def create(self) -> Tuple[str, User]:
+        session_id = secrets.token_urlsafe(16)
+        user = self.new_user()
+        with self._lock:
+            self._sessions[session_id] = (time.time(), user)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return session_id, user
+
+
+def _session(request: web.Request):
+    """(id сеанса, пользователь, создан ли сеанс этим запросом)"""
+    sessions: SessionStore = request.app[SESSIONS_KEY]
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    user = sessions.get(session_id)
+    if user is not None:
+        return session_id, user, False
+    session_id, user = sessions.create()
+    return session_id, user, True
+
+
+_dumps = functools.partial(json.dumps, ensure_ascii=False)
+
+
+def _json(request: web.Request, data, session_id: str, created: bool, status: int = 200) -> web.Response:
+    response = web.json_response(data, status=status, dumps=_dumps)
+    response.headers[SESSION_HEADER] = session_id
+    if created:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=SESSION_TTL_SECONDS, httponly=True)
+    return response
+
+
+def _error(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=_dumps({'error': message}), content_type='application/json')
+
+
+async def _blocking(request: web.Request, func, *args, **kwargs):
+    """Локальный поиск и запись файлов — в пуле потоков, чтобы не останавливать цикл событий"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app[EXECUTOR_KEY], functools.partial(func, *args, **kwargs))
+
+
+async def _network(request: web.Request, func, *args, **kwargs):
+    """LLM и геокодирование — в отдельном пуле: ожидание сети не занимает потоки локального поиска"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(request.app[NETWORK_EXECUTOR_KEY], functools.partial(func, *args, **kwargs))
+
+
+def _float_param(request: web.Request, name: str, default: Optional[float] = None) -> Optional[float]:
+    value = request.query.get(name)
+    if value in (None, ''):
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        raise _error(f"Параметр {name} должен быть числом")
+
+
+def _int_param(request: web.Request, name: str, default: Optional[int] = None) -> Optional[int]:
+    value = _float_param(request, name)
+    if value is None:
+        return default
+    if value != int(value) or value <= 0:
+        raise _error(f"Параметр {name} должен быть целым положительным числом")
+    return int(value)
+
+
+async def _json_body(request: web.Request) -> Dict:
+    """Тело запроса — JSON-объект, иначе 400"""
+    try:
+        data = await request.json()
+    except ValueError:
+        raise _error("Ожидается JSON")
+    if not isinstance(data, dict):
+        raise _error("Ожидается JSON-объект")
+    return data
+
+
+async def health(request: web.Request) -> web.Response:
+    manager = request.app[MANAGER_KEY]
+    return web.json_response({'status': 'ok', 'companies': len(manager.catalog.companies),
+                              'products': manager.catalog.product_count,
+                              'sessions': len(request.app[SESSIONS_KEY])})
+
+
+async def search(request: web.Request) -> web.Response:
+    """GET /api/search?q=...&mode=local|llm|hybrid&page_size=&cursor=&max_distance_km=&nearest_k=
+
+    sort=score|price|distance — порядок страниц; в режиме llm упорядочивает готовую выдачу.
+    """
+    session_id, user, created = _session(request)
+    manager = request.app[MANAGER_KEY]
+    query = request.query.get('q', '').strip()
+    if not query:
+        raise _error("Не задан запрос q")
+    mode = request.query.get('mode', 'local')
+    if mode not in SEARCH_MODES:
+        raise _error(f"Неизвестный режим поиска: {mode}")
+    distance_mode = request.query.get('distance_mode', 'ellipsoidal')
+    if distance_mode not in DISTANCE_MODES:
+        raise _error(f"Неизвестный способ расчета расстояний: {distance_mode}")
+    sort = request.query.get('sort', 'score')
+    if sort not in RESULT_SORTS:
+        raise _error(f"Неизвестный порядок сортировки: {sort}")
+    options = {
+        'distance_weight': _float_param(request, 'distance_weight', 10),
+        'distance_mode': distance_mode,
+        'max_distance_km': _float_param(request, 'max_distance_km'),
+        'nearest_k': _int_param(request, 'nearest_k'),
+        'user': user
+    }
+    if mode == 'llm':
+        items = await _network(request, manager.search_products, query, mode='llm', **options)
+        if 'sort' in request.query:
+            items = sort_results(items, sort)
+        result = {'items': items, 'next_cursor': None, 'mode': mode}
+    else:
+        try:
+            run = _network if mode == 'hybrid' else _blocking
+            result = await run(request, manager.search_page, query, mode=mode,
+                               page_size=_int_param(request, 'page_size', 20),
+                               cursor=request.query.get('cursor') or None, sort=sort, **options)
+        except ValueError as e:
+            raise _error(f"Некорректный запрос: {e}")
+    return _json(request, result, session_id, created)
+
+
+async def basket(request: web.Request) -> web.Response:
+    """POST /api/basket {"items": [...], "mode": "llm"|"local", "max_stores": 2, "distance_weight": 10}"""
+    session_id, user, created = _session(request)
+    data = await _json_body(request)
+    items = data.get('items')
+    if not isinstance(items, list) or not all(isinstance(item, str) for item in items) or not any(items):
+        raise _error("items должен быть непустым списком строк")
+    if len(items) > MAX_BASKET_ITEMS:
+        raise _error(f"Не больше {MAX_BASKET_ITEMS} пунктов в списке")
+    mode = data.get('mode', 'llm')
+    if mode not in BASKET_MODES:
+        raise _error(f"Неизвестный режим поиска: {mode}")
+    try:
+        distance_weight = float(data.get('distance_weight', 10))
+        max_stores = int(data.get('max_stores', 2))
+    except (TypeError, ValueError):
+        raise _error("distance_weight и max_stores должны быть числами")
+    manager = request.app[MANAGER_KEY]
+    run = _network if mode == 'llm' else _blocking
+    result = await run(request, manager.search_basket, items, distance_weight, max_stores=max_stores,
+                       mode=mode, user=user)
+    return _json(request, result, session_id, created)
+
+
+async def companies(request: web.Request) -> web.Response:
+    """GET /api/companies?max_distance_km=&nearest_k=&sort=distance|name&page_size=&cursor=
+
+    Без page_size — весь список, как раньше; с page_size — страница {'items', 'next_cursor', 'total'}.
+    """
+    session_id, user, created = _session(request)
+    manager = request.app[MANAGER_KEY]
+    options = {
+        'max_distance_km': _float_param(request, 'max_distance_km'),
+        'nearest_k': _int_param(request, 'nearest_k'),
+        'user': user
+    }
+    page_size = _int_param(request, 'page_size')
+    if page_size is None:
+        result = await _blocking(request, manager.get_all_companies, **options)
+        return _json(request, result, session_id, created)
+    sort = request.query.get('sort', 'distance')
+    cursor = request.query.get('cursor') or None
+    if sort not in COMPANY_SORTS:
+        raise _error(f"Неизвестный порядок сортировки: {sort}")
+    if cursor is not None and not cursor.isdigit():
+        raise _error("Некорректный курсор")
+    result = await _blocking(request, manager.get_companies_page, sort, page_size, cursor, **options)
+    return _json(request, result, session_id, created)
+
+
+async def get_location(request: web.Request) -> web.Response:
+    session_id, user, created = _session(request)
+    return _json(request, {'address': user.address, 'location': list(user.location)}, session_id, created)
+
+
+async def set_location(request: web.Request) -> web.Response:
+    """POST /api/location {"city": ..., "street": ...}"""
+    session_id, user, created = _session(request)
+    data = await _json_body(request)
+    city, street = str(data.get('city') or '').strip(), str(data.get('street') or '').strip()
+    if not city or not street:
+        raise _error("Заполните city и street")
+    manager = request.app[MANAGER_KEY]
+    if not await _network(request, manager.set_user_location, city, street, user=user):
+        return _json(request, {'error': "Не удалось определить координаты по этому адресу"},
+                     session_id, created, status=422)
+    return _json(request, {'address': user.address, 'location': list(user.location)}, session_id, created)
+
+
+async def upload_price(request: web.Request) -> web.Response:
+    """POST /api/companies, multipart: name, address (необязательно), file (.xlsx, .csv, .docx)"""
+    session_id, _, created = _session(request)
+    if not request.content_type.startswith('multipart/'):
+        raise _error("Ожидается multipart/form-data с полями name, address, file")
+    fields: Dict[str, str] = {}
+    file_path = None
+    upload_dir = tempfile.mkdtemp(prefix='price_upload_')
+    try:
+        reader = await request.multipart()
+        async for part in reader:
+            if part.name == 'file':
+                suffix = os.path.splitext(part.filename or '')[1].lower()
+                if suffix not in UPLOAD_EXTENSIONS:
+                    raise _error(f"Поддерживаются файлы: {', '.join(UPLOAD_EXTENSIONS)}")
+                # Файл пишется на диск блоками в пуле потоков: в памяти не держим; имя сохраняем для отчета
+                file_path = os.path.join(upload_dir, os.path.basename(part.filename))
+                size = 0
+                buffer = bytearray()
+                f = await _blocking(request, open, file_path, 'wb')
+                try:
+                    while True:
+                        chunk = await part.read_chunk()
+                        size += len(chunk)
+                        if size > MAX_UPLOAD_BYTES:
+                            raise _error("Файл слишком большой")
+                        buffer += chunk
+                        if buffer and (not chunk or len(buffer) >= UPLOAD_WRITE_BYTES):
+                            await _blocking(request, f.write, bytes(buffer))
+                            buffer.clear()
+                        if not chunk:
+                            break
+                finally:
+                    await _blocking(request, f.close)
+            elif part.name:
+                fields[part.name] = (await part.text()).strip()
+        if not fields.get('name') or file_path is None:
+            raise _error("Нужны поля name и file")
+
+        manager = request.app[MANAGER_KEY]
+        message = await _network(request, manager.add_company_from_file, fields['name'], file_path,
+                                 fields.get('address') or None)
+    finally:
+        shutil.rmtree(upload_dir, ignore_errors=True)
+    ok = not message.startswith('❌')
+    return _json(request, {'ok': ok, 'message': message}, session_id, created, status=200 if ok else 422)
+
+
+def create_app(manager, max_workers: int = 8, network_workers: int = 32) -> web.Application:
+    """Приложение aiohttp поверх одного общего PriceManager (и его каталога в памяти).
+
+    max_workers — потоки локальной работы, network_workers — потоки, ждущие LLM и геокодер.
+    """
+    app = web.Application()
+    app[MANAGER_KEY] = manager
+    app[SESSIONS_KEY] = SessionStore(manager.new_user)
+    app[EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='api')
+    app[NETWORK_EXECUTOR_KEY] = ThreadPoolExecutor(max_workers=network_workers, thread_name_prefix='api-net')
+
+    async def shutdown_executor(app: web.Application):
+        app[EXECUTOR_KEY].shutdown(wait=False, cancel_futures=True)
+        app[NETWORK_EXECUTOR_KEY].shutdown(wait=False, cancel_futures=True)
+
+    app.on_cleanup.append(shutdown_executor)
+    app.router.add_get('/api/health', health)
+    app.router.add_get('/api/search', search)
+    app.router.add_post('/api/basket', basket)
+    app.router.add_get('/api/companies', companies)
+    app.router.add_post('/api/companies', upload_price)
+    app.router.add_get('/api/location', get_location)
+    app.router.add_post('/api/location', set_location)
+    return app
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, List, Optional
+
+from services.fuzzy_index import FuzzyIndex
+from utils.metrics import Metrics
+
+# Меняется при смене формата ответа (сейчас — список id товаров), старые записи не читаются
+KEY_VERSION = 2
+
+
+class LLMCache:
+    """Кэш ответов LLM: LRU в памяти + SQLite на диске, TTL и склейка одинаковых запросов"""
+
+    def __init__(self, db_path: str = 'llm_cache.sqlite3', max_memory_entries: int = 256,
+                 max_disk_entries: int = 10000, ttl_seconds: float = 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (created_at, company_ids, value)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS entries ("
+                             "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                             "created_at REAL NOT NULL, last_access REAL NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS entry_companies ("
+                             "key TEXT NOT NULL, company_id INTEGER NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_entry_companies_company "
+                             "ON entry_companies (company_id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access "
+                             "ON entries (last_access)")
+
+    @staticmethod
+    def make_key(search_query: str, product_list: List[Dict]) -> str:
+        """Ключ: нормализованный запрос + хэш набора кандидатов.
+
+        Расстояние округляется до километра, чтобы соседние точки пользователя
+        попадали в одну запись.
+        """
+        candidates = sorted(
+            (item['product']['id'], item['company']['id'], item['product']['price'], round(item['distance']))
+            for item in product_list
+        )
+        digest = hashlib.sha1(json.dumps(candidates).encode('utf-8')).hexdigest()
+        return f"v{KEY_VERSION}|{FuzzyIndex.normalize(search_query)}|{digest}"
+
+    def get(self, key: str) -> Optional[list]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    return entry[2]
+                del self._memory[key]
+
+            row = self._db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if now - created_at >= self.ttl_seconds:
+                self._delete_keys([key])
+                return None
+            with self._db:
+                self._db.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+            company_ids = [r[0] for r in self._db.execute(
+                "SELECT company_id FROM entry_companies WHERE key = ?", (key,))]
+            value = json.loads(value)
+            self._remember(key, created_at, company_ids, value)
+            return value
+
+    def put(self, key: str, company_ids: Iterable[int], value: list):
+        now = time.time()
+        company_ids = sorted(set(company_ids))
+        with self._lock:
+            self._remember(key, now, company_ids, value)
+            with self._db:
+                self._db.execute("DELETE FROM entry_companies WHERE key = ?", (key,))
+                self._db.execute("INSERT OR REPLACE INTO entries (key, value, created_at, last_access) "
+                                 "VALUES (?, ?, ?, ?)", (key, json.dumps(value, ensure_ascii=False), now, now))
+                self._db.executemany("INSERT INTO entry_companies (key, company_id) VALUES (?, ?)",
+                                     [(key, company_id) for company_id in company_ids])
+            self._evict_disk(now)
+
+    def get_or_compute(self, key: str, company_ids: Iterable[int], compute: Callable[[], list]) -> list:
+        """Возвращает значение из кэша; одновременные одинаковые запросы ждут один вызов compute"""
+        value = self.get(key)
+        if value is not None:
+            Metrics.count('llm_cache.hits')
+            return value
+
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+        if not owner:
+            Metrics.count('llm_cache.coalesced')
+            return future.result()
+        Metrics.count('llm_cache.misses')
+
+        try:
+            value = compute()
+            # Пустой ответ обычно означает ошибку разбора — такое не кэшируем
+            if value:
+                self.put(key, company_ids, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def invalidate_companies(self, company_ids: Iterable[int]):
+        """Удаляет все записи, в кандидатах которых были товары этих предприятий"""
+        company_ids = set(company_ids)
+        if not company_ids:
+            return
+        with self._lock:
+            stale = [key for key, entry in self._memory.items() if company_ids & set(entry[1])]
+            placeholders = ",".join("?" * len(company_ids))
+            stale += [r[0] for r in self._db.execute(
+                f"SELECT DISTINCT key FROM entry_companies WHERE company_id IN ({placeholders})",
+                tuple(company_ids))]
+            self._delete_keys(stale)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            with self._db:
+                self._db.execute("DELETE FROM entries")
+                self._db.execute("DELETE FROM entry_companies")
+
+    def _remember(self, key: str, created_at: float, company_ids: List[int], value: list):
+        self._memory[key] = (created_at, company_ids, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _delete_keys(self, keys: List[str]):
+        keys = list(set(keys))
+        for key in keys:
+            self._memory.pop(key, None)
+        with self._db:
+            self._db.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in keys])
+            self._db.executemany("DELETE FROM entry_companies WHERE key = ?", [(k,) for k in keys])
+
+    def _evict_disk(self, now: float):
+        expired = [r[0] for r in self._db.execute(
+            "SELECT key FROM entries WHERE created_at <= ?", (now - self.ttl_seconds,))]
+        (count,) = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()
+        overflow = count - len(expired) - self.max_disk_entries
+        if overflow > 0:
+            expired += [r[0] for r in self._db.execute(
+                "SELECT key FROM entries WHERE created_at > ? ORDER BY last_access LIMIT ?",
+                (now - self.ttl_seconds, overflow))]
+        if expired:
+            self._delete_keys(expired)
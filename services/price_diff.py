@@ -0,0 +1,59 @@
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from services.fuzzy_index import FuzzyIndex
+
+
+class PriceDiff:
+    """Разница между текущими товарами предприятия и новым прайсом"""
+
+    def __init__(self):
+        self.inserts: List[Dict] = []
+        self.price_updates: List[Tuple[int, float]] = []
+        self.deletes: List[int] = []
+        self.unchanged = 0
+
+    def is_empty(self) -> bool:
+        return not (self.inserts or self.price_updates or self.deletes)
+
+
+def diff_price_list(existing: List[Dict], records: Iterable[Dict]) -> PriceDiff:
+    """Сравнивает товары по нормализованному названию, повторы названий — как мультимножество.
+
+    records — записи {'name', 'price'} из парсера. Товары с одинаковым названием сначала
+    сопоставляются по точной цене, оставшиеся — попарно по порядку (id товаров и строк файла);
+    лишние товары удаляются, лишние строки попадают в inserts. Повторная загрузка того же
+    файла дает пустую разницу.
+    """
+    incoming: Dict[str, List[Dict]] = defaultdict(list)
+    for record in records:
+        incoming[FuzzyIndex.normalize(record['name'])].append(record)
+    current: Dict[str, List[Dict]] = defaultdict(list)
+    for product in sorted(existing, key=lambda p: p['id']):
+        current[FuzzyIndex.normalize(product['name'])].append(product)
+
+    diff = PriceDiff()
+    for key, products in current.items():
+        rows = incoming.pop(key, [])
+        # Точные совпадения цены не меняются: цена -> номера еще не сопоставленных строк
+        free: Dict[float, List[int]] = defaultdict(list)
+        for i, record in enumerate(rows):
+            free[record['price']].append(i)
+        used = set()
+        changed = []
+        for product in products:
+            slots = free.get(product['price'])
+            if slots:
+                used.add(slots.pop(0))
+                diff.unchanged += 1
+            else:
+                changed.append(product)
+        left = [record for i, record in enumerate(rows) if i not in used]
+        for product, record in zip(changed, left):
+            diff.price_updates.append((product['id'], record['price']))
+        diff.deletes.extend(product['id'] for product in changed[len(left):])
+        diff.inserts.extend(left[len(changed):])
+
+    for rows in incoming.values():
+        diff.inserts.extend(rows)
+    return diff
@@ -0,0 +1,92 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.fuzzy_index import FuzzyIndex
+
+# Минимальная текстовая близость, чтобы товар считался подходящим (солоко -> молоко ≈ 0.67)
+MIN_MATCH_SCORE = 0.45
+
+# Порядок выдачи: значение кандидата и поле элемента выдачи, по которым сортировать
+SORT_KEYS = {
+    'score': (lambda found: found['total_score'], 'total_score'),
+    'price': (lambda found: found['product']['price'], 'price'),
+    'distance': (lambda found: found['distance'], 'distance')
+}
+# Порядок списка предприятий
+COMPANY_SORTS = ('distance', 'name')
+
+
+def _sort_key(found: Dict, sort: str = 'score') -> Tuple[float, int]:
+    # id товара делает порядок полным и позволяет продолжать выдачу с курсора
+    return SORT_KEYS[sort][0](found), found['product']['id']
+
+
+def check_sort(sort: str) -> str:
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Неизвестный порядок сортировки: {sort}")
+    return sort
+
+
+def encode_cursor(key: Tuple[float, int]) -> str:
+    return f"{key[0]!r}:{key[1]}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    score, product_id = cursor.rsplit(':', 1)
+    return float(score), int(product_id)
+
+
+def to_result(found: Dict, ranked_by: Optional[str] = None) -> Dict:
+    """Элемент выдачи в том же формате, что и ответ LLM.
+
+    ranked_by — чем получен порядок: 'llm', 'llm_cache', 'local' или 'fallback' (локально после сбоя LLM);
+    по умолчанию берется из found, иначе 'local'.
+    """
+    return {
+        'name': found['product']['name'],
+        'company': found['company']['name'],
+        'price': found['product']['price'],
+        'distance': found['distance'],
+        'total_score': found['total_score'],
+        'match': found.get('match'),
+        'ranked_by': ranked_by or found.get('ranked_by', 'local')
+    }
+
+
+def fallback_rank(found_products: Iterable[Dict], search_term: str) -> List[Dict]:
+    """Замена ранжирования LLM: подходящие по тексту кандидаты, лучшие по total_score первыми"""
+    ranked = []
+    for fp in found_products:
+        match = fp.get('match')
+        if match is None:
+            match = FuzzyIndex.similarity(search_term, fp['product']['name'])
+        if match >= MIN_MATCH_SCORE:
+            ranked.append(dict(fp, match=match))
+    ranked.sort(key=_sort_key)
+    return ranked
+
+
+def sort_results(results: Iterable[Dict], sort: str = 'score') -> List[Dict]:
+    """Элементы выдачи (to_result) по возрастанию цены, расстояния или total_score"""
+    field = SORT_KEYS[check_sort(sort)][1]
+    return sorted(results, key=lambda item: item[field])
+
+
+def rank_page(found_products: Iterable[Dict], page_size: int, cursor: Optional[str] = None,
+              sort: str = 'score') -> Tuple[List[Dict], Optional[str]]:
+    """Страница лучших кандидатов после курсора; sort — 'score' (total_score), 'price' или 'distance'.
+
+    Выбор через кучу: O(n log page_size) вместо полной сортировки.
+    Курсор действителен только для того же sort.
+    Возвращает (страница кандидатов, курсор следующей страницы или None).
+    """
+    check_sort(sort)
+    after = decode_cursor(cursor) if cursor else None
+    key = lambda fp: _sort_key(fp, sort)
+    pool = (fp for fp in found_products
+            if fp.get('match', 1.0) >= MIN_MATCH_SCORE and (after is None or key(fp) > after))
+    page = heapq.nsmallest(page_size + 1, pool, key=key)
+    if len(page) <= page_size:
+        return page, None
+    page = page[:page_size]
+    return page, encode_cursor(key(page[-1]))
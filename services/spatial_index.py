@@ -0,0 +1,119 @@
+import math
+from collections import defaultdict
+from typing import Dict, List, Sequence, Set, Tuple
+
+from services.geocoding import EARTH_RADIUS_KM, GeocodingService
+
+# Длина градуса меридиана, км
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+class SpatialIndex:
+    """Сетка по широте/долготе над координатами предприятий.
+
+    Запросы по радиусу и k ближайших просматривают только соседние ячейки,
+    а не все предприятия базы.
+    """
+
+    def __init__(self, cell_degrees: float = 0.25):
+        self.cell_degrees = cell_degrees
+        self._lon_cells = int(math.ceil(360 / cell_degrees))
+        self._lat_cells = int(math.ceil(180 / cell_degrees))
+        self._cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._points: Dict[int, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        row = min(int((lat + 90) // self.cell_degrees), self._lat_cells - 1)
+        col = int(((lon + 180) % 360) // self.cell_degrees) % self._lon_cells
+        return row, col
+
+    def add(self, company_id: int, location: Sequence[float]):
+        self.remove(company_id)
+        point = (float(location[0]), float(location[1]))
+        self._points[company_id] = point
+        self._cells[self._cell(*point)].add(company_id)
+
+    def remove(self, company_id: int):
+        point = self._points.pop(company_id, None)
+        if point is not None:
+            cell = self._cell(*point)
+            self._cells[cell].discard(company_id)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+    def _ids_in_rows_cols(self, rows: range, cols: List[int]) -> List[int]:
+        result = []
+        for row in rows:
+            for col in cols:
+                result.extend(self._cells.get((row, col), ()))
+        return result
+
+    def within_radius(self, origin: Tuple[float, float], radius_km: float) -> List[int]:
+        """Предприятия, которые могут быть ближе radius_km (надмножество: точный фильтр делает вызывающий)"""
+        lat, lon = origin
+        lat_delta = radius_km / KM_PER_DEGREE
+        min_lat, max_lat = lat - lat_delta, lat + lat_delta
+        if min_lat <= -90 or max_lat >= 90:
+            lon_delta = 180.0
+        else:
+            # На краю полосы ближе к полюсу градус долготы короче всего
+            edge_cos = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+            lon_delta = min(180.0, lat_delta / max(edge_cos, 1e-9))
+
+        row_from = self._cell(max(min_lat, -90), 0)[0]
+        row_to = self._cell(min(max_lat, 90), 0)[0]
+        if lon_delta >= 180:
+            cols = list(range(self._lon_cells))
+        else:
+            col_from = self._cell(0, lon - lon_delta)[1]
+            col_to = self._cell(0, lon + lon_delta)[1]
+            span = (col_to - col_from) % self._lon_cells
+            cols = [(col_from + i) % self._lon_cells for i in range(span + 1)]
+        return self._ids_in_rows_cols(range(row_from, row_to + 1), cols)
+
+    def nearest(self, origin: Tuple[float, float], k: int) -> List[Tuple[int, float]]:
+        """k ближайших предприятий [(id, км по сфере)], ближайшие первыми"""
+        if k <= 0 or not self._points:
+            return []
+        row0, col0 = self._cell(*origin)
+        found: Dict[int, float] = {}
+        max_ring = max(self._lat_cells, self._lon_cells // 2)
+        for ring in range(max_ring + 1):
+            ring_ids = self._ring_ids(row0, col0, ring)
+            if ring_ids:
+                distances = GeocodingService.calculate_distances(
+                    origin, [self._points[i] for i in ring_ids], mode='haversine')
+                found.update(zip(ring_ids, distances.tolist()))
+            if len(found) >= k:
+                kth = sorted(found.values())[k - 1]
+                # Все, что за пределами просмотренных колец, не ближе этой границы
+                if kth <= self._ring_lower_bound(origin[0], ring):
+                    break
+            if len(found) == len(self._points):
+                break
+        return sorted(found.items(), key=lambda item: item[1])[:k]
+
+    def _ring_ids(self, row0: int, col0: int, ring: int) -> List[int]:
+        if ring == 0:
+            return list(self._cells.get((row0, col0), ()))
+        result = []
+        cols = [(col0 + d) % self._lon_cells for d in range(-ring, ring + 1)]
+        # Узкая сетка по долготе может замкнуться — не берем одну ячейку дважды
+        cols = list(dict.fromkeys(cols))
+        for row in (row0 - ring, row0 + ring):
+            if 0 <= row < self._lat_cells:
+                result.extend(self._ids_in_rows_cols(range(row, row + 1), cols))
+        edge_cols = list(dict.fromkeys([(col0 - ring) % self._lon_cells, (col0 + ring) % self._lon_cells]))
+        rows = range(max(row0 - ring + 1, 0), min(row0 + ring, self._lat_cells))
+        result.extend(self._ids_in_rows_cols(rows, edge_cols))
+        return list(dict.fromkeys(result))
+
+    def _ring_lower_bound(self, lat: float, ring: int) -> float:
+        """Нижняя оценка расстояния до любой точки вне колец 0..ring"""
+        reach = ring * self.cell_degrees
+        edge_lat = min(abs(lat) + reach + self.cell_degrees, 90.0)
+        # Запас 1%: дуга большого круга немного короче дуги параллели
+        return 0.99 * reach * KM_PER_DEGREE * math.cos(math.radians(edge_lat))
@@ -1,6 +1,6 @@
 import json
 import os
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple
 
 class DataStorage:
     @staticmethod
@@ -17,3 +17,131 @@ class DataStorage:
     def save_data(filename: str, data: List[Dict]):
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+class StorageBackend:
+    """Хранилище каталога: предприятия и товары.
+
+    Хранилище только сохраняет и загружает записи; поиск по названию и расстоянию идет по индексам в памяти (Catalog).
+    """
+
+    def signature(self):
+        """Значение, которое меняется при каждом изменении данных (в том числе другим процессом)"""
+        raise NotImplementedError
+
+    def load_companies(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def load_products(self) -> List[Dict]:
+        raise NotImplementedError
+
+    def add_company(self, company: Dict, products: Iterable[Dict]):
+        """Сохраняет новое предприятие вместе с его товарами (все или ничего)"""
+        self.add_companies([company], products)
+
+    def add_companies(self, companies: List[Dict], products: Iterable[Dict]):
+        """Сохраняет несколько предприятий и их товары одной записью.
+
+        Записям с id None хранилище присваивает новые id прямо в переданных словарях.
+        """
+        raise NotImplementedError
+
+    def update_products(self, inserts: List[Dict], price_updates: List[Tuple[int, float]], deletes: List[int]):
+        """Применяет изменения товаров одной записью: новые, новые цены (id, цена), удаленные id"""
+        raise NotImplementedError
+
+    def allocate_ids(self, kind: str, count: int = 1) -> int:
+        """Выделяет count новых id для 'company' или 'product'; возвращает первый.
+
+        Id не переиспользуются даже после удаления записей.
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonStorageBackend(StorageBackend):
+    """Два JSON-файла, переписываются целиком — подходит для небольших каталогов"""
+
+    def __init__(self, companies_file: str = 'companies.json', products_file: str = 'products.json'):
+        self.companies_file = companies_file
+        self.products_file = products_file
+        # Счетчики id храним рядом с данными, чтобы не выдавать повторно id удаленных записей
+        self.ids_file = os.path.join(os.path.dirname(companies_file), 'catalog_ids.json')
+
+    @staticmethod
+    def _file_signature(filename: str) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return None
+        # inode отличает пересозданный файл с тем же временем изменения и размером
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def signature(self):
+        return (self._file_signature(self.companies_file),
+                self._file_signature(self.products_file))
+
+    def load_companies(self) -> List[Dict]:
+        return DataStorage.load_data(self.companies_file)
+
+    def load_products(self) -> List[Dict]:
+        return DataStorage.load_data(self.products_file)
+
+    def add_companies(self, new_companies: List[Dict], products: Iterable[Dict]):
+        new_products = list(products)
+        self._assign_ids(new_companies, 'company')
+        self._assign_ids(new_products, 'product')
+        companies = self.load_companies()
+        companies.extend(new_companies)
+        all_products = self.load_products()
+        all_products.extend(new_products)
+        DataStorage.save_data(self.companies_file, companies)
+        DataStorage.save_data(self.products_file, all_products)
+
+    def update_products(self, inserts: List[Dict], price_updates: List[Tuple[int, float]], deletes: List[int]):
+        self._assign_ids(inserts, 'product')
+        prices = dict(price_updates)
+        deleted = set(deletes)
+        products = []
+        for product in self.load_products():
+            if product['id'] in deleted:
+                continue
+            if product['id'] in prices:
+                product['price'] = prices[product['id']]
+            products.append(product)
+        products.extend(inserts)
+        DataStorage.save_data(self.products_file, products)
+
+    def allocate_ids(self, kind: str, count: int = 1) -> int:
+        counters = {}
+        if os.path.exists(self.ids_file):
+            with open(self.ids_file, 'r', encoding='utf-8') as f:
+                counters = json.load(f)
+        records = self.load_companies() if kind == 'company' else self.load_products()
+        first = max(counters.get(kind, 1), max((r['id'] for r in records), default=0) + 1)
+        counters[kind] = first + count
+        with open(self.ids_file, 'w', encoding='utf-8') as f:
+            json.dump(counters, f)
+        return first
+
+    def _assign_ids(self, records: List[Dict], kind: str):
+        missing = [r for r in records if r.get('id') is None]
+        if missing:
+            first = self.allocate_ids(kind, len(missing))
+            for offset, record in enumerate(missing):
+                record['id'] = first + offset
+
+
+def create_storage(kind: str = 'sqlite', companies_file: str = 'companies.json',
+                   products_file: str = 'products.json', db_path: str = 'catalog.sqlite3') -> StorageBackend:
+    """Создает хранилище; SQLite при первом запуске переносит данные из JSON-файлов"""
+    if kind == 'json':
+        return JsonStorageBackend(companies_file, products_file)
+    if kind == 'sqlite':
+        from utils.sqlite_storage import SqliteStorageBackend
+        storage = SqliteStorageBackend(db_path)
+        storage.migrate_from_json(companies_file, products_file)
+        return storage
+    raise ValueError(f"Неизвестный тип хранилища: {kind}")
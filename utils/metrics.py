@@ -0,0 +1,214 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+# Переменная окружения с путем к журналу метрик (JSON lines)
+METRICS_LOG_ENV = 'PRICE_METRICS_LOG'
+
+
+class MetricsSink:
+    """Получатель событий: {'type': 'span'|'counter', 'name', ...}"""
+
+    def record(self, event: Dict):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(MetricsSink):
+    """Пишет каждое событие отдельной строкой JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, event: Dict):
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class StatsSink(MetricsSink):
+    """Агрегаты в памяти процесса: время этапов и суммы счетчиков"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # имя этапа -> [число, сумма мс, максимум мс, последнее мс]
+        self._spans: Dict[str, List[float]] = {}
+        self._counters: Dict[str, float] = {}
+
+    def record(self, event: Dict):
+        with self._lock:
+            if event['type'] == 'span':
+                ms = event['ms']
+                entry = self._spans.get(event['name'])
+                if entry is None:
+                    self._spans[event['name']] = [1, ms, ms, ms]
+                else:
+                    entry[0] += 1
+                    entry[1] += ms
+                    entry[2] = max(entry[2], ms)
+                    entry[3] = ms
+            else:
+                self._counters[event['name']] = self._counters.get(event['name'], 0) + event['value']
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            spans = {name: {'count': int(count), 'total_ms': total, 'avg_ms': total / count,
+                            'max_ms': max_ms, 'last_ms': last_ms}
+                     for name, (count, total, max_ms, last_ms) in self._spans.items()}
+            return {'spans': spans, 'counters': dict(self._counters)}
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._counters.clear()
+
+    def summary(self) -> str:
+        """Текстовая сводка для окна статистики"""
+        snapshot = self.snapshot()
+        lines = [f"{'этап':32s} {'раз':>6s} {'сред. мс':>10s} {'макс. мс':>10s} {'посл. мс':>10s}"]
+        for name, s in sorted(snapshot['spans'].items()):
+            lines.append(f"{name:32s} {s['count']:>6d} {s['avg_ms']:>10.2f} {s['max_ms']:>10.2f} {s['last_ms']:>10.2f}")
+        if snapshot['counters']:
+            lines.append("")
+            lines.append("счетчики:")
+            for name, value in sorted(snapshot['counters'].items()):
+                lines.append(f"  {name:30s} {value:>12g}")
+        return "\n".join(lines)
+
+
+class _NullSpan:
+    """Этап при выключенных метриках: ничего не измеряет"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, key: str, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    __slots__ = ('name', 'attrs', '_start', '_parent')
+
+    def __init__(self, name: str, attrs: Dict):
+        self.name = name
+        self.attrs = attrs
+        self._start = 0.0
+        self._parent: Optional[str] = None
+
+    def set(self, key: str, value):
+        """Атрибут этапа, например размер промпта"""
+        self.attrs[key] = value
+
+    def __enter__(self):
+        stack = Metrics.stack()
+        self._parent = stack[-1].name if stack else None
+        stack.append(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        ms = (time.perf_counter() - self._start) * 1000
+        stack = Metrics.stack()
+        if self in stack:
+            stack.remove(self)
+        event = {'type': 'span', 'name': self.name, 'ms': ms, 'ts': time.time(), 'parent': self._parent}
+        if exc_type is not None:
+            event['error'] = exc_type.__name__
+        if self.attrs:
+            event['attrs'] = self.attrs
+        Metrics.emit(event)
+        return False
+
+
+class Metrics:
+    """Этапы (span) и счетчики; пока нет ни одного получателя, вызовы почти ничего не стоят.
+
+        with Metrics.span('llm.request') as span:
+            span.set('prompt_chars', len(prompt))
+        Metrics.count('geocode.cache_hit')
+    """
+    _sinks: List[MetricsSink] = []
+    _local = threading.local()
+    _env_log: Optional[JsonLinesSink] = None
+
+    @classmethod
+    def enabled(cls) -> bool:
+        return bool(cls._sinks)
+
+    @classmethod
+    def add_sink(cls, sink: MetricsSink) -> MetricsSink:
+        # Новый список вместо изменения: потоки читают _sinks без блокировки
+        cls._sinks = cls._sinks + [sink]
+        return sink
+
+    @classmethod
+    def remove_sink(cls, sink: MetricsSink):
+        cls._sinks = [s for s in cls._sinks if s is not sink]
+
+    @classmethod
+    def log_from_env(cls) -> Optional[JsonLinesSink]:
+        """Включает журнал, если задан PRICE_METRICS_LOG; повторные вызовы ничего не добавляют"""
+        path = os.environ.get(METRICS_LOG_ENV)
+        if path and cls._env_log is None:
+            cls._env_log = cls.add_sink(JsonLinesSink(path))
+        return cls._env_log
+
+    @classmethod
+    def stack(cls) -> List[Span]:
+        stack = getattr(cls._local, 'stack', None)
+        if stack is None:
+            stack = cls._local.stack = []
+        return stack
+
+    @classmethod
+    def span(cls, name: str, **attrs):
+        if not cls._sinks:
+            return NULL_SPAN
+        return Span(name, attrs)
+
+    @classmethod
+    def timing(cls, name: str, ms: float, **attrs):
+        """Длительность, измеренная вне блока with (например, время до первого результата)"""
+        if not cls._sinks:
+            return
+        stack = cls.stack()
+        event = {'type': 'span', 'name': name, 'ms': ms, 'ts': time.time(), 'parent': stack[-1].name if stack else None}
+        if attrs:
+            event['attrs'] = attrs
+        cls.emit(event)
+
+    @classmethod
+    def count(cls, name: str, value: float = 1):
+        if not cls._sinks:
+            return
+        stack = cls.stack()
+        cls.emit({'type': 'counter', 'name': name, 'value': value, 'ts': time.time(),
+                  'span': stack[-1].name if stack else None})
+
+    @classmethod
+    def emit(cls, event: Dict):
+        for sink in cls._sinks:
+            try:
+                sink.record(event)
+            except Exception as e:
+                # Сбой записи метрик не должен ломать поиск
+                print(f"Ошибка записи метрик: {e}")
@@ -0,0 +1,76 @@
+import itertools
+import pickle
+import tempfile
+from typing import Dict, Iterable, Iterator, List
+
+# Сколько записей держать в памяти, прежде чем переносить пачки во временный файл
+SPOOL_IN_MEMORY = 50000
+SPOOL_CHUNK_SIZE = 5000
+
+
+class RecordSpool:
+    """Записи из итератора, прочитанные заранее: пачками в памяти, а при большом объеме — во временном файле.
+
+    Разбор и проверка файла проходят при чтении в буфер, до захвата блокировок каталога и хранилища.
+    По буферу можно пройти несколько раз; записи без id подсчитываются (missing_ids).
+    """
+
+    def __init__(self, records: Iterable[Dict], chunk_size: int = SPOOL_CHUNK_SIZE,
+                 max_in_memory: int = SPOOL_IN_MEMORY):
+        self._chunks: List[List[Dict]] = []
+        self._file = None
+        self._offsets: List[int] = []
+        self.count = 0
+        self.missing_ids = 0
+        try:
+            records = iter(records)
+            while True:
+                chunk = list(itertools.islice(records, chunk_size))
+                if not chunk:
+                    break
+                self.count += len(chunk)
+                self.missing_ids += sum(1 for record in chunk if record.get('id') is None)
+                if self._file is None and self.count > max_in_memory:
+                    self._file = tempfile.TemporaryFile()
+                    for buffered in self._chunks:
+                        self._dump(buffered)
+                    self._chunks = []
+                if self._file is None:
+                    self._chunks.append(chunk)
+                else:
+                    self._dump(chunk)
+        except BaseException:
+            self.close()
+            raise
+
+    def _dump(self, chunk: List[Dict]):
+        self._offsets.append(self._file.tell())
+        pickle.dump(chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def chunks(self) -> Iterator[List[Dict]]:
+        if self._file is None:
+            yield from self._chunks
+            return
+        for offset in self._offsets:
+            self._file.seek(offset)
+            yield pickle.load(self._file)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for chunk in self.chunks():
+            yield from chunk
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._chunks = []
+        self._offsets = []
+
+    def __enter__(self) -> "RecordSpool":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
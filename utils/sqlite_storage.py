@@ -0,0 +1,190 @@
+import itertools
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+from utils.data_storage import DataStorage, StorageBackend
+
+# Размер пачки строк для executemany при потоковой записи
+WRITE_CHUNK_SIZE = 5000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS companies (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    address TEXT,
+    lat REAL,
+    lon REAL
+);
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    price REAL NOT NULL,
+    company_id INTEGER NOT NULL REFERENCES companies (id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+-- Индекс внешнего ключа; поиск по названию и координатам идет в памяти (Catalog), индексы для них не создаются,
+-- а оставшиеся от прежних версий удаляются
+CREATE INDEX IF NOT EXISTS idx_products_company_id ON products (company_id);
+DROP INDEX IF EXISTS idx_products_name;
+DROP INDEX IF EXISTS idx_companies_location;
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+-- Случайный id базы: у пересозданной базы он другой, даже если номер версии совпал
+INSERT OR IGNORE INTO meta (key, value) VALUES ('database_id', abs(random()));
+INSERT OR IGNORE INTO meta (key, value) SELECT 'next_company_id', COALESCE(MAX(id), 0) + 1 FROM companies;
+INSERT OR IGNORE INTO meta (key, value) SELECT 'next_product_id', COALESCE(MAX(id), 0) + 1 FROM products;
+"""
+
+
+class SqliteStorageBackend(StorageBackend):
+    """Каталог в SQLite: транзакционная пакетная запись, безопасно для нескольких процессов.
+
+    База только хранит строки и отдает их целиком (load_*); запросов по названию или координатам к ней нет.
+    Поиск идет по индексам Catalog в памяти (FuzzyIndex, SpatialIndex), поэтому в схеме есть только
+    индекс внешнего ключа company_id.
+    """
+
+    def __init__(self, db_path: str = 'catalog.sqlite3'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _company_to_dict(row) -> Dict:
+        company = {"id": row[0], "name": row[1]}
+        if row[2] is not None:
+            company["address"] = row[2]
+        if row[3] is not None and row[4] is not None:
+            company["location"] = [row[3], row[4]]
+        return company
+
+    @staticmethod
+    def _product_to_dict(row) -> Dict:
+        return {"id": row[0], "name": row[1], "price": row[2], "company_id": row[3]}
+
+    @staticmethod
+    def _company_row(company: Dict) -> tuple:
+        location = company.get("location") or (None, None)
+        return company["id"], company["name"], company.get("address"), location[0], location[1]
+
+    @staticmethod
+    def _product_row(product: Dict) -> tuple:
+        return product["id"], product["name"], product["price"], product["company_id"]
+
+    def signature(self):
+        """(id базы, версия данных): снимок от другой базы с той же версией не подойдет"""
+        with self._lock:
+            values = dict(self._db.execute(
+                "SELECT key, value FROM meta WHERE key IN ('database_id', 'version')").fetchall())
+        return values['database_id'], values['version']
+
+    def load_companies(self) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT id, name, address, lat, lon FROM companies ORDER BY id").fetchall()
+        return [self._company_to_dict(row) for row in rows]
+
+    def load_products(self) -> List[Dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT id, name, price, company_id FROM products ORDER BY id").fetchall()
+        return [self._product_to_dict(row) for row in rows]
+
+    def add_companies(self, companies: List[Dict], products: Iterable[Dict]):
+        self._write(companies, products)
+
+    def _write(self, companies: List[Dict], products: Iterable[Dict]):
+        """Одна транзакция на всю пачку; BEGIN IMMEDIATE сериализует писателей.
+
+        Товары читаются из итератора пачками по WRITE_CHUNK_SIZE, целиком в памяти не держатся.
+        Записям без id присваиваются новые id из счетчиков (прямо в переданных словарях).
+        """
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._assign_ids(companies, 'next_company_id')
+                self._db.executemany("INSERT INTO companies (id, name, address, lat, lon) VALUES (?, ?, ?, ?, ?)",
+                                     [self._company_row(c) for c in companies])
+                products = iter(products)
+                while True:
+                    chunk = list(itertools.islice(products, WRITE_CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    self._assign_ids(chunk, 'next_product_id')
+                    self._db.executemany("INSERT INTO products (id, name, price, company_id) VALUES (?, ?, ?, ?)",
+                                         [self._product_row(p) for p in chunk])
+                self._sync_counters()
+                self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _assign_ids(self, records: List[Dict], key: str):
+        """Вызывается внутри открытой транзакции"""
+        missing = [r for r in records if r.get('id') is None]
+        if not missing:
+            return
+        (first,) = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        for offset, record in enumerate(missing):
+            record['id'] = first + offset
+        self._db.execute("UPDATE meta SET value = ? WHERE key = ?", (first + len(missing), key))
+
+    def _sync_counters(self):
+        """Записи с явными id (миграция) не должны обгонять счетчики"""
+        self._db.execute("UPDATE meta SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) + 1 FROM companies)) "
+                         "WHERE key = 'next_company_id'")
+        self._db.execute("UPDATE meta SET value = MAX(value, (SELECT COALESCE(MAX(id), 0) + 1 FROM products)) "
+                         "WHERE key = 'next_product_id'")
+
+    def update_products(self, inserts: List[Dict], price_updates: List[Tuple[int, float]], deletes: List[int]):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.executemany("DELETE FROM products WHERE id = ?", [(i,) for i in deletes])
+                self._db.executemany("UPDATE products SET price = ? WHERE id = ?",
+                                     [(price, i) for i, price in price_updates])
+                self._assign_ids(inserts, 'next_product_id')
+                self._db.executemany("INSERT INTO products (id, name, price, company_id) VALUES (?, ?, ?, ?)",
+                                     [self._product_row(p) for p in inserts])
+                self._sync_counters()
+                self._db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def allocate_ids(self, kind: str, count: int = 1) -> int:
+        key = {'company': 'next_company_id', 'product': 'next_product_id'}[kind]
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                (first,) = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+                self._db.execute("UPDATE meta SET value = value + ? WHERE key = ?", (count, key))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return first
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT NOT EXISTS (SELECT 1 FROM companies)").fetchone()[0] == 1
+
+    def migrate_from_json(self, companies_file: str, products_file: str) -> bool:
+        """Переносит данные из JSON-файлов, если база еще пустая"""
+        if not self.is_empty():
+            return False
+        companies = DataStorage.load_data(companies_file)
+        if not companies:
+            return False
+        products = DataStorage.load_data(products_file)
+        self._write(companies, products)
+        return True
+
+    def close(self):
+        with self._lock:
+            self._db.close()